@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the cost of allocating a stanza identifier with the
+previous `generate_unique`, which hashed the current time and a
+random value, against :class:`headstock.lib.utils.IDGenerator`.
+
+    python benchmark/ids.py -n 1000000
+"""
+import timeit
+from optparse import OptionParser
+
+SETUP_LEGACY = """
+from hashlib import sha1 as sha
+from time import time
+from random import random
+
+def generate_unique(seed=None):
+    if not seed:
+        seed = str(time() * random())
+    return unicode(abs(hash(sha(seed).hexdigest())))
+"""
+
+SETUP_GENERATOR = """
+from headstock.lib.utils import generate_unique, IDGenerator
+generator = IDGenerator()
+"""
+
+def bench(number, rounds):
+    results = []
+    for label, stmt, setup in (('legacy generate_unique', 'generate_unique()', SETUP_LEGACY),
+                               ('generate_unique', 'generate_unique()', SETUP_GENERATOR),
+                               ('IDGenerator', 'generator()', SETUP_GENERATOR)):
+        best = min(timeit.repeat(stmt, setup, repeat=rounds, number=number))
+        results.append((label, best))
+    return results
+
+def collisions(number):
+    """
+    Returns the number of duplicated identifiers among
+    ``number`` calls to the legacy function.
+    """
+    namespace = {}
+    exec SETUP_LEGACY in namespace
+    generate_unique = namespace['generate_unique']
+    ids = [generate_unique() for i in xrange(number)]
+    return len(ids) - len(set(ids))
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option("-n", "--number", dest="number", action="store",
+                      type="int", help="Number of identifiers per round (default: 100000)")
+    parser.set_defaults(number=100000)
+    parser.add_option("-r", "--rounds", dest="rounds", action="store",
+                      type="int", help="Number of rounds, the best one is kept (default: 5)")
+    parser.set_defaults(rounds=5)
+    (options, args) = parser.parse_args()
+
+    for label, best in bench(options.number, options.rounds):
+        print "%-24s %8.1f ns/call" % (label, best * 1e9 / options.number)
+    print "legacy duplicates over %d calls: %d" % (options.number,
+                                                   collisions(options.number))
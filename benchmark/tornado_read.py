@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the per-stanza cost of feeding a recorded XMPP stream
+to the dispatch parser one tag at a time, as the Tornado backend
+used to do with `read_until(">")`, against feeding it in large
+chunks as `read_bytes(..., partial=True)` does.
+
+The recorded stream is a file holding the raw data received from
+a server, starting with the `<stream:stream>` header.
+
+    python benchmark/tornado_read.py -f stream.xml -c 65536 -n 10
+"""
+import time
+from optparse import OptionParser
+
+from bridge.parser import DispatchParser
+
+def tags(data):
+    """
+    Splits ``data`` the way `read_until(">")` does.
+    """
+    start = 0
+    while True:
+        end = data.find('>', start)
+        if end == -1:
+            if start < len(data):
+                yield data[start:]
+            break
+        yield data[start:end + 1]
+        start = end + 1
+
+def chunks(data, size):
+    """
+    Splits ``data`` in chunks of ``size`` bytes.
+    """
+    for start in xrange(0, len(data), size):
+        yield data[start:start + size]
+
+def run(data, pieces):
+    """
+    Feeds ``pieces`` to a fresh parser and returns the elapsed
+    time along with the number of stanzas dispatched.
+    """
+    stanzas = [0]
+    def handler(e):
+        stanzas[0] += 1
+        e.forget()
+
+    parser = DispatchParser()
+    parser.register_default(handler)
+
+    start = time.time()
+    for piece in pieces:
+        parser.feed(piece)
+    return time.time() - start, stanzas[0]
+
+def bench(data, chunk_size, rounds):
+    results = {}
+    for label, split in (('read_until', lambda: tags(data)),
+                         ('partial', lambda: chunks(data, chunk_size))):
+        best = None
+        for i in xrange(rounds):
+            elapsed, stanzas = run(data, split())
+            if best is None or elapsed < best:
+                best = elapsed
+        results[label] = (best, stanzas)
+    return results
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option("-f", "--file", dest="path", action="store",
+                      help="Recorded XMPP stream")
+    parser.add_option("-c", "--chunk-size", dest="chunk_size", action="store",
+                      type="int", help="Chunk size for partial reads (default: 65536)")
+    parser.set_defaults(chunk_size=65536)
+    parser.add_option("-n", "--rounds", dest="rounds", action="store",
+                      type="int", help="Number of rounds, the best one is kept (default: 5)")
+    parser.set_defaults(rounds=5)
+    (options, args) = parser.parse_args()
+
+    data = file(options.path, 'rb').read()
+    results = bench(data, options.chunk_size, options.rounds)
+    for label in ('read_until', 'partial'):
+        elapsed, stanzas = results[label]
+        print "%-10s %8.3fms total %8.2fus/stanza (%d stanzas)" % (label, elapsed * 1000,
+                                                                  elapsed * 1000000 / max(stanzas, 1),
+                                                                  stanzas)
@@ -30,9 +30,15 @@ OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 
-__all__ = ['xmpphandler']
+import inspect
+from weakref import WeakKeyDictionary
 
-def xmpphandler(name, ns, once=False, forget=True):
+__all__ = ['xmpphandler', 'handler_specs']
+
+_specs = WeakKeyDictionary()
+
+def xmpphandler(name, ns, once=False, forget=True, priority=0,
+                type=None, from_jid=None, child=None, executor=None):
     """
     Decorator to wrap a callable so that it can be used as
     a XMPP handler by the headstock client.
@@ -44,6 +50,14 @@ def xmpphandler(name, ns, once=False, forget=True):
     * xmpp_ns: XML element namespace
     * fire_once: if `True`, this handler will be removed once it has been used.
     * forget: if set to `True`, the dispatched element will be automatically deleted once the handler has been called.
+    * priority: handlers of the same element with a higher priority are called first.
+    * predicates: conditions the element must fulfill for the handler to be called.
+    * executor: pool the handler runs in, `None` to run it inline.
+
+    Several handlers may be registered for the same element, see
+    :class:`headstock.lib.dispatch.HandlerChain`. The predicates are
+    checked by the client before calling the handler so that handlers
+    which don't care about a stanza don't cost a call.
 
     ``name`` XMPP stanza name
 
@@ -55,12 +69,77 @@ def xmpphandler(name, ns, once=False, forget=True):
     ``forget`` True - flag indicating if the dispatched
     :class:`bridge.Element` instance should be automatically
     forgotten once dispatched.
+
+    ``priority`` 0 - order in which handlers of the same
+    element are called, highest first
+
+    ``type`` None - value, or list of values, the `type` attribute
+    of the element must have
+
+    ``from_jid`` None - JID the `from` attribute of the element
+    must match. A bare JID matches all of its resources.
+
+    ``child`` None - namespace, or list of namespaces, one of the
+    children of the element must belong to
+
+    ``executor`` None - either `'thread'` or `'process'` to run
+    the handler in a pool rather than on the I/O loop, see
+    :mod:`headstock.lib.executor`. Such handlers can't stop the
+    dispatching of the element.
     """
+    if executor not in (None, 'thread', 'process'):
+        raise ValueError("Unknown executor: %s" % executor)
+
+    predicates = {}
+    if type is not None:
+        predicates['type'] = type
+    if from_jid is not None:
+        predicates['from'] = from_jid
+    if child is not None:
+        predicates['child'] = child
+
     def wrapper(func):
         func.handler = True
         func.fire_once = once
         func.forget = forget
+        func.priority = priority
+        func.predicates = predicates
+        func.executor = executor
         func.xmpp_local_name = name
         func.xmpp_ns = ns
         return func
     return wrapper
+
+def handler_specs(cls):
+    """
+    Returns the list of XMPP handlers declared by ``cls``
+    through :func:`xmpphandler`.
+
+    Each item is a tuple `(attribute, names, ns, fire_once, forget,
+    priority, predicates, executor)` where `attribute` is the name of the decorated
+    method and `names` the list of element names it handles.
+
+    Classes are only introspected the first time they are looked up,
+    handlers added to a class afterwards are therefore ignored.
+    """
+    specs = _specs.get(cls)
+    if specs is None:
+        specs = []
+        for attribute, member in inspect.getmembers(cls):
+            func = getattr(member, '__func__', member)
+            if getattr(func, 'handler', None) is not True:
+                continue
+
+            names = func.xmpp_local_name
+            if names is None:
+                continue
+            if not isinstance(names, list):
+                names = [names]
+
+            specs.append((attribute, names, func.xmpp_ns,
+                          func.fire_once, func.forget,
+                          getattr(func, 'priority', 0),
+                          getattr(func, 'predicates', None) or {},
+                          getattr(func, 'executor', None)))
+        _specs[cls] = specs
+    return specs
@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 import asyncore
+import errno
 import inspect
 import socket
+import time
 try:
     import ssl
 except ImportError:
@@ -9,21 +11,73 @@ except ImportError:
 from functools import partial
 from xml.sax import SAXParseException
 
+from headstock import handler_specs
 from headstock.lib.jid import JID
+from headstock.lib.iq import IQRouter
+from headstock.lib.dispatch import HandlerChain, HandlerEntry
+from headstock.lib.executor import HandlerExecutor, local_handler, remote_handler
+from headstock.lib.buffers import WriteQueue, ReadBuffer
+from headstock.lib.stanza import FrozenStanza
+from headstock.lib.future import Future
+from headstock.lib.metrics import MetricsRegistry
+from headstock.lib.timer import TimerWheel
 from headstock.register import Register
 from headstock.lib.logger import Logger
-from headstock.lib.utils import compute_handshake
+from headstock.lib.utils import compute_handshake, generate_unique
 from headstock.error import HeadstockAuthenticationSuccess, \
      HeadstockSessionBound, HeadstockStartTLS,\
-     HeadstockStreamError, HeadstockAvailable
-from headstock.stream import Stream
+     HeadstockStreamError, HeadstockAvailable, \
+     HeadstockTimeout, HeadstockIQError, HeadstockSessionResumed, \
+     HeadstockStopDispatch, HeadstockAuthenticationFailure
+from headstock.stream import Stream, STANZA_NAMES
 
 from bridge import Element as E
+from bridge import Attribute as A
 from bridge.parser import DispatchParser
-from bridge.common import XMPP_COMPONENT_ACCEPT_NS
+from bridge.common import XMPP_CLIENT_NS, XMPP_COMPONENT_ACCEPT_NS
 
 __all__ = ['BaseClient', 'AsyncClient']
 
+# errors meaning the peer closed the connection, as
+# asyncore, which keeps its own set private, considers them
+_DISCONNECTED = frozenset((errno.ECONNRESET, errno.ENOTCONN, errno.ESHUTDOWN,
+                           errno.ECONNABORTED, errno.EPIPE, errno.EBADF))
+
+# namespaces of the stanzas and values of their type attribute
+# counted in the metrics, others are counted as 'other' so that
+# peers can't add labels at will
+STANZA_NAMESPACES = frozenset([XMPP_CLIENT_NS, XMPP_COMPONENT_ACCEPT_NS])
+STANZA_TYPES = {u'message': frozenset([u'chat', u'error', u'groupchat',
+                                       u'headline', u'normal']),
+                u'presence': frozenset([u'unavailable', u'subscribe', u'subscribed',
+                                        u'unsubscribe', u'unsubscribed', u'probe',
+                                        u'error']),
+                u'iq': frozenset([u'get', u'set', u'result', u'error'])}
+
+_handler_labels = {}
+
+def handler_label(handler):
+    """
+    Returns the name under which the time spent in ``handler``
+    is recorded: `Class.method` for bound methods and `module.function`
+    for functions.
+    """
+    func = getattr(handler, '__func__', handler)
+    owner = getattr(handler, '__self__', None)
+    code = getattr(func, '__code__', None)
+    if code is None:
+        return handler.__class__.__name__
+
+    key = (owner.__class__ if owner is not None else None, code)
+    label = _handler_labels.get(key)
+    if label is None:
+        if owner is not None:
+            label = '%s.%s' % (owner.__class__.__name__, func.__name__)
+        else:
+            label = '%s.%s' % (getattr(func, '__module__', None), func.__name__)
+        label = _handler_labels[key] = label
+    return label
+
 class BaseClient(object):
     """
     Defines a high level API by which your application connects to
@@ -44,60 +98,228 @@ class BaseClient(object):
     ``registerclass`` None - Class that will handle the registration process.
     It should be a subclass of :class:`headstock.register.Register`. The default,
     `None` means the registration process is not handled by the client.
+
+    ``sm`` False - Flag indicating if Stream Management (XEP-0198) should
+    be used when the server supports it. See
+    :class:`headstock.stream.StreamManagement`.
+
+    ``reconnect`` None - :class:`headstock.lib.reconnect.ReconnectPolicy`
+    instance deciding when to connect again after the connection was
+    lost. `None` means the client stops instead. Reconnecting keeps the
+    registered handlers as well as the bound resource and, when
+    Stream Management is used, resumes the previous session.
     """
-    def __init__(self, jid, password, tls=False, registerclass=None):
+    def __init__(self, jid, password, tls=False, registerclass=None, sm=False,
+                 reconnect=None):
         self.parser = DispatchParser()
 
         self.running = False
         self.available = False
+        self.auth_failed = False
+        self.reconnect_policy = reconnect
+        self.reconnect_attempts = 0
+        self._reconnect_timer = None
 
         self.handlers = []
-        self.iq_handlers = []
+        self.chains = {}
+        self.iq_handlers = IQRouter()
+        self.timers = TimerWheel()
+        self.pending_requests = {}
+        self.executor = None
+        self.offloaded = {}
+        self._own_executor = False
         
         self.logger = None
         self.jid = JID.parse(jid)
         
-        self.stream = Stream(self.jid, password, tls=tls, register=registerclass != None)
+        self.stream = Stream(self.jid, password, tls=tls, register=registerclass != None, sm=sm)
         self.register(self.stream)
+        self.sm = self.stream.sm
+        self._last_inbound = None
+        if self.sm:
+            self.register(self.sm)
         self.parser.register_default(self.default_handler)
+        self.init_metrics()
+        self.init_hooks()
 
         if registerclass:
             self.register(registerclass(self, self.jid.node, password, unicode(self.jid)))
 
-    def set_log(self, path=None, stdout=False):
+    def set_log(self, path=None, stdout=False, threaded=False):
         """
         Sets the client's logger. Note that the logger's name is
-        suffixed by the jid's node so that you can create several of them
-        within one single process.
+        suffixed by the bare jid, and its resource if any, so that you can
+        create several of them within one single process.
 
         ``path`` None - Filesystem path to use a file handler for the logger.
 
         ``stdout`` False - Flag indicating if the logger should output to
         the standard outpout.
+
+        ``threaded`` False - Flag indicating if records should be written
+        from a background thread. See :class:`headstock.lib.logger.Logger`.
         """
-        self.logger = Logger(path=path, stdout=stdout, name=self.jid.node)
+        name = self.jid.nodeid()
+        if self.jid.resource:
+            name = u'%s/%s' % (name, self.jid.resource)
+        self.logger = Logger(path=path, stdout=stdout, name=name,
+                             threaded=threaded)
 
     def default_handler(self, e):
+        self.count_inbound(e)
+
         handled = False
         if e.xml_name == u'iq':
-            for stanza_id, stanza_type, handler, once in self.iq_handlers:
-                if stanza_type and e.get_attribute_value('type') != stanza_type:
-                    continue
-                if stanza_id and e.get_attribute_value('id') != stanza_id:
-                    continue
-
+            matched = self.iq_handlers.match(e.get_attribute_value('id'),
+                                             e.get_attribute_value('type'))
+            if matched:
                 handled = True
-                if once:
-                    self.unregister_from_iq(handler, stanza_type,
-                                            stanza_id, once)
-                self.wrap_handler(e, handler, once, True)
+                self.log(e, 'INCOMING')
+                for stanza_id, stanza_type, handler, once in matched:
+                    if once:
+                        self.iq_handlers.discard(handler, stanza_type,
+                                                 stanza_id, once)
+                    if self.apply_handler(e, handler):
+                        break
+                e.forget()
 
         if not handled:
             self.log(e, 'INCOMING (DEFAULT HANDLER)')
                     
+    def count_inbound(self, e):
+        """
+        Counts the stanza holding the dispatched element ``e``, in the
+        metrics and for Stream Management, unless it was already counted.
+        Note that only stanzas having at least one element dispatched
+        are counted.
+        """
+        top = e
+        parent = top.xml_parent
+        while parent is not None and getattr(parent, 'xml_name', None) not in (None, u'stream'):
+            top = parent
+            parent = top.xml_parent
+
+        if top is not self._last_inbound:
+            self._last_inbound = top
+            name, ns = top.xml_name, top.xml_ns
+            if (name, ns) not in self.chains and \
+                    not (name in STANZA_TYPES and ns in STANZA_NAMESPACES):
+                name = ns = u'other'
+            stanza_type = top.get_attribute_value('type')
+            if stanza_type is not None and \
+                    stanza_type not in STANZA_TYPES.get(name, ()):
+                stanza_type = u'other'
+            self.stanzas_received.inc((name, ns, stanza_type))
+            if self.sm and self.sm.enabled and top.xml_name in STANZA_NAMES:
+                self.sm.received()
+
+    def init_metrics(self):
+        """
+        Creates the :class:`headstock.lib.metrics.MetricsRegistry`
+        instance of the client, available as the ``metrics`` attribute,
+        along with the metrics the client records:
+
+        * ``headstock_stanzas_received_total`` by name, namespace and type.
+          Elements which are neither stanzas of the stream namespace nor
+          handled by a registered handler are counted under the `other`
+          name and namespace, and types unknown for the stanza as `other`
+        * ``headstock_stanzas_sent_total``
+        * ``headstock_received_bytes_total`` and ``headstock_sent_bytes_total``,
+          stream headers and Stream Management acknowledgements included
+        * ``headstock_handler_seconds``: wall time of each handler call, by handler
+        * ``headstock_feed_seconds``: time spent parsing, and dispatching,
+          each chunk of received data
+        * ``headstock_iq_roundtrip_seconds``: time before a response to
+          a request made with :meth:`request` arrived
+        * ``headstock_pending_iq``: requests awaiting a response
+        * ``headstock_write_queue_bytes``: bytes waiting to be written, see
+          :meth:`write_queue_size`
+        """
+        metrics = self.metrics = MetricsRegistry()
+        self.stanzas_received = metrics.counter('headstock_stanzas_received_total',
+                                                'Stanzas received', ('name', 'ns', 'type'))
+        self.stanzas_sent = metrics.counter('headstock_stanzas_sent_total',
+                                            'Stanzas sent')
+        self.bytes_received = metrics.counter('headstock_received_bytes_total',
+                                              'Bytes received')
+        self.bytes_sent = metrics.counter('headstock_sent_bytes_total',
+                                          'Bytes sent')
+        self.handler_seconds = metrics.histogram('headstock_handler_seconds',
+                                                 'Wall time spent in handlers', ('handler',))
+        self.feed_seconds = metrics.histogram('headstock_feed_seconds',
+                                              'Time spent parsing a chunk of received data')
+        self.iq_seconds = metrics.histogram('headstock_iq_roundtrip_seconds',
+                                            'Time before an IQ request was answered')
+        metrics.gauge('headstock_pending_iq', 'IQ requests awaiting a response',
+                      lambda: len(self.pending_requests))
+        metrics.gauge('headstock_write_queue_bytes', 'Bytes waiting to be written',
+                      self.write_queue_size)
+
+    def init_hooks(self):
+        """
+        Sets the lists of hooks, empty by default, called around
+        the hot paths of the client:
+
+        * ``on_feed``: callables applied with the data fed to the
+          parser and the time in seconds it took to parse and dispatch it
+        * ``on_dispatch``: callables applied with the dispatched element,
+          the handler and the time in seconds the handler took
+        * ``on_send``: callables applied with the serialized stanza and
+          the time in seconds ``send_raw_stanza`` took
+
+        Hooks are appended to those lists, for instance
+        ``client.on_dispatch.append(func)``. When a list is empty, the
+        client doesn't even time the operation.
+
+        It also sets the ``profiler`` attribute, see :meth:`set_profiler`.
+        """
+        self.on_feed = []
+        self.on_dispatch = []
+        self.on_send = []
+        self.profiler = None
+
+    def set_profiler(self, profiler):
+        """
+        Sets the :class:`headstock.lib.profiler.HandlerProfiler`
+        instance told about every handler call and starts it. The
+        previous profiler, if any, is stopped. Pass `None` to stop
+        profiling.
+        """
+        if self.profiler is not None:
+            self.profiler.stop()
+        self.profiler = profiler
+        if profiler is not None:
+            profiler.start()
+
+    def write_queue_size(self):
+        """
+        Returns the number of bytes waiting to be written
+        by the backend. Defaults to 0 when the backend doesn't
+        expose it.
+        """
+        return 0
+
+    def feed(self, data):
+        """
+        Feeds ``data`` received from the server to the parser which
+        dispatches the complete elements to the handlers. Backends call
+        this rather than feeding the parser directly so that the
+        received bytes and the time spent are recorded.
+        """
+        self.bytes_received.inc((), len(data))
+        start = time.time()
+        try:
+            self.parser.feed(data)
+        finally:
+            elapsed = time.time() - start
+            self.feed_seconds.observe(elapsed)
+            for hook in self.on_feed:
+                hook(data, elapsed)
+
     def log(self, stanza=None, prefix='', traceback=False):
         """
-        Logs a stanza into its XML serialized form.
+        Logs a stanza into its XML serialized form. The serialization
+        only happens if the logger will emit the record.
 
         ``stanza`` :class:`bridge.Element` instance to be serialized to a XML string.
 
@@ -106,34 +328,67 @@ class BaseClient(object):
         ``traceback`` False - Flag indicating the current traceback should be
         logged.
         """
-        if self.logger:
+        logger = self.logger
+        if logger:
             if traceback:
-                self.logger.error()
+                logger.error()
             if stanza:
-                if isinstance(stanza, E):
-                    stanza = stanza.xml(omit_declaration=True, indent=False)
-                self.logger.log('%s %s' % (prefix, stanza))
+                logger.log_stanza(stanza, prefix)
 
     def send_stream_header(self):
         """
         Sends the initial stream header to the server.
         """
-        header = self.stream.stream_header()
-        self.send_stanza(header)
-            
+        self.send_raw(self.stream.stream_header())
+
+    def send_raw(self, data):
+        """
+        Hands ``data``, which isn't a stanza, such as the stream header,
+        to ``send_raw_stanza`` and counts its bytes.
+        """
+        if isinstance(data, unicode):
+            data = data.encode('utf-8')
+        self.bytes_sent.inc((), len(data))
+        self.send_raw_stanza(data)
+
     def send_stanza(self, stanza):
         """
         Sends a stanza onto the wire by serializing it first to XML.
+        The serialized stanza is encoded to UTF-8 before being handed
+        to ``send_raw_stanza``.
 
-        ``stanza`` :class:`bridge.Element` instance to be sent.
+        ``stanza`` :class:`bridge.Element` instance to be sent. It may also
+        be a :class:`headstock.lib.stanza.FrozenStanza` instance, whose cached
+        serialization is used, or an already serialized XML string.
         """
         if not stanza:
             return
         
         if isinstance(stanza, E):
             stanza = stanza.xml(omit_declaration=True, indent=False)
+        elif isinstance(stanza, FrozenStanza):
+            stanza = stanza.data
+        if isinstance(stanza, unicode):
+            stanza = stanza.encode('utf-8')
+        self.stanzas_sent.inc()
+        self.bytes_sent.inc((), len(stanza))
+
+        sm = self.sm
+        ack = False
+        if sm and sm.enabled and stanza.startswith(('<message', '<presence', '<iq')):
+            ack = sm.sent(stanza)
+
+        if self.on_send:
+            start = time.time()
+            self.send_raw_stanza(stanza)
+            elapsed = time.time() - start
+            for hook in self.on_send:
+                hook(stanza, elapsed)
+        else:
+            self.send_raw_stanza(stanza)
 
-        self.send_raw_stanza(stanza)
+        if ack:
+            self.send_raw(sm.ack_request())
 
     def register_on_iq(self, handler, type=None, id=None, once=False):
         """
@@ -150,7 +405,7 @@ class BaseClient(object):
         ``once`` False - Flag indicating if the handler should be
         unregistered automatically or not once it has been applied.
         """
-        self.iq_handlers.append((id, type, handler, once))
+        self.iq_handlers.add(handler, type, id, once)
 
     def unregister_from_iq(self, handler, type=None, id=None, once=False):
         """
@@ -165,8 +420,82 @@ class BaseClient(object):
 
         ``once`` False - Flag indicating if the handler should be
         unregistered automatically or not once it has been applied.
+
+        Raises a `ValueError` if the callable wasn't registered.
+        """
+        self.iq_handlers.remove(handler, type, id, once)
+
+    def request(self, iq, timeout=None):
+        """
+        Sends a IQ request and returns a :class:`headstock.lib.future.Future`
+        instance that will hold its outcome.
+
+        The future resolves with the :class:`bridge.Element` instance of
+        the `result` IQ sharing the same identifier. It fails with a
+        :class:`headstock.error.HeadstockIQError` instance when an `error` IQ
+        is received instead or with a :class:`headstock.error.HeadstockTimeout`
+        instance when no response arrived within ``timeout`` seconds.
+
+        Note that the dispatched element is forgotten once the
+        callbacks of the future have been applied.
+
+        ``iq`` :class:`bridge.Element` instance of the IQ stanza to send.
+        If it doesn't carry an `id` attribute, a unique one is set.
+
+        ``timeout`` None - number of seconds to wait for the response.
+        `None` means the request never times out.
         """
-        self.iq_handlers.remove((id, type, handler, once))
+        stanza_id = iq.get_attribute_value('id')
+        if not stanza_id:
+            stanza_id = generate_unique()
+            A(u'id', value=stanza_id, parent=iq)
+
+        future = Future()
+        self.pending_requests[stanza_id] = future
+        timer = None
+        if timeout is not None:
+            timer = self.timers.schedule(timeout, future.set_exception,
+                                         HeadstockTimeout())
+
+        def handle_response(e):
+            if future.done():
+                return
+            self.iq_seconds.observe(time.time() - sent_at)
+            if e.get_attribute_value('type') == u'error':
+                future.set_exception(HeadstockIQError(e))
+            else:
+                future.set_result(e)
+
+        def complete(future):
+            self.pending_requests.pop(stanza_id, None)
+            self.iq_handlers.discard(handle_response, u'result', stanza_id, True)
+            self.iq_handlers.discard(handle_response, u'error', stanza_id, True)
+            if timer:
+                timer.cancel()
+
+        future.add_done_callback(complete)
+        self.register_on_iq(handle_response, type=u'result', id=stanza_id, once=True)
+        self.register_on_iq(handle_response, type=u'error', id=stanza_id, once=True)
+        sent_at = time.time()
+        try:
+            self.send_stanza(iq)
+        except:
+            # the request never left, cancelling the future
+            # drops its handlers and timer
+            future.cancel()
+            raise
+
+        return future
+
+    def process_timers(self, now=None):
+        """
+        Fires the timers that expired and hands the outcome of
+        the offloaded handlers back. Backends call this periodically
+        from their event loop.
+        """
+        self.timers.advance(now)
+        if self.executor is not None:
+            self.executor.process()
 
     def register(self, handler):
         """
@@ -176,27 +505,26 @@ class BaseClient(object):
         set to `True` as well as a `xmpp_local_name` indicating
         which element is expected.
 
-        The actual methods will be wrapped into ``headstock.client.BaseClient.wrap_handler``
-        which will call the method and traps some of the ``headstock.error`` exceptions
-        and act accordingly.
+        The handlers declared by a class are only looked up once, see
+        :func:`headstock.handler_specs`.
+
+        Several handlers may want the same element, they are added to
+        the chain of that element according to their priority and
+        called in turn by ``headstock.client.BaseClient.dispatch``.
         
         ``handler`` instance of an object that defines at least
         one method with the expected properties.
         """
         self.handlers.append(handler)
-        members = inspect.getmembers(handler, inspect.ismethod)
-        for name, member in members:
-            if hasattr(member, 'handler') and member.handler is True:
-                local_name = member.xmpp_local_name
-
-                if local_name is not None:
-                    if not isinstance(local_name, list):
-                        local_name = [local_name]
-                    
-                    for name in local_name:
-                        p = partial(self.wrap_handler, handler=member,
-                                    fire_once=member.fire_once, forget=member.forget)
-                        self.parser.register_on_element(name, p, member.xmpp_ns)
+        for attribute, names, ns, fire_once, forget, priority, predicates, executor \
+                in handler_specs(handler.__class__):
+            member = getattr(handler, attribute)
+            for name in names:
+                self.chain(name, ns).add(HandlerEntry(member, owner=handler,
+                                                      once=fire_once, forget=forget,
+                                                      priority=priority,
+                                                      predicates=predicates,
+                                                      executor=executor))
                     
     def unregister(self, handler):
         """
@@ -207,18 +535,37 @@ class BaseClient(object):
         """
         if handler in self.handlers:
             self.handlers.remove(handler)
-            
-        members = inspect.getmembers(handler, inspect.ismethod)
-        for name, member in members:
-            if hasattr(member, 'handler'):
-                local_name = member.xmpp_local_name
-
-                if local_name is not None:
-                    if not isinstance(local_name, list):
-                        local_name = [local_name]
-                        
-                    for name in local_name:
-                        self.parser.unregister_on_element(name, member.xmpp_ns)
+
+        for spec in handler_specs(handler.__class__):
+            names, ns = spec[1], spec[2]
+            for name in names:
+                chain = self.chains.get((name, ns))
+                if chain is not None:
+                    chain.remove_owner(handler)
+                    if not chain:
+                        self.drop_chain(name, ns)
+
+    def chain(self, name, ns):
+        """
+        Returns the :class:`headstock.lib.dispatch.HandlerChain`
+        of the element ``name`` in the namespace ``ns``, registering
+        it with the parser when it doesn't exist yet.
+        """
+        chain = self.chains.get((name, ns))
+        if chain is None:
+            chain = self.chains[(name, ns)] = HandlerChain()
+            self.parser.register_on_element(name, partial(self.dispatch, chain=chain), ns)
+        return chain
+
+    def drop_chain(self, name, ns):
+        """
+        Removes the chain of the element ``name`` in the
+        namespace ``ns`` and unregisters it from the parser.
+        """
+        chain = self.chains.pop((name, ns), None)
+        if chain is not None:
+            chain.clear()
+            self.parser.unregister_on_element(name, ns)
 
     def unregister_all(self):
         """
@@ -231,7 +578,7 @@ class BaseClient(object):
         
     def swap_handler(self, new_handler, name, ns, once=False, forget=True):
         """
-        Swap an existing handler with a new one.
+        Swap the existing handlers of an element with a new one.
 
         ``new_handler`` callable to use from now on. It must accept
         a :class:`bridge.Element` instance as its argument.
@@ -246,13 +593,171 @@ class BaseClient(object):
         ``forget`` True - flag indicating if the dispatched stanza
         should be removed from memory once the handler has been called
         """
-        self.parser.unregister_on_element(name, ns)
-        p = partial(self.wrap_handler, handler=new_handler, fire_once=once, forget=forget)
-        self.parser.register_on_element(name, p, ns)
+        chain = self.chain(name, ns)
+        chain.clear()
+        chain.add(HandlerEntry(new_handler, once=once, forget=forget))
+
+    def dispatch(self, e, chain):
+        """
+        Applies the entries of ``chain`` whose predicates match
+        the dispatched element ``e`` in turn, until one of them raises
+        ``headstock.error.HeadstockStopDispatch``. Each handler is
+        applied through ``headstock.client.BaseClient.apply_handler``,
+        except those declaring an executor which are submitted through
+        ``headstock.client.BaseClient.offload``.
+
+        The element is forgotten afterwards unless one of the
+        handlers that were called asked otherwise or it was offloaded.
+
+        When no entry matches, the element goes to
+        ``headstock.client.BaseClient.default_handler`` as if no chain
+        was registered so that, for instance, IQ responses still reach
+        the handlers awaiting them.
+        """
+        entries = chain.match(e)
+        if not entries:
+            self.default_handler(e)
+            return
+
+        self.log(e, 'INCOMING')
+
+        self.count_inbound(e)
+
+        forget = True
+        for entry in entries:
+            # a previous handler may have unregistered this one
+            if not entry.active:
+                continue
+            if entry.once:
+                chain.remove(entry)
+                if not chain:
+                    self.drop_chain(e.xml_name, e.xml_ns)
+            if entry.executor is not None:
+                self.offload(e, entry)
+                forget = False
+                continue
+            forget = forget and entry.forget
+            if self.apply_handler(e, entry.handler):
+                break
+
+        if forget:
+            e.forget()
+
+    def set_executor(self, executor):
+        """
+        Sets the :class:`headstock.lib.executor.HandlerExecutor` instance
+        running the handlers declaring an executor. When none is set, one
+        is created on first use and closed when the client terminates.
+        An executor set here may be shared with other clients and is
+        left alone.
+        """
+        self.executor = executor
+        self._own_executor = False
+
+    def offload(self, e, entry):
+        """
+        Submits the handler of ``entry`` to the executor. Handlers
+        applied to stanzas from the same bare JID, once prepared, run
+        one after the other, in the order the stanzas were received.
+
+        The outcome is handed to ``headstock.client.BaseClient.offloaded_done``
+        from ``headstock.client.BaseClient.process_timers``, which the
+        backend is asked to call through ``headstock.client.BaseClient.wake_up``.
+
+        Handlers are given a copy of ``e`` so that the loop and
+        the pools never share an element.
+        """
+        if self.executor is None:
+            self.executor = HandlerExecutor()
+            self._own_executor = True
+
+        sender = e.get_attribute_value('from')
+        jid = JID.parse(sender)
+        key = jid.bare if jid is not None else sender
+
+        state = self.offloaded.get(id(e))
+        if state is None:
+            state = self.offloaded[id(e)] = [e, 0, True]
+        state[1] += 1
+        state[2] = state[2] and entry.forget
+
+        xml = e.xml(omit_declaration=True, indent=False)
+        if entry.executor == 'process':
+            func = remote_handler
+            args = (entry.owner, entry.handler.__name__, xml)
+        else:
+            func = local_handler
+            args = (entry.handler, xml)
+        self.executor.submit(entry.executor, key, func, args,
+                             partial(self.offloaded_done, e, entry.handler),
+                             self.wake_up)
+
+    def wake_up(self):
+        """
+        Called from a pool thread when an offloaded handler
+        completed. Backends override it so that their loop calls
+        ``headstock.client.BaseClient.process_timers`` without waiting
+        for its next tick, it must therefore be thread-safe.
+        """
+
+    def offloaded_done(self, e, handler, result, error, elapsed):
+        """
+        Called on the loop once an offloaded ``handler`` completed
+        after ``elapsed`` seconds. Its ``result`` is sent and the
+        ``headstock.error`` exceptions it raised are dealt with as
+        if it had run inline. Other errors are logged.
 
-    def wrap_handler(self, e, handler, fire_once, forget):
+        The element is forgotten once all the handlers it was
+        offloaded to completed, unless one of them asked otherwise.
+
+        Results arriving once the client was cleaned up, from an
+        executor shared with other clients, are dropped.
+        """
+        state = self.offloaded.get(id(e))
+        if state is None or state[0] is not e:
+            return
+
+        self.handler_seconds.observe(elapsed, (handler_label(handler),))
+
+        if error is not None and error[0] is None:
+            self.log(error[1])
+        else:
+            def replay(e):
+                if error is not None:
+                    raise error[0]
+                return result
+            self.apply_handler(e, replay, timed=False)
+
+        state[1] -= 1
+        if not state[1]:
+            del self.offloaded[id(e)]
+            if state[2]:
+                e.forget()
+
+    def timed_call(self, e, handler):
         """
-        Wrapper for any registered XMPP handler.
+        Applies ``handler`` to ``e`` and reports the time it
+        took to the metrics, the profiler and the ``on_dispatch`` hooks.
+        """
+        label = handler_label(handler)
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.enter(label)
+        start = time.time()
+        try:
+            return handler(e)
+        finally:
+            elapsed = time.time() - start
+            self.handler_seconds.observe(elapsed, (label,))
+            if profiler is not None:
+                profiler.leave(elapsed)
+            for hook in self.on_dispatch:
+                hook(e, handler, elapsed)
+
+    def apply_handler(self, e, handler, timed=True):
+        """
+        Applies a XMPP handler to the dispatched element. Returns `True`
+        if the handler asked for the dispatching to stop.
 
         This traps a few exception:
 
@@ -263,11 +768,23 @@ class BaseClient(object):
         * ``headstock.error.HeadstockAuthenticationSuccess`` when the authentication
         was successful.
 
+        * ``headstock.error.HeadstockAuthenticationFailure`` when the
+        authentication failed, the ``auth_failed`` attribute is then set and
+        the client is stopped.
+
         * ``headstock.error.HeadstockSessionBound`` when the session is
         eventually bound. It automatically sends the initial presence and asks for
         the account's roster. It also calls ``headstock.client.BaseClient.ready`` so
         that registered handlers are notified of the bound session.
 
+        * ``headstock.error.HeadstockSessionResumed`` when a previous session
+        was resumed through Stream Management. The stanzas the server didn't
+        acknowledge are sent again and ``headstock.client.BaseClient.ready``
+        is called without asking for the roster.
+
+        * ``headstock.error.HeadstockStopDispatch`` when the handlers of lower
+        priority shouldn't be called. The stanzas it carries are sent.
+
         ``e`` :class:`bridge.Element` instance that has been dispatched
         by the XML parser.
 
@@ -276,28 +793,45 @@ class BaseClient(object):
         be sent to the server.  You may also return a list of :class:`bridge.Element`
         instances.
 
-        ``fire_once`` flag indicating if the handler should be applied
-        only once or for ever.
-
-        ``forget`` flags indicating if the dispatched :class:`bridge.Element` instance
-        should be forgotten to free memory it uses.
+        ``timed`` True - flag indicating if the call should be timed
+        and reported to the metrics, the profiler and the hooks
         """
-        self.log(e, 'INCOMING')
-        
-        if fire_once:
-            self.parser.unregister_on_element(e.xml_name, e.xml_ns)
-
+        stop = False
         stanza = None
         try:
-            stanza = handler(e)
+            if timed:
+                stanza = self.timed_call(e, handler)
+            else:
+                stanza = handler(e)
+        except HeadstockStopDispatch, exc:
+            stop = True
+            stanza = exc.stanza
         except HeadstockStartTLS:
             self.start_tls()
         except HeadstockAuthenticationSuccess:
             self.parser.reset()
             self.send_stream_header()
+        except HeadstockAuthenticationFailure:
+            self.log(traceback=True)
+            self.auth_failed = True
+            self.stop()
         except HeadstockSessionBound:
             self.jid = self.stream.jid
+            pending = []
+            if self.sm and self.sm.supported:
+                pending = self.sm.pending()
+                self.send_stanza(self.sm.enable_request())
             self.send_stanza(self.stream.notify_presence())
+            for stanza in pending:
+                self.send_stanza(stanza)
+            stanza = None
+        except HeadstockSessionResumed:
+            self.jid = self.stream.jid
+            for stanza in self.sm.pending():
+                self.send_stanza(stanza)
+            stanza = None
+            self.unregister(self.stream)
+            self.ready()
         except HeadstockAvailable:
             if hasattr(self.stream, "ask_roster"):
                 self.send_stanza(self.stream.ask_roster())
@@ -305,15 +839,72 @@ class BaseClient(object):
             self.ready()
         except HeadstockStreamError:
             pass
-        else:
-            if stanza:
-                if isinstance(stanza, list):
-                    map(self.send_stanza, stanza)
-                else:
-                    self.send_stanza(stanza)
 
-        if forget:
-            e.forget()
+        if stanza:
+            if isinstance(stanza, list):
+                map(self.send_stanza, stanza)
+            else:
+                self.send_stanza(stanza)
+
+        return stop
+
+    @property
+    def reconnecting(self):
+        """
+        `True` while a reconnect attempt is scheduled.
+        """
+        return self._reconnect_timer is not None and self._reconnect_timer.active
+
+    def schedule_reconnect(self):
+        """
+        Called by the backends when the connection was lost.
+
+        Asks the reconnect policy how long to wait and schedules
+        :meth:`reconnect` accordingly. Returns `False` if the client
+        should stop instead, because it has no policy, was stopping,
+        failed to authenticate or the policy gave up.
+        """
+        policy = self.reconnect_policy
+        if policy is None or not self.running or self.auth_failed:
+            return False
+
+        delay = policy.delay(self.reconnect_attempts)
+        if delay is None:
+            return False
+
+        self.reconnect_attempts += 1
+        self.available = False
+        self.log("Connection lost, reconnecting in %.2fs (attempt %d)" % (delay, self.reconnect_attempts))
+        self._reconnect_timer = self.timers.schedule(delay, self.reconnect)
+        return True
+
+    def cancel_reconnect(self):
+        """
+        Cancels a scheduled reconnect attempt.
+        """
+        if self._reconnect_timer is not None:
+            self._reconnect_timer.cancel()
+            self._reconnect_timer = None
+
+    def reset_session(self):
+        """
+        Prepares the client for a new connection.
+
+        The parser is reset and the stream handlers registered again
+        while other handlers, IQ handlers and pending requests are kept.
+        The stream keeps the bound JID so that the same resource
+        is requested again.
+        """
+        self.parser.reset()
+        self.available = False
+        self._last_inbound = None
+
+        if self.stream in self.handlers:
+            self.unregister(self.stream)
+        self.register(self.stream)
+
+        if self.sm and not self.sm.resumable:
+            self.sm.reset()
 
     ##########################################
     # Public API to be overriden if needed
@@ -347,11 +938,18 @@ class BaseClient(object):
         """
         self.running = True
 
+    def reconnect(self):
+        """
+        Connects again to the server. Called once the delay
+        decided by the reconnect policy has elapsed.
+        """
+        raise NotImplemented()
+
     def stop(self):
         """
         Stops the client by closing the stream.
         """
-        self.send_raw_stanza(self.stream.terminate() or '')
+        self.send_raw(self.stream.terminate() or '')
             
     def socket_error(self, msg=None):
         """
@@ -369,6 +967,7 @@ class BaseClient(object):
         """
         self.available = True
         self.running = True
+        self.reconnect_attempts = 0
         for handler in self.handlers:
             if hasattr(handler, 'ready'):
                 handler.ready(self)
@@ -388,6 +987,33 @@ class BaseClient(object):
             if hasattr(handler, 'stopping'):
                 handler.stopping()
 
+    def high_water(self):
+        """
+        Called whenever the output queue of the backend
+        goes above its high-water mark.
+
+        This goes through registered handlers and
+        calls their `high_water(client)` method if they
+        declare one so that they can throttle what they send.
+        """
+        for handler in self.handlers:
+            if hasattr(handler, 'high_water'):
+                handler.high_water(self)
+
+    def low_water(self):
+        """
+        Called whenever the output queue of the backend
+        was drained below its low-water mark after having
+        reached its high-water mark.
+
+        This goes through registered handlers and
+        calls their `low_water(client)` method if they
+        declare one.
+        """
+        for handler in self.handlers:
+            if hasattr(handler, 'low_water'):
+                handler.low_water(self)
+
     def cleanup(self):
         """
         Called after the socket was closed.
@@ -398,6 +1024,8 @@ class BaseClient(object):
         """
         self.available = False
         self.log("Cleaning up before terminating the XMPP client")
+        for future in self.pending_requests.values():
+            future.cancel()
         for handler in self.handlers:
             if hasattr(handler, 'cleanup'):
                 handler.cleanup()
@@ -421,16 +1049,44 @@ class BaseClient(object):
             self.logger.close()
             self.logger = None
 
+        if self.profiler is not None:
+            self.set_profiler(None)
+
+        if self.executor is not None and self._own_executor:
+            self.executor.close()
+            self.executor = None
+        self.offloaded.clear()
+
 from headstock.stream import ComponentStream
 
 class BaseComponent(BaseClient):
-    def __init__(self, service, secret, tls=False):
+    """
+    Base class of the components connecting to a server
+    through the Jabber Component Protocol (XEP-0114).
+
+    ``service`` domain of the component
+
+    ``secret`` secret shared with the server
+
+    ``tls`` False - unused, kept for symmetry with :class:`BaseClient`
+
+    ``router`` None - :class:`headstock.lib.router.ComponentRouter`
+    instance the stanzas it routes are handed to, before the handlers
+    registered for the same elements.
+    """
+    def __init__(self, service, secret, tls=False, router=None):
         self.parser = DispatchParser()
 
         self.running = False
 
         self.handlers = []
-        self.iq_handlers = []
+        self.chains = {}
+        self.iq_handlers = IQRouter()
+        self.timers = TimerWheel()
+        self.pending_requests = {}
+        self.executor = None
+        self.offloaded = {}
+        self._own_executor = False
         
         self.logger = None
         self.secret = secret
@@ -438,9 +1094,22 @@ class BaseComponent(BaseClient):
         
         self.stream = ComponentStream(self.jid)
         self.register(self.stream)
+        self.sm = None
+        self._last_inbound = None
+        self.reconnect_policy = None
+        self.reconnect_attempts = 0
+        self._reconnect_timer = None
         self.parser.register_default(self.default_handler)
+        self.init_metrics()
+        self.init_hooks()
         self.parser.register_default_start_element(self.handle_stream)
 
+        self.router = router
+        if router is not None:
+            for name in router.stanzas:
+                self.chain(name, XMPP_COMPONENT_ACCEPT_NS).add(HandlerEntry(router.route,
+                                                                            owner=router))
+
     def handle_stream(self, e):
         self.parser.unregister_default_start_element() 
         credentials = compute_handshake(e.get_attribute_value('id'), self.secret)
@@ -448,36 +1117,143 @@ class BaseComponent(BaseClient):
                            content=credentials))  
 
 
+class Waker(asyncore.dispatcher):
+    """
+    Wakes an :mod:`asyncore` loop up from another thread
+    through a socket pair and applies ``callback`` on the loop.
+
+    ``callback`` callable applied without argument
+
+    ``map`` None - map of the loop
+    """
+    def __init__(self, callback, map=None):
+        reader, self.writer = socket.socketpair()
+        self.writer.setblocking(False)
+        asyncore.dispatcher.__init__(self, reader, map=map)
+        self.callback = callback
+
+    def wake(self):
+        """
+        Makes the loop apply the callback. May be
+        called from any thread.
+        """
+        try:
+            self.writer.send('x')
+        except socket.error:
+            # full, the loop is awake already, or closed
+            pass
+
+    def writable(self):
+        return False
+
+    def handle_read(self):
+        try:
+            self.recv(4096)
+        except socket.error:
+            pass
+        self.callback()
+
+    def handle_close(self):
+        self.close()
+
+    def close(self):
+        asyncore.dispatcher.close(self)
+        self.writer.close()
+
+
 class AsyncClient(asyncore.dispatcher, BaseClient):
-    def __init__(self, jid, password, hostname='localhost', port=5222, tls=False, registercls=None, map=None):
+    """
+    Client based on :mod:`asyncore`.
+
+    Outgoing stanzas are queued into a :class:`headstock.lib.buffers.WriteQueue`
+    instance available as the ``buffer`` attribute. When more than
+    ``high_water`` bytes are queued, :meth:`BaseClient.high_water` is called
+    and once the queue has drained :meth:`BaseClient.low_water` follows.
+
+    Incoming data is read into a :class:`headstock.lib.buffers.ReadBuffer`
+    instance, available as the ``inbuffer`` attribute, whose read size
+    varies between ``read_size_min`` and ``read_size_max`` bytes depending
+    on the traffic.
+
+    When a ``reconnect`` policy is set, a lost connection is
+    opened again on the same instance once the policy's delay has
+    elapsed. See :class:`BaseClient`.
+
+    Once a handler has been offloaded, a :class:`Waker` sharing
+    the map of the client wakes the loop up as soon as offloaded
+    handlers complete.
+    """
+    _waker = None
+
+    def __init__(self, jid, password, hostname='localhost', port=5222, tls=False,
+                 registercls=None, map=None, high_water=1048576,
+                 read_size_min=4096, read_size_max=262144, sm=False, reconnect=None):
         asyncore.dispatcher.__init__(self, map=map)
         #delattr(asyncore.dispatcher, 'log')
         
-        BaseClient.__init__(self, jid, password, tls, registercls)
+        BaseClient.__init__(self, jid, password, tls, registercls, sm, reconnect)
         
-        self.buffer = ""
+        self.buffer = WriteQueue(high_water)
+        self.inbuffer = ReadBuffer(read_size_min, read_size_max)
+        self.throttled = False
 
+        self.address = (hostname, port)
         self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.connect((hostname, port))
+        self.connect(self.address)
 
     def log(self, stanza=None, prefix='', traceback=False):
         BaseClient.log(self, stanza, prefix, traceback)
         
+    def write_queue_size(self):
+        return self.buffer.queued_bytes
+
     def send_raw_stanza(self, stanza):
         BaseClient.log(self, stanza, 'OUTGOING')
-        self.buffer += stanza
+        self.buffer.append(stanza)
+        if not self.throttled and self.buffer.full:
+            self.throttled = True
+            self.high_water()
 
     def start_tls(self):
         assert ssl, "Python 2.6+ and OpenSSL required for SSL"
         self.socket = ssl.wrap_socket(self.socket, server_side=False)
         self.tls_ok()
 
+    def offload(self, e, entry):
+        if self._waker is None:
+            self._waker = Waker(self.process_timers, map=self._map)
+        BaseClient.offload(self, e, entry)
+
+    def wake_up(self):
+        waker = self._waker
+        if waker is not None:
+            waker.wake()
+
     def start(self):
         self.running = True
         self.run(start_loop=False)
+
+    def reconnect(self):
+        self._reconnect_timer = None
+        self.buffer.clear()
+        self.throttled = False
+        self.reset_session()
+
+        try:
+            self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.connect(self.address)
+        except socket.error:
+            # the server is still unreachable, try again later
+            BaseClient.socket_error(self)
+            self.close()
+            if not self.schedule_reconnect():
+                self.stop()
+            return
+        self.start()
         
     def stop(self):
         self.stopping()
+        self.cancel_reconnect()
         
         if self.connected:
             BaseClient.stop(self)
@@ -485,6 +1261,10 @@ class AsyncClient(asyncore.dispatcher, BaseClient):
 
         self.cleanup()
 
+        if self._waker is not None:
+            self._waker.close()
+            self._waker = None
+
         self.terminated()
 
     def run(self, start_loop=True):
@@ -493,12 +1273,20 @@ class AsyncClient(asyncore.dispatcher, BaseClient):
 
         ``start_loop`` True - flag indicating if the
         :func:`asyncore.loop` function should be called too.
+        The loop wakes up at least every tick of the client's
+        timer wheel so that pending timers are fired.
         """
-        header = self.stream.stream_header()
-        self.send_raw_stanza(header)
+        self.running = True
+        self.send_stream_header()
         
         if start_loop:
-            asyncore.loop(use_poll=True)
+            while self._map or self.reconnecting:
+                if self._map:
+                    asyncore.loop(timeout=self.timers.resolution, use_poll=True,
+                                  map=self._map, count=1)
+                else:
+                    time.sleep(self.timers.resolution)
+                self.process_timers()
         
     def writable(self):
         return len(self.buffer) > 0
@@ -508,35 +1296,78 @@ class AsyncClient(asyncore.dispatcher, BaseClient):
 
     def handle_error(self):
         BaseClient.socket_error(self)
-        self.stop()
+        self.handle_close()
         
     def handle_close(self):
+        if self.schedule_reconnect():
+            self.close()
+            return
         self.stop()
 
     def handle_read(self):
-        data = self.recv(4096)
+        """
+        Reads what the socket has into the reusable receive buffer
+        and feeds it to the parser.
+
+        The received bytes are copied once, into the string handed to
+        the parser: it doesn't accept a `memoryview`, and the view would
+        be overwritten by the next read while the parser, the logger or
+        the ``on_feed`` hooks may keep the data. That copy is the only
+        one made, the socket layer writing straight into the buffer.
+        """
         try:
-            self.parser.feed(data)
+            data = self.inbuffer.read(self.socket)
+        except socket.error, why:
+            if why.args[0] in _DISCONNECTED:
+                self.handle_close()
+                return
+            raise
+
+        if not data:
+            self.handle_close()
+            return
+
+        try:
+            self.feed(data.tobytes())
         except SAXParseException, exc:
             self.log(traceback=True)
 
     def handle_write(self):
-        sent = self.send(self.buffer)
-        self.buffer = self.buffer[sent:]
+        try:
+            self.buffer.send(self.socket)
+        except socket.error, why:
+            if why.args[0] in (errno.EWOULDBLOCK, errno.EAGAIN):
+                return
+            elif why.args[0] in _DISCONNECTED:
+                self.handle_close()
+                return
+            raise
+
+        if self.throttled and self.buffer.drained:
+            self.throttled = False
+            self.low_water()
 
 
 class AsyncComponent(AsyncClient, BaseComponent):
+    """
+    Component counterpart of :class:`AsyncClient`, its
+    buffers are set up the same way.
+    """
     def __init__(self, secret, service, hostname='localhost',
-                 port=5222, tls=False):
-        asyncore.dispatcher.__init__(self)
+                 port=5222, tls=False, map=None, router=None, high_water=1048576,
+                 read_size_min=4096, read_size_max=262144):
+        asyncore.dispatcher.__init__(self, map=map)
         #delattr(asyncore.dispatcher, 'log')
         
-        BaseComponent.__init__(self, secret, service)
+        BaseComponent.__init__(self, secret, service, router=router)
         
-        self.buffer = ""
+        self.buffer = WriteQueue(high_water)
+        self.inbuffer = ReadBuffer(read_size_min, read_size_max)
+        self.throttled = False
 
+        self.address = (hostname, port)
         self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.connect((hostname, port))
+        self.connect(self.address)
 
 try:
     from Axon.Component import component
@@ -635,11 +1466,15 @@ if HAS_KAMAELIA:
                 if self.dataReady("inbox"):
                     data = self.recv('inbox')
                     try:
-                        self.parser.feed(data)
+                        self.feed(data)
                     except SAXParseException, exc:
                         self.log(traceback=True)
 
-                if self.running and not self.anyReady():
+                self.process_timers()
+
+                # pausing would keep pending timers, such as
+                # request timeouts, from firing
+                if self.running and not self.anyReady() and not self.timers:
                     self.pause()
 
                 yield 1
@@ -682,6 +1517,9 @@ try:
     from tornado.iostream import IOStream
     from tornado import ioloop
     HAS_TORNADO = True
+    # Tornado 4.0+ can return whatever is available
+    # instead of waiting for an exact number of bytes
+    TORNADO_PARTIAL_READS = 'partial' in inspect.getargspec(IOStream.read_bytes)[0]
     try:
         import ssl # Python 2.6+
     except ImportError:
@@ -691,19 +1529,48 @@ except ImportError:
     
 if HAS_TORNADO:
     class TornadoClient(BaseClient):
-        def __init__(self, jid, password, hostname='localhost', port=5222, tls=False, registercls=None):
-            BaseClient.__init__(self, jid, password, tls, registercls)
+        """
+        Client based on Tornado's :class:`IOStream`.
+
+        Incoming data is fed to the parser in chunks of up to
+        ``read_size`` bytes as soon as they are available.
+        """
+        def __init__(self, jid, password, hostname='localhost', port=5222, tls=False,
+                     registercls=None, read_size=65536, sm=False, reconnect=None):
+            BaseClient.__init__(self, jid, password, tls, registercls, sm, reconnect)
+            self.read_size = read_size
+            self.address = (hostname, port)
             
+            self._connect()
+            self._timers = ioloop.PeriodicCallback(self.process_timers,
+                                                   self.timers.resolution * 1000)
+            self._timers.start()
+
+        def _connect(self):
             s = socket.socket(socket.AF_INET, socket.SOCK_STREAM, 0)
-            s.connect((hostname, port))
             self.io = IOStream(s)
             self.io.set_close_callback(self.socket_error)
-            self._read()
+            # the connection completes on the loop, what is written
+            # meanwhile is queued by the stream and a failure
+            # calls the close callback
+            self.io.connect(self.address, self._read)
 
         def socket_error(self):
             BaseClient.socket_error(self)
+            if self.schedule_reconnect():
+                return
             self.stop()
 
+        def reconnect(self):
+            self._reconnect_timer = None
+            self.reset_session()
+            try:
+                self._connect()
+            except socket.error:
+                self.socket_error()
+                return
+            self.start()
+
         def send_raw_stanza(self, stanza):
             self.log(stanza, 'OUTGOING')
             self.io.write(stanza)
@@ -716,13 +1583,20 @@ if HAS_TORNADO:
                                         self.io._handle_events, self.io._state)
             self.tls_ok()
 
+        def wake_up(self):
+            # the only thread-safe method of the loop
+            ioloop.IOLoop.instance().add_callback(self.process_timers)
+
         def start(self):
             self.running = True
             self.run(start_loop=False)
             
         def stop(self, stop_loop=False):
             self.stopping()
+            self.cancel_reconnect()
             
+            self._timers.stop()
+
             if not self.io.closed():
                 BaseClient.stop(self)
                 
@@ -743,21 +1617,33 @@ if HAS_TORNADO:
             ``start_loop`` True - flag indicating if the
             :func:`ioloop.IOLoop.start` method should be called too.
             """
-            header = self.stream.stream_header()
-            self.send_raw_stanza(header)
+            self.running = True
+            self.send_stream_header()
             
             if start_loop:
                 ioloop.IOLoop.instance().start()
                   
         def handle_read(self, data):
+            if not data:
+                return
             try:
-                self.parser.feed(data)
+                self.feed(data)
             except SAXParseException, exc:
                 self.log(traceback=True)
-            self._read()
+
+        def _handle_chunk(self, data):
+            self.handle_read(data)
+            if not self.io.closed():
+                self._read()
       
         def _read(self):
-            self.io.read_until(">", self.handle_read)
+            if TORNADO_PARTIAL_READS:
+                self.io.read_bytes(self.read_size, self._handle_chunk, partial=True)
+            else:
+                # Older releases stream chunks as they are read
+                # until the connection is closed
+                self.io.read_until_close(self.handle_read,
+                                         streaming_callback=self.handle_read)
 
 try:
     from circuits import Component
@@ -787,7 +1673,7 @@ if HAS_CIRCUITS:
         @handler("read")
         def handle_read(self, data):
             try:
-                self.client.parser.feed(data)
+                self.client.feed(data)
             except SAXParseException, exc:
                 self.client.log(traceback=True)
       
@@ -826,7 +1712,211 @@ if HAS_CIRCUITS:
             self.terminated()
 
         def run(self):
-            header = self.stream.stream_header()
-            self.send_raw_stanza(header)
+            self.send_stream_header()
             self.c.run()
             
+
+try:
+    import asyncio
+    HAS_ASYNCIO = True
+except ImportError:
+    try:
+        import trollius as asyncio
+        HAS_ASYNCIO = True
+    except ImportError:
+        HAS_ASYNCIO = False
+
+if HAS_ASYNCIO:
+    from collections import deque
+    __all__.extend(["AsyncioClient", "AsyncioComponent"])
+
+    # trollius releases older than 2.0 only provide async()
+    ensure_future = getattr(asyncio, 'ensure_future', None) or getattr(asyncio, 'async')
+
+    class AsyncioClient(asyncio.Protocol, BaseClient):
+        """
+        Client running as a :class:`asyncio.Protocol` so that many sessions
+        can share a single event loop. As headstock runs on Python 2, the
+        event loop is provided by `trollius`, the Python 2 port of
+        :mod:`asyncio`, and the client sticks to the API both share.
+
+        Received data is fed straight into the XML parser. Outgoing stanzas
+        are written to the transport unless it asked us to pause writing,
+        in which case they are queued until it resumes.
+
+        ``loop`` None - event loop to use, the default one when `None`.
+
+        ``ssl_context`` None - :class:`ssl.SSLContext` instance used
+        once STARTTLS was negotiated. Defaults to the context returned
+        by :func:`ssl.create_default_context`, which checks the
+        certificate of the server against the domain of the JID.
+        """
+        def __init__(self, jid, password, hostname='localhost', port=5222,
+                     tls=False, registercls=None, loop=None, sm=False, reconnect=None,
+                     ssl_context=None):
+            BaseClient.__init__(self, jid, password, tls, registercls, sm, reconnect)
+            self._init_transport(hostname, port, loop, ssl_context)
+
+        def _init_transport(self, hostname, port, loop, ssl_context=None):
+            self.hostname = hostname
+            self.port = port
+            self.loop = loop or asyncio.get_event_loop()
+            self.ssl_context = ssl_context
+            self.transport = None
+            self.paused = False
+            self.pending = deque()
+            self._ticker = None
+            self._closed = False
+            self._tls = False
+            self._detached = 0
+
+        def write_queue_size(self):
+            size = sum([len(data) for data in self.pending])
+            if self.transport is not None:
+                size += self.transport.get_write_buffer_size()
+            return size
+
+        def send_raw_stanza(self, stanza):
+            self.log(stanza, 'OUTGOING')
+            if isinstance(stanza, unicode):
+                stanza = stanza.encode('utf-8')
+            if self.transport is None or self.paused:
+                self.pending.append(stanza)
+            else:
+                self.transport.write(stanza)
+
+        def start_tls(self):
+            assert ssl, "Python 2.7.9+ and OpenSSL required for SSL"
+            context = self.ssl_context or ssl.create_default_context()
+
+            # trollius can't upgrade a transport in place. The socket
+            # is duplicated, the plain transport dropped and a TLS
+            # connection is made over the copy. Stanzas sent meanwhile
+            # are queued until it is established.
+            transport, self.transport = self.transport, None
+            raw = transport.get_extra_info('socket')
+            sock = socket.socket(_sock=socket.fromfd(raw.fileno(), raw.family, raw.type))
+            self._detached += 1
+            transport.abort()
+
+            self._tls = True
+            task = ensure_future(self.loop.create_connection(lambda: self, sock=sock, ssl=context,
+                                                             server_hostname=self.jid.domain))
+            task.add_done_callback(self._connected)
+
+        def connect(self):
+            """
+            Opens the connection to the server and returns
+            the connection task.
+            """
+            task = ensure_future(self.loop.create_connection(lambda: self,
+                                                             self.hostname, self.port))
+            task.add_done_callback(self._connected)
+            return task
+
+        def _connected(self, task):
+            if not task.cancelled() and task.exception() is not None:
+                self.log(str(task.exception()), prefix='ERROR')
+                self.connection_lost(None)
+
+        def wake_up(self):
+            self.loop.call_soon_threadsafe(self.process_timers)
+
+        def start(self):
+            self.running = True
+            if self._ticker is None:
+                self._ticker = self.loop.call_later(self.timers.resolution, self._tick)
+            return self.connect()
+
+        def reconnect(self):
+            self._reconnect_timer = None
+            self.transport = None
+            self.pending.clear()
+            self.paused = False
+            self._tls = False
+            self.reset_session()
+            self.connect()
+
+        def stop(self):
+            if self._closed:
+                return
+            self._closed = True
+
+            self.stopping()
+            self.cancel_reconnect()
+
+            if self._ticker:
+                self._ticker.cancel()
+                self._ticker = None
+
+            if self.transport is not None:
+                BaseClient.stop(self)
+                self.transport.close()
+                self.transport = None
+
+            self.cleanup()
+
+            self.terminated()
+
+        def run(self, start_loop=True):
+            """
+            Starts the client.
+
+            ``start_loop`` True - flag indicating if the
+            event loop should be run too.
+            """
+            self.start()
+            if start_loop:
+                self.loop.run_forever()
+
+        def _tick(self):
+            self.process_timers()
+            self._ticker = self.loop.call_later(self.timers.resolution, self._tick)
+
+        ##########################################
+        # asyncio.Protocol API
+        ##########################################
+        def connection_made(self, transport):
+            self.transport = transport
+            if self._tls:
+                self._tls = False
+                self.tls_ok()
+            else:
+                self.send_stream_header()
+            self.resume_writing()
+
+        def data_received(self, data):
+            try:
+                self.feed(data)
+            except SAXParseException, exc:
+                self.log(traceback=True)
+
+        def connection_lost(self, exc):
+            if self._detached:
+                # the plain transport dropped by start_tls
+                self._detached -= 1
+                return
+            if exc is not None:
+                self.log(str(exc), prefix='ERROR')
+            self.transport = None
+            if self.schedule_reconnect():
+                return
+            self.stop()
+
+        def pause_writing(self):
+            self.paused = True
+
+        def resume_writing(self):
+            self.paused = False
+            if self.pending:
+                data, self.pending = b''.join(self.pending), deque()
+                self.transport.write(data)
+
+    class AsyncioComponent(AsyncioClient, BaseComponent):
+        """
+        Component counterpart of :class:`AsyncioClient`.
+        """
+        def __init__(self, service, secret, hostname='localhost', port=5347, loop=None,
+                     router=None):
+            BaseComponent.__init__(self, service, secret, router=router)
+            self._init_transport(hostname, port, loop)
@@ -3,7 +3,9 @@
 __all__ = ['HeadstockError', 'HeadstockInvalidError', 
            'HeadstockStreamError', 'HeadstockAuthenticationFailure',
            'HeadstockInvalidStanzaError', 'HeadstockAuthenticationSuccess',
-           'HeadstockSessionBound', 'HeadstockStartTLS', 'HeadstockAvailable']
+           'HeadstockSessionBound', 'HeadstockStartTLS', 'HeadstockAvailable',
+           'HeadstockTimeout', 'HeadstockIQError', 'HeadstockSessionResumed',
+           'HeadstockStopDispatch']
 
 class HeadstockError(StandardError):
     pass
@@ -31,3 +33,31 @@ class HeadstockStartTLS(HeadstockError):
 
 class HeadstockAvailable(HeadstockError):
     pass
+
+class HeadstockSessionResumed(HeadstockError):
+    pass
+
+class HeadstockTimeout(HeadstockError):
+    pass
+
+class HeadstockIQError(HeadstockError):
+    """
+    Raised when an IQ request is answered by an
+    error IQ. The received stanza is available as
+    the ``stanza`` attribute.
+    """
+    def __init__(self, stanza=None):
+        HeadstockError.__init__(self)
+        self.stanza = stanza
+
+class HeadstockStopDispatch(HeadstockError):
+    """
+    Raised by a handler to prevent the handlers of
+    lower priority from being called with the same element.
+
+    ``stanza`` may hold an element, or a list of elements,
+    to send as if the handler had returned them.
+    """
+    def __init__(self, stanza=None):
+        HeadstockError.__init__(self)
+        self.stanza = stanza
@@ -8,6 +8,9 @@
 # http://trac.defuze.org/browser/oss/httpauthfilter
 
 import base64
+import binascii
+import hashlib
+import os
 try:
     from hashlib import md5
 except ImportError:
@@ -16,14 +19,42 @@ except ImportError:
 import random
 
 from headstock.error import HeadstockAuthenticationFailure
+from headstock.lib.cache import LRUCache
 
 __all__ = ['compute_rspauth', 'generate_challenge', \
            'challenge_to_dict', 'compute_digest_response', \
-           'validate_response']
+           'validate_response', 'credentials_hash', 'generate_cnonce']
 
 H = lambda val: md5(val).digest()
 HH = lambda val: md5(val).hexdigest()
 
+_credentials_cache = LRUCache(10000)
+
+def credentials_hash(username, realm, password):
+    """
+    Returns H(username:realm:password), the part of A1 which
+    doesn't change from one exchange to the next. It is cached per
+    user and realm, along with a digest of the password so that a new
+    password isn't given a stale hash.
+
+    The values must be encoded as they are sent, UTF-8 when the
+    server advertises it.
+    """
+    # the password is only kept as a digest
+    key = (username, realm, hashlib.sha256(password).digest())
+    h = _credentials_cache.get(key)
+    if h is None:
+        h = H('%s:%s:%s' % (username, realm, password))
+        _credentials_cache.set(key, h)
+    return h
+
+def generate_cnonce():
+    """
+    Returns a new client nonce drawn from :func:`os.urandom`
+    rather than the shared :mod:`random` generator.
+    """
+    return binascii.hexlify(os.urandom(16))
+
 def generate_challenge():
     return base64.b64encode('nonce="%d",qop="auth",charset=utf-8,algorithm=md5-sess' % int(random.random() * 26804224)).decode('utf-8')
 
@@ -41,7 +72,7 @@ def _A1(params, username, password, **kwargs):
         # This is A1 if qop is set
         # A1 = H( unq(username-value) ":" unq(realm-value) ":" passwd )
         #         ":" unq(nonce-value) ":" unq(cnonce-value)
-        h_a1 = H('%s:%s:%s' % (username, params["realm"], password))
+        h_a1 = credentials_hash(username, params["realm"], password)
         h_a1 = '%s:%s:%s' % (h_a1, params.get("nonce", ''), kwargs["cnonce"])
         authzid = kwargs.get('authzid', None)
         if authzid:
@@ -82,8 +113,8 @@ def compute_digest_response(params, username, password, **kwargs):
     Common additional keyword arguments should be:
     digest_uri -- a string of the form : 'xmpp/hostname' where hostname is the
     name of the remote host
-    cnonce -- unique value identifying this exchange (if not provided a default one
-    will be computed)
+    cnonce -- unique value identifying this exchange (if not provided one is
+    generated by generate_cnonce)
     nc -- count of number of requests made so far by the client (default to '00000001')
     """
     algorithm = params.get("algorithm", None)
@@ -118,8 +149,7 @@ def compute_digest_response(params, username, password, **kwargs):
         kwargs['nc'] = '00000001'
 
     if 'cnonce' not in kwargs:
-        random.seed()
-        kwargs['cnonce'] = hex(int(random.random() * 26804224))[2:]
+        kwargs['cnonce'] = generate_cnonce()
 
     H_A1 = HH(_A1(params, username, password, **kwargs))
     H_A2 = HH(_A2(params, digest_uri))
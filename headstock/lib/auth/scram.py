@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Implements the client side of: http://tools.ietf.org/html/rfc5802
+# and http://tools.ietf.org/html/rfc7677 (SCRAM-SHA-256), without
+# channel binding.
+
+"""
+The salted password, and the `ClientKey` and `ServerKey` derived
+from it, only depend on the password, the salt and the iteration count
+the server announces. Deriving them takes thousands of HMAC rounds,
+which dominates the time it takes to log in, so they are kept in a
+:class:`ScramKeyCache` shared by the streams of the process:
+reconnecting, or logging in again with the same account, doesn't run
+PBKDF2 again.
+
+When many accounts are about to log in, their keys may be derived
+beforehand in a process pool with :meth:`ScramKeyCache.precompute`,
+given the salt and iteration count of each account. These are
+available as the ``salt`` and ``iterations`` attributes of
+:class:`ScramClient` once the server sent its challenge.
+
+Note that the cached keys are enough to authenticate to the
+server they were derived for and should be protected as such.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+from multiprocessing import Pool
+
+from headstock.error import HeadstockAuthenticationFailure
+from headstock.lib.cache import LRUCache
+from headstock.lib.prep import saslprep
+
+__all__ = ['SCRAM_MECHANISMS', 'ScramClient', 'ScramKeyCache',
+           'derive_keys', 'key_cache']
+
+# in order of preference
+SCRAM_MECHANISMS = (u'SCRAM-SHA-256', u'SCRAM-SHA-1')
+
+HASHES = {u'SCRAM-SHA-1': 'sha1', u'SCRAM-SHA-256': 'sha256'}
+
+# no channel binding
+GS2_HEADER = 'n,,'
+
+def _xor(left, right):
+    return ''.join([chr(ord(a) ^ ord(b)) for a, b in zip(left, right)])
+
+def _hmac(hash_name, key, msg):
+    return hmac.new(key, msg, getattr(hashlib, hash_name)).digest()
+
+def _parse(message):
+    params = {}
+    for token in message.split(','):
+        key, sep, value = token.partition('=')
+        if not sep or len(key) != 1:
+            raise HeadstockAuthenticationFailure("Invalid SCRAM message")
+        params[key] = value
+    return params
+
+def _decode(data):
+    try:
+        return base64.b64decode(data or '')
+    except TypeError:
+        raise HeadstockAuthenticationFailure("Invalid base64 data")
+
+def derive_keys(hash_name, password, salt, iterations):
+    """
+    Returns the ``(client_key, server_key)`` pair derived from the
+    prepared and UTF-8 encoded ``password``.
+
+    ``hash_name`` `'sha1'` or `'sha256'`
+
+    ``salt`` the salt, not base64 encoded
+
+    ``iterations`` the iteration count
+    """
+    salted = hashlib.pbkdf2_hmac(hash_name, password, salt, iterations)
+    return (_hmac(hash_name, salted, 'Client Key'),
+            _hmac(hash_name, salted, 'Server Key'))
+
+def _derive(args):
+    return derive_keys(*args)
+
+class ScramKeyCache(object):
+    """
+    Keys derived for each user, password, salt and iteration
+    count.
+
+    ``maxsize`` 10000 - maximum number of keys kept
+    """
+    def __init__(self, maxsize=10000):
+        self.cache = LRUCache(maxsize)
+
+    def __len__(self):
+        return len(self.cache)
+
+    def key(self, mechanism, username, password, salt, iterations):
+        # the password is only kept as a digest
+        digest = hashlib.sha256(password).digest()
+        return (mechanism, username, digest, salt, iterations)
+
+    def get(self, mechanism, username, password, salt, iterations):
+        """
+        Returns the ``(client_key, server_key)`` pair, deriving and
+        caching it unless it was already.
+
+        ``mechanism`` one of :data:`SCRAM_MECHANISMS`
+
+        ``username`` the prepared user name
+
+        ``password`` the prepared and UTF-8 encoded password
+
+        ``salt`` the salt, not base64 encoded
+
+        ``iterations`` the iteration count
+        """
+        key = self.key(mechanism, username, password, salt, iterations)
+        keys = self.cache.get(key)
+        if keys is None:
+            keys = derive_keys(HASHES[mechanism], password, salt, iterations)
+            self.cache.set(key, keys)
+        return keys
+
+    def precompute(self, credentials, processes=None):
+        """
+        Derives in a process pool the keys which aren't cached yet
+        and returns how many were.
+
+        ``credentials`` iterable of ``(mechanism, username, password,
+        salt, iterations)`` tuples, the user name and password not
+        necessarily prepared
+
+        ``processes`` None - size of the pool, defaults to the
+        number of CPUs
+        """
+        keys = []
+        jobs = []
+        for mechanism, username, password, salt, iterations in credentials:
+            username = saslprep(username)
+            password = saslprep(password).encode('utf-8')
+            key = self.key(mechanism, username, password, salt, iterations)
+            if key not in self.cache and key not in keys:
+                keys.append(key)
+                jobs.append((HASHES[mechanism], password, salt, iterations))
+
+        if jobs:
+            pool = Pool(processes)
+            try:
+                results = pool.map(_derive, jobs)
+            finally:
+                pool.terminate()
+            for key, result in zip(keys, results):
+                self.cache.set(key, result)
+
+        return len(jobs)
+
+    def clear(self):
+        self.cache.clear()
+
+key_cache = ScramKeyCache()
+
+class ScramClient(object):
+    """
+    Client side of a SCRAM exchange.
+
+    ``mechanism`` one of :data:`SCRAM_MECHANISMS`
+
+    ``username`` the user name, the node of the JID
+
+    ``password`` the password
+
+    ``cache`` None - :class:`ScramKeyCache` instance, defaults
+    to the cache shared by the process
+
+    ``nonce`` None - the client nonce, only meant for testing
+    """
+    def __init__(self, mechanism, username, password, cache=None, nonce=None):
+        if mechanism not in HASHES:
+            raise ValueError("Unsupported mechanism: %s" % mechanism)
+        self.mechanism = mechanism
+        self.hash_name = HASHES[mechanism]
+        self.username = saslprep(username)
+        self.password = saslprep(password).encode('utf-8')
+        if cache is None:
+            cache = key_cache
+        self.cache = cache
+        self.nonce = nonce or base64.b64encode(os.urandom(18))
+
+        self.first_bare = None
+        self.salt = None
+        self.iterations = None
+        self.auth_message = None
+        self.server_signature = None
+        self.verified = False
+
+    def first_message(self):
+        """
+        Returns the initial response sent with the `<auth />`
+        element, base64 encoded.
+        """
+        name = self.username.encode('utf-8').replace('=', '=3D').replace(',', '=2C')
+        self.first_bare = 'n=%s,r=%s' % (name, self.nonce)
+        return base64.b64encode(GS2_HEADER + self.first_bare).decode('utf-8')
+
+    def respond(self, challenge):
+        """
+        Returns the response, base64 encoded, to the
+        base64 encoded ``challenge`` of the server.
+
+        Raises :class:`headstock.error.HeadstockAuthenticationFailure`
+        when the challenge is invalid.
+        """
+        if self.auth_message is not None:
+            # the server sent its final message as a challenge
+            self.verify(challenge)
+            return u''
+
+        server_first = _decode(challenge)
+        params = _parse(server_first)
+        if 'm' in params:
+            raise HeadstockAuthenticationFailure("Unsupported SCRAM extension")
+        nonce = params.get('r', '')
+        if not nonce.startswith(self.nonce) or nonce == self.nonce:
+            raise HeadstockAuthenticationFailure("Invalid server nonce")
+        try:
+            self.salt = base64.b64decode(params['s'])
+            self.iterations = int(params['i'])
+        except (KeyError, TypeError, ValueError):
+            raise HeadstockAuthenticationFailure("Invalid salt or iteration count")
+        if self.iterations < 1:
+            raise HeadstockAuthenticationFailure("Invalid iteration count")
+
+        client_key, server_key = self.cache.get(self.mechanism, self.username,
+                                                self.password, self.salt,
+                                                self.iterations)
+        final = 'c=%s,r=%s' % (base64.b64encode(GS2_HEADER), nonce)
+        self.auth_message = '%s,%s,%s' % (self.first_bare, server_first, final)
+
+        stored_key = getattr(hashlib, self.hash_name)(client_key).digest()
+        signature = _hmac(self.hash_name, stored_key, self.auth_message)
+        proof = base64.b64encode(_xor(client_key, signature))
+        self.server_signature = _hmac(self.hash_name, server_key, self.auth_message)
+
+        return base64.b64encode('%s,p=%s' % (final, proof)).decode('utf-8')
+
+    def verify(self, data):
+        """
+        Checks the server signature carried by the base64 encoded
+        ``data`` of the final message of the server.
+
+        Raises :class:`headstock.error.HeadstockAuthenticationFailure`
+        when the server couldn't prove it knows the password.
+        """
+        if self.server_signature is None:
+            raise HeadstockAuthenticationFailure("SCRAM exchange not completed")
+        params = _parse(_decode(data))
+        if 'e' in params:
+            raise HeadstockAuthenticationFailure(params['e'])
+        signature = _decode(params.get('v'))
+        if not hmac.compare_digest(signature, self.server_signature):
+            raise HeadstockAuthenticationFailure("Invalid server signature")
+        self.verified = True
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Buffers used by the socket based client backends.
+"""
+from collections import deque
+from itertools import islice
+try:
+    import ssl
+except ImportError:
+    ssl = None
+
+__all__ = ['WriteQueue', 'ReadBuffer']
+
+# Maximum number of buffers handed to a single sendmsg call
+IOV_MAX = 64
+
+class WriteQueue(object):
+    """
+    Output queue holding stanzas waiting to be written onto
+    a socket.
+
+    Each stanza is kept as its own chunk, wrapped into a `memoryview`
+    so that partial writes never copy the remaining data. When the
+    socket supports it, several chunks are written at once with
+    `socket.sendmsg`. Otherwise, as with TLS sockets and Python 2, the
+    chunks at the head of the queue are joined, up to ``max_send`` bytes,
+    so that a burst of stanzas still goes out in a single write.
+
+    ``high_water`` 1048576 - number of queued bytes above which the
+    queue is considered full and writers should throttle.
+
+    ``low_water`` None - number of queued bytes below which the queue
+    is considered drained again. Defaults to a quarter of ``high_water``.
+
+    ``max_send`` 65536 - maximum number of bytes joined into a
+    single write when `socket.sendmsg` can't be used
+
+    The following counters are maintained:
+
+    * ``queued_bytes``: bytes waiting to be sent
+    * ``queued_stanzas``: stanzas not entirely sent yet
+    * ``sent_bytes``: bytes sent so far
+    * ``sent_stanzas``: stanzas entirely sent so far
+    """
+    def __init__(self, high_water=1048576, low_water=None, max_send=65536):
+        self.high_water = high_water
+        self.low_water = low_water if low_water is not None else high_water // 4
+        self.max_send = max_send
+        self.chunks = deque()
+
+        self.queued_bytes = 0
+        self.queued_stanzas = 0
+        self.sent_bytes = 0
+        self.sent_stanzas = 0
+
+    def __len__(self):
+        return self.queued_bytes
+
+    @property
+    def full(self):
+        """
+        `True` when more than ``high_water`` bytes are queued.
+        """
+        return self.queued_bytes > self.high_water
+
+    @property
+    def drained(self):
+        """
+        `True` when less than ``low_water`` bytes are queued.
+        """
+        return self.queued_bytes < self.low_water
+
+    def append(self, data):
+        """
+        Queues ``data``. Unicode strings are encoded to UTF-8.
+        """
+        if isinstance(data, unicode):
+            data = data.encode('utf-8')
+        if not data:
+            return
+        self.chunks.append(memoryview(data))
+        self.queued_bytes += len(data)
+        self.queued_stanzas += 1
+
+    def send(self, sock):
+        """
+        Writes as much of the queue as ``sock`` accepts and
+        returns the number of bytes sent. Socket errors are
+        left to the caller.
+        """
+        if not self.chunks:
+            return 0
+
+        chunks = self.chunks
+        if len(chunks) == 1:
+            sent = sock.send(chunks[0])
+        else:
+            sendmsg = getattr(sock, 'sendmsg', None)
+            if sendmsg is not None and not (ssl and isinstance(sock, ssl.SSLSocket)):
+                sent = sendmsg(list(islice(chunks, 0, IOV_MAX)))
+            else:
+                sent = sock.send(self.head())
+
+        self.consume(sent)
+        return sent
+
+    def head(self):
+        """
+        Returns the chunks at the head of the queue joined
+        into a single string of at most ``max_send`` bytes, unless
+        the first chunk alone is larger.
+        """
+        chunks = self.chunks
+        if len(chunks[0]) >= self.max_send:
+            return chunks[0]
+
+        parts = []
+        size = 0
+        for chunk in chunks:
+            if size + len(chunk) > self.max_send:
+                break
+            parts.append(chunk.tobytes())
+            size += len(chunk)
+        return ''.join(parts)
+
+    def consume(self, size):
+        """
+        Removes ``size`` bytes from the head of the queue.
+        """
+        self.queued_bytes -= size
+        self.sent_bytes += size
+
+        chunks = self.chunks
+        while size > 0:
+            chunk = chunks[0]
+            if size >= len(chunk):
+                size -= len(chunk)
+                chunks.popleft()
+                self.queued_stanzas -= 1
+                self.sent_stanzas += 1
+            else:
+                chunks[0] = chunk[size:]
+                size = 0
+
+    def clear(self):
+        """
+        Drops every queued chunk.
+        """
+        self.chunks.clear()
+        self.queued_bytes = 0
+        self.queued_stanzas = 0
+
+class ReadBuffer(object):
+    """
+    Reusable receive buffer whose read size adapts to the
+    observed throughput.
+
+    Reads are performed with `socket.recv_into` into a preallocated
+    `bytearray` so that no new string is allocated per read by the
+    socket layer. Every read that fills the buffer doubles the read
+    size, up to ``max_size``, while ``shrink_after`` consecutive reads
+    using less than a quarter of it halve the read size, down to
+    ``min_size``. The underlying `bytearray` only grows.
+
+    ``min_size`` 4096 - smallest read size in bytes
+
+    ``max_size`` 262144 - largest read size in bytes
+
+    ``shrink_after`` 8 - number of consecutive small reads before
+    the read size is reduced
+
+    The total number of bytes read is kept in ``received_bytes``.
+    """
+    def __init__(self, min_size=4096, max_size=262144, shrink_after=8):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.shrink_after = shrink_after
+
+        self.size = min_size
+        self.data = bytearray(min_size)
+        self.view = memoryview(self.data)
+        self._small_reads = 0
+        self.received_bytes = 0
+
+    def read(self, sock):
+        """
+        Reads from ``sock`` and returns a `memoryview` over the bytes
+        received. The view is only valid until the next read.
+        Socket errors are left to the caller.
+        """
+        view = self.view
+        received = sock.recv_into(view, self.size)
+        self.received_bytes += received
+        self.adapt(received)
+        return view[:received]
+
+    def adapt(self, received):
+        """
+        Updates the read size after a read of ``received`` bytes.
+        """
+        if received >= self.size:
+            self._small_reads = 0
+            if self.size < self.max_size:
+                self.size = min(self.size * 2, self.max_size)
+                if self.size > len(self.data):
+                    self.data = bytearray(self.size)
+                    self.view = memoryview(self.data)
+        elif received < self.size // 4:
+            self._small_reads += 1
+            if self._small_reads >= self.shrink_after:
+                self._small_reads = 0
+                self.size = max(self.size // 2, self.min_size)
+        else:
+            self._small_reads = 0
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Bounded memoization cache used on the hot paths, such
+as parsing the JIDs of every incoming stanza.
+
+Keeping an exact LRU order costs a linked list update on every
+hit. The cache instead keeps two generations of plain dictionaries:
+entries are added to the young one and, once it holds half the
+allowed entries, it becomes the old one while the previous old
+generation is dropped. An entry found in the old generation is
+moved back to the young one. Recently used entries therefore survive
+while a hit stays a single dictionary lookup, at the cost of
+only approximating the LRU order.
+"""
+
+__all__ = ['LRUCache']
+
+_missing = object()
+
+class LRUCache(object):
+    """
+    Approximate LRU cache holding at most ``maxsize`` entries.
+    """
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.limit = max(maxsize // 2, 1)
+        self.young = {}
+        self.old = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.young) + len([key for key in self.old if key not in self.young])
+
+    def __contains__(self, key):
+        return key in self.young or key in self.old
+
+    def get(self, key, default=None):
+        """
+        Returns the value cached for ``key``
+        or ``default``.
+        """
+        value = self.young.get(key, _missing)
+        if value is not _missing:
+            self.hits += 1
+            return value
+
+        value = self.old.get(key, _missing)
+        if value is not _missing:
+            self.hits += 1
+            self.set(key, value)
+            return value
+
+        self.misses += 1
+        return default
+
+    def set(self, key, value):
+        """
+        Caches ``value`` for ``key``.
+        """
+        young = self.young
+        if len(young) >= self.limit and key not in young:
+            self.old = young
+            young = self.young = {}
+        young[key] = value
+
+    def clear(self):
+        self.young = {}
+        self.old = {}
+        self.hits = self.misses = 0
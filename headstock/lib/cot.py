@@ -286,9 +286,10 @@ class Cot(object):
         stanza_id, stanza_type = self.sendable.next()
         
         self.current_test_name, stanza = self.current[SEND_MODE][(stanza_id, stanza_type)]
-        stanza = stanza.xml(omit_declaration=True).replace("$(hostname)",
-                                                           self.hostname)
-        e = E.load(stanza).xml_root
+        # substituting the hostname in the serialized stanza spares
+        # us from parsing it back only to serialize it once more
+        stanza = stanza.xml(omit_declaration=True, indent=False).replace(u"$(hostname)",
+                                                                         self.hostname)
 
         for stanza_id, stanza_type in self.current[EXPECT_MODE]:
             self.keys.append((stanza_id, stanza_type))
@@ -296,7 +297,7 @@ class Cot(object):
                                        id=stanza_id, type=stanza_type,
                                        once=True)
         self._last = time.time()
-        self.client.send_stanza(e)
+        self.client.send_stanza(stanza)
             
     def _handle_response(self, e):
         """
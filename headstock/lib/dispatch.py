@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Ordered chains of handlers sharing the same element name
+and namespace.
+
+The XML parser only keeps one callback per element, the client
+therefore registers a single dispatcher per element and fans out
+to a :class:`HandlerChain`. Entries are kept sorted by decreasing
+priority, then by registration order, and their predicates are
+checked against the element before the handler is called.
+"""
+from itertools import count
+
+from headstock.lib.jid import JID
+
+__all__ = ['HandlerEntry', 'HandlerChain']
+
+class HandlerEntry(object):
+    """
+    A handler registered in a chain.
+
+    ``handler`` callable applied with the dispatched element
+
+    ``owner`` None - object the handler belongs to, used to
+    remove all the entries of a handler instance at once
+
+    ``once`` False - flag indicating if the entry should be removed
+    once it has been called
+
+    ``forget`` True - flag indicating if the dispatched element
+    can be forgotten once the entry has been called
+
+    ``priority`` 0 - entries with a higher priority are called first
+
+    ``predicates`` None - dictionary of conditions the element must
+    fulfill for the handler to be called:
+
+    * ``type``: value, or list of values, of the `type` attribute
+    * ``from``: JID the `from` attribute must be equal to, once both
+      are prepared. A bare JID also matches any of its full JIDs.
+    * ``child``: namespace, or list of namespaces, one of the
+      children of the element must belong to
+
+    ``executor`` None - `'thread'` or `'process'` when the handler
+    runs in a pool, see :mod:`headstock.lib.executor`
+    """
+    def __init__(self, handler, owner=None, once=False, forget=True,
+                 priority=0, predicates=None, executor=None):
+        self.handler = handler
+        self.owner = owner
+        self.once = once
+        self.forget = forget
+        self.priority = priority
+        self.executor = executor
+        self.active = True
+        self.predicates = self.compile(predicates or {})
+
+    def compile(self, predicates):
+        """
+        Turns ``predicates`` into a tuple of checks
+        performed by :meth:`matches`.
+        """
+        checks = []
+        for kind in ('type', 'from', 'child'):
+            value = predicates.get(kind)
+            if value is None:
+                continue
+            if kind == 'from':
+                jid = value if isinstance(value, JID) else JID.parse(value)
+                if jid is None:
+                    raise ValueError("Invalid JID: %r" % (value,))
+                checks.append((kind, jid))
+            else:
+                if isinstance(value, basestring):
+                    value = [value]
+                checks.append((kind, frozenset(value)))
+        for kind in predicates:
+            if kind not in ('type', 'from', 'child'):
+                raise ValueError("Unknown predicate: %s" % kind)
+        return tuple(checks)
+
+    def matches(self, e):
+        """
+        Returns `True` if the element ``e`` fulfills
+        every predicate of this entry.
+        """
+        for kind, value in self.predicates:
+            if kind == 'type':
+                if e.get_attribute_value('type') not in value:
+                    return False
+            elif kind == 'from':
+                sender = JID.parse(e.get_attribute_value('from'))
+                if sender is None:
+                    return False
+                if sender != value and (value.resource or sender.bare != value):
+                    return False
+            elif kind == 'child':
+                for child in e.xml_children:
+                    if getattr(child, 'xml_ns', None) in value:
+                        break
+                else:
+                    return False
+        return True
+
+class HandlerChain(object):
+    """
+    Entries registered for one element name and namespace.
+    """
+    def __init__(self):
+        self.entries = []
+        self._seq = count()
+        self._keys = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def add(self, entry):
+        """
+        Inserts ``entry`` according to its priority. Entries of the
+        same priority are kept in registration order.
+        """
+        self._keys[entry] = (-entry.priority, self._seq.next())
+        self.entries.append(entry)
+        self.entries.sort(key=self._keys.__getitem__)
+        return entry
+
+    def remove(self, entry):
+        """
+        Removes ``entry`` from the chain. Unknown entries
+        are ignored.
+        """
+        if entry in self._keys:
+            del self._keys[entry]
+            self.entries.remove(entry)
+            entry.active = False
+
+    def remove_owner(self, owner):
+        """
+        Removes all the entries belonging to ``owner``.
+        """
+        for entry in [entry for entry in self.entries if entry.owner is owner]:
+            self.remove(entry)
+
+    def clear(self):
+        """
+        Removes all the entries.
+        """
+        for entry in self.entries:
+            entry.active = False
+        self.entries = []
+        self._keys.clear()
+
+    def match(self, e):
+        """
+        Returns the list of active entries, in calling
+        order, whose predicates are fulfilled by ``e``.
+        """
+        return [entry for entry in self.entries \
+                    if not entry.predicates or entry.matches(e)]
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Runs handlers away from the I/O loop.
+
+Handlers declared with ``@xmpphandler(..., executor='thread')`` or
+``executor='process'`` are submitted to a :class:`HandlerExecutor`
+rather than called inline, so that a slow handler doesn't stall
+every session sharing the loop.
+
+Jobs are queued by key, the bare JID the stanza comes from, and
+only one job per key runs at any given time so that the stanzas of a
+given contact are handled, and answered, in the order they were
+received. Jobs of different keys run concurrently.
+
+The pools never call back into the client directly: results are
+collected and handed back to the loop when it calls :meth:`HandlerExecutor.process`,
+which the clients do from ``process_timers``. The pool thread collecting
+a result only applies the ``wakeup`` callable given with the job, which
+the backends use to have their loop call ``process_timers`` straight away
+rather than on its next tick.
+
+Handlers are given a copy of the stanza parsed from its serialized
+form so that they never share it with the loop. Handlers run in a
+process must besides belong to a picklable object and changes they
+make to that object are lost. The stanzas they return are serialized
+before being sent back. A call whose arguments or result can't be
+pickled completes with an error, as if the handler had raised it.
+"""
+import cPickle
+import sys
+import time
+import traceback
+from collections import deque
+from multiprocessing.pool import Pool, ThreadPool
+
+__all__ = ['HandlerExecutor']
+
+EXECUTORS = ('thread', 'process')
+
+def _run(func, args, pickled=False):
+    """
+    Applies ``func`` in a pool and returns the
+    ``(result, error, elapsed)`` triple of the call.
+
+    ``pickled`` False - flag indicating if the result is sent
+    back from another process, it is then checked it can be pickled
+    """
+    start = time.time()
+    try:
+        result = func(*args)
+        if pickled:
+            cPickle.dumps(result, cPickle.HIGHEST_PROTOCOL)
+        return result, None, time.time() - start
+    except:
+        return None, _error(), time.time() - start
+
+def _error():
+    from headstock.error import HeadstockError
+    exc = sys.exc_info()[1]
+    if not isinstance(exc, HeadstockError):
+        exc = None
+    return exc, traceback.format_exc()
+
+def local_handler(handler, xml):
+    """
+    Applies ``handler`` within a pool thread with
+    its own copy of the stanza parsed from ``xml``.
+    """
+    from bridge import Element as E
+
+    return handler(E.load(xml).xml_root)
+
+def remote_handler(owner, attribute, xml):
+    """
+    Applies the handler ``attribute`` of ``owner`` within a
+    worker process with the stanza parsed from ``xml`` and returns
+    the stanzas it returned serialized.
+    """
+    from bridge import Element as E
+
+    e = E.load(xml).xml_root
+    stanza = getattr(owner, attribute)(e)
+    if not stanza:
+        return None
+    if not isinstance(stanza, list):
+        stanza = [stanza]
+    return [s if isinstance(s, basestring) else s.xml(omit_declaration=True, indent=False) \
+                for s in stanza]
+
+class Job(object):
+    def __init__(self, kind, func, args, done, wakeup=None):
+        self.kind = kind
+        self.func = func
+        self.args = args
+        self.done = done
+        self.wakeup = wakeup
+
+class HandlerExecutor(object):
+    """
+    Thread and process pools running offloaded handlers.
+
+    ``threads`` 4 - size of the thread pool
+
+    ``processes`` None - size of the process pool, defaults
+    to the number of CPUs
+
+    Pools are only created when a job needs them. The same
+    executor may be shared by several clients running on
+    the same loop.
+    """
+    def __init__(self, threads=4, processes=None):
+        self.threads = threads
+        self.processes = processes
+        self.pools = {}
+        self.queues = {}
+        self.completed = deque()
+
+    def __len__(self):
+        """
+        Number of jobs running or waiting for their turn.
+        """
+        return sum([len(queue) for queue in self.queues.itervalues()])
+
+    def pool(self, kind):
+        """
+        Returns the pool of ``kind``, `thread` or `process`,
+        creating it on first use.
+        """
+        pool = self.pools.get(kind)
+        if pool is None:
+            if kind == 'thread':
+                pool = ThreadPool(self.threads)
+            elif kind == 'process':
+                pool = Pool(self.processes)
+            else:
+                raise ValueError("Unknown executor: %s" % kind)
+            self.pools[kind] = pool
+        return pool
+
+    def submit(self, kind, key, func, args, done, wakeup=None):
+        """
+        Queues ``func`` to be applied with ``args`` in the
+        ``kind`` pool after the jobs already submitted with the
+        same ``key``.
+
+        ``done`` is applied from :meth:`process` with the result,
+        the error and the duration of the call. The error is `None`
+        when the call succeeded, otherwise an
+        ``(exception, traceback)`` pair where the exception is only set
+        when it is a ``headstock.error.HeadstockError``.
+
+        ``wakeup`` None - callable applied without argument from
+        the thread collecting the results of the pool once the call
+        completed, it must therefore be thread-safe. It lets the loop
+        know that :meth:`process` has something to do.
+        """
+        job = Job(kind, func, args, done, wakeup)
+        queue = self.queues.get(key)
+        if queue:
+            queue.append(job)
+        else:
+            self.queues[key] = deque([job])
+            self._start(key, job)
+
+    def _start(self, key, job):
+        completed = self.completed
+        def callback(outcome):
+            completed.append((key, job, outcome))
+            if job.wakeup is not None:
+                job.wakeup()
+
+        args = (job.func, job.args)
+        if job.kind == 'process':
+            # the pool never calls back when the arguments or the
+            # result can't be pickled, which would block the key,
+            # they are checked here and by _run instead
+            try:
+                cPickle.dumps(args, cPickle.HIGHEST_PROTOCOL)
+            except:
+                callback((None, _error(), 0.0))
+                return
+            args += (True,)
+        self.pool(job.kind).apply_async(_run, args, callback=callback)
+
+    def process(self):
+        """
+        Hands the outcome of the completed jobs back to their
+        ``done`` callable and starts the next job of their key.
+        Returns the number of completed jobs.
+        """
+        processed = 0
+        completed = self.completed
+        while completed:
+            key, job, outcome = completed.popleft()
+            queue = self.queues[key]
+            queue.popleft()
+            if queue:
+                self._start(key, queue[0])
+            else:
+                del self.queues[key]
+
+            processed += 1
+            result, error, elapsed = outcome
+            job.done(result, error, elapsed)
+        return processed
+
+    def close(self):
+        """
+        Terminates the pools. Jobs still running are lost.
+        """
+        for pool in self.pools.itervalues():
+            pool.terminate()
+        self.pools.clear()
+        self.queues.clear()
+        self.completed.clear()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Minimal single threaded future used to represent the outcome
+of an asynchronous exchange, such as an IQ request sent through
+:meth:`headstock.client.BaseClient.request`.
+
+Callbacks are applied synchronously from the client's event loop
+as soon as the future completes.
+"""
+
+__all__ = ['Future']
+
+PENDING = 'PENDING'
+CANCELLED = 'CANCELLED'
+FINISHED = 'FINISHED'
+
+class Future(object):
+    """
+    Result of an operation that has not completed yet.
+    """
+    def __init__(self):
+        self._state = PENDING
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def __repr__(self):
+        return '<Future %s>' % self._state.lower()
+
+    def done(self):
+        """
+        Returns `True` if the future has a result, an exception
+        or has been cancelled.
+        """
+        return self._state != PENDING
+
+    def cancelled(self):
+        """
+        Returns `True` if the future has been cancelled.
+        """
+        return self._state == CANCELLED
+
+    def cancel(self):
+        """
+        Cancels the future unless it is already done.
+        Returns `True` if the future was cancelled.
+        """
+        if self._state != PENDING:
+            return False
+        self._state = CANCELLED
+        self._run_callbacks()
+        return True
+
+    def result(self):
+        """
+        Returns the result of the future or raises its
+        exception.
+
+        Raises a `RuntimeError` if the future hasn't completed yet.
+        """
+        if self._state == PENDING:
+            raise RuntimeError("Future has not completed yet")
+        if self._state == CANCELLED:
+            raise RuntimeError("Future was cancelled")
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self):
+        """
+        Returns the exception set on the future or `None`.
+        """
+        if self._state == PENDING:
+            raise RuntimeError("Future has not completed yet")
+        return self._exception
+
+    def add_done_callback(self, callback):
+        """
+        Registers ``callback`` to be applied with the future as
+        its single argument once it completes. If the future
+        is already done, ``callback`` is applied immediately.
+        """
+        if self._state != PENDING:
+            callback(self)
+        else:
+            self._callbacks.append(callback)
+
+    def set_result(self, result):
+        """
+        Completes the future with ``result``.
+        """
+        if self._state != PENDING:
+            raise RuntimeError("Future already completed")
+        self._result = result
+        self._state = FINISHED
+        self._run_callbacks()
+
+    def set_exception(self, exception):
+        """
+        Completes the future with ``exception``.
+        """
+        if self._state != PENDING:
+            raise RuntimeError("Future already completed")
+        self._exception = exception
+        self._state = FINISHED
+        self._run_callbacks()
+
+    def _run_callbacks(self):
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+IQ routing table used by :class:`headstock.client.BaseClient` to
+dispatch IQ responses to the callables registered through
+``register_on_iq``.
+
+Handlers are stored in buckets keyed by their ``(id, type)`` pair
+where either member may be `None` to act as a wildcard. Looking up
+an incoming IQ therefore only inspects the four buckets it could
+possibly match rather than every registered handler.
+"""
+from itertools import count
+
+__all__ = ['IQRouter']
+
+class IQRouter(object):
+    """
+    Routing table of IQ handlers.
+
+    Each bucket is a dictionary mapping a ``(handler, once)`` pair
+    to the sequence number it was registered with so that
+    registration, lookup and removal are all constant time while
+    matching handlers are still applied in their registration order.
+    """
+    def __init__(self):
+        self._buckets = {}
+        self._seq = count()
+
+    def __len__(self):
+        return sum([len(bucket) for bucket in self._buckets.itervalues()])
+
+    def __iter__(self):
+        """
+        Yields ``(id, type, handler, once)`` tuples in
+        registration order.
+        """
+        entries = []
+        for (stanza_id, stanza_type), bucket in self._buckets.iteritems():
+            for (handler, once), seq in bucket.iteritems():
+                entries.append((seq, (stanza_id, stanza_type, handler, once)))
+        entries.sort(key=lambda entry: entry[0])
+        for seq, entry in entries:
+            yield entry
+
+    def add(self, handler, type=None, id=None, once=False):
+        """
+        Adds ``handler`` to the table for the given
+        ``type`` and ``id``.
+        """
+        bucket = self._buckets.setdefault((id, type), {})
+        key = (handler, once)
+        if key not in bucket:
+            bucket[key] = self._seq.next()
+
+    def remove(self, handler, type=None, id=None, once=False):
+        """
+        Removes ``handler`` from the table.
+
+        Raises a `ValueError` if it wasn't registered.
+        """
+        bucket = self._buckets.get((id, type))
+        if bucket is None or (handler, once) not in bucket:
+            raise ValueError("IQ handler not registered")
+        del bucket[(handler, once)]
+        if not bucket:
+            del self._buckets[(id, type)]
+
+    def discard(self, handler, type=None, id=None, once=False):
+        """
+        Same as :meth:`remove` but does not complain when
+        ``handler`` isn't registered.
+        """
+        try:
+            self.remove(handler, type, id, once)
+        except ValueError:
+            pass
+
+    def match(self, stanza_id, stanza_type):
+        """
+        Returns the list of ``(id, type, handler, once)`` tuples
+        matching an IQ with the given identifier and type, in
+        registration order.
+        """
+        buckets = self._buckets
+        matched = []
+        keys = [(stanza_id, stanza_type)]
+        if stanza_type is not None:
+            keys.append((stanza_id, None))
+        if stanza_id is not None:
+            keys.append((None, stanza_type))
+            if stanza_type is not None:
+                keys.append((None, None))
+
+        for key in keys:
+            bucket = buckets.get(key)
+            if bucket:
+                for (handler, once), seq in bucket.iteritems():
+                    matched.append((seq, (key[0], key[1], handler, once)))
+
+        if len(matched) > 1:
+            matched.sort(key=lambda entry: entry[0])
+        return [entry for seq, entry in matched]
+
+    def clear(self):
+        """
+        Removes all handlers.
+        """
+        self._buckets.clear()
@@ -1,30 +1,73 @@
 # -*- coding: utf-8 -*-
 
-import re
 try:
     import hashlib
     HASH = lambda x: hashlib.sha1(x).hexdigest()
 except ImportError:
     import sha
     HASH = lambda x: sha.new(x).hexdigest()
-    
-# taken from http://code.sixapart.com/cgi-bin/viewcvs.cgi/trunk/DJabberd/lib/DJabberd/JID.pm?rev=684&view=markup
-_r_jid = re.compile(u'(?:([\x29\x23-\x25\x28-\x2E\x30-\x39\x3B\x3D\x3F\x41-\x7E]{1,1023})\@)?([a-zA-Z0-9\.\-]{1,1023})(?:/(.{1,1023}))?', re.UNICODE)
+
+from headstock.lib.cache import LRUCache
+from headstock.lib.prep import nodeprep, nameprep, resourceprep
+
+_missing = object()
+_cache = LRUCache(10000)
 
 class JID(object):
     """
     Jabber Identifier helper class.
 
+    Instances are immutable values: their string form and
+    bare JID are computed once, they can be compared with ``==``
+    and used as dictionary keys.
+
+    Each part is prepared as described by RFC 6122, see
+    :mod:`headstock.lib.prep`, so that JIDs differing only by
+    their case, for instance, are equal. A `ValueError` is raised
+    when one of them can't be prepared.
+
     ``node`` JID node part
 
     ``domain`` JID domain part
 
     ``resource`` None - JID resource
     """
+    __slots__ = ('node', 'domain', 'resource', '_str', '_unicode',
+                 '_bare', '_hash')
+
     def __init__(self, node, domain, resource=None):
-        self.node = node
-        self.domain = domain
-        self.resource = resource
+        node = nodeprep(node) if node else None
+        domain = nameprep(domain)
+        resource = resourceprep(resource) if resource else None
+
+        init = object.__setattr__
+        init(self, 'node', node)
+        init(self, 'domain', domain)
+        init(self, 'resource', resource)
+
+        if node and domain and resource:
+            value = "%s@%s/%s" % (node, domain, resource)
+        elif node and domain:
+            value = "%s@%s" % (node, domain)
+        elif domain and resource:
+            value = "%s/%s" % (domain, resource)
+        else:
+            value = domain
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        init(self, '_str', value)
+        init(self, '_unicode', None)
+        init(self, '_bare', None)
+        init(self, '_hash', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("JID instances are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("JID instances are immutable")
+
+    def __reduce__(self):
+        return (JID, (self.node, self.domain, self.resource))
 
     @staticmethod
     def parse(token):
@@ -32,30 +75,77 @@ class JID(object):
         Parses a string representing a JID and returns
         an instance of :class:`headstock.lib.jid.JID` or
         `None` if it failed.
+
+        The node is what comes before the first `@` and the
+        resource what follows the first `/`, as per RFC 6122.
+
+        Results are kept in a bounded cache so that parsing
+        the same string again returns the very same instance.
         """
         if not token:
             return
-        m = _r_jid.match(token)
-        if m is not None:
-            node, domain, resource = m.groups()
-            return JID(node, domain, resource)
+        jid = _cache.get(token, _missing)
+        if jid is _missing:
+            jid = None
+            rest, slash, resource = token.partition('/')
+            node, at, domain = rest.partition('@')
+            if not at:
+                node, domain = None, rest
+            if not (at and not node) and not (slash and not resource):
+                try:
+                    jid = JID(node, domain, resource or None)
+                except ValueError:
+                    pass
+            _cache.set(token, jid)
+        return jid
+
+    @property
+    def bare(self):
+        """
+        Returns the bare JID, the instance itself when
+        it has no resource.
+        """
+        bare = self._bare
+        if bare is None:
+            if not self.resource:
+                bare = self
+            else:
+                bare = JID(self.node, self.domain)
+            object.__setattr__(self, '_bare', bare)
+        return bare
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, JID):
+            return NotImplemented
+        return self._str == other._str
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __hash__(self):
+        value = self._hash
+        if value is None:
+            value = hash(self._str)
+            object.__setattr__(self, '_hash', value)
+        return value
 
     def __str__(self):
-        if self.node and self.domain and self.resource:
-            return "%s@%s/%s" % (self.node, self.domain, self.resource)
-        elif self.node and self.domain:
-            return "%s@%s" % (self.node, self.domain)
-        elif self.domain and self.resource:
-            return "%s/%s" % (self.domain, self.resource)
-        elif self.domain:
-            return self.domain
+        return self._str
 
     def __unicode__(self):
-        value = self.__str__()
-        return value.decode('utf-8')
+        value = self._unicode
+        if value is None and self._str is not None:
+            value = self._str.decode('utf-8')
+            object.__setattr__(self, '_unicode', value)
+        return value
 
     def __repr__(self):
-        return '<jid %s>' % self.__str__()
+        return '<jid %s>' % self._str
 
     def domainid(self):
         return self.domain
@@ -67,7 +157,7 @@ class JID(object):
 
     def ressourceid(self):
         if self.node and self.domain and self.resource:
-            return "%s@%s/%s" % (self.node, self.domain, self.resource)
+            return self._str
         return self.domain
       
     @property
@@ -75,4 +165,4 @@ class JID(object):
         """
         Returns a sha1 hash of of the JID.
         """
-        return HASH(str(self))
+        return HASH(self._str)
@@ -1,11 +1,131 @@
 # -*- coding: utf-8 -*-
 import os, os.path
+import re
 import logging
 from logging import handlers
 import traceback as _traceback
 from sys import exc_info as _exc_info
+import threading
+try:
+    from Queue import Queue, Full
+except ImportError:
+    from queue import Queue, Full
+try:
+    from logging.handlers import QueueHandler, QueueListener
+except ImportError:
+    QueueHandler = QueueListener = None
 
-__all_ = ['Logger']
+__all__ = ['Logger', 'StanzaRecord', 'BoundedQueueHandler']
+
+_r_tag = re.compile(r'<([^\s/>]+)([^>]*)>')
+_r_type = re.compile(r'\stype=["\']([^"\']*)["\']')
+
+class StanzaRecord(object):
+    """
+    Message of a log record holding a stanza. The stanza is
+    only serialized when the record is actually formatted by
+    a handler, that is, never if it is filtered out.
+
+    ``prefix`` string prefixing the stanza
+
+    ``stanza`` :class:`bridge.Element` instance or XML string
+    """
+    def __init__(self, prefix, stanza):
+        self.prefix = prefix
+        self.stanza = stanza
+
+    def __str__(self):
+        stanza = self.stanza
+        if hasattr(stanza, 'xml'):
+            stanza = stanza.xml(omit_declaration=True, indent=False)
+        message = '%s %s' % (self.prefix, stanza)
+        if isinstance(message, unicode):
+            message = message.encode('utf-8')
+        return message
+
+if QueueHandler is None:
+    class QueueHandler(logging.Handler):
+        """
+        Backport of the Python 3.2 handler sending
+        records to a queue.
+        """
+        def __init__(self, queue):
+            logging.Handler.__init__(self)
+            self.queue = queue
+
+        def enqueue(self, record):
+            self.queue.put_nowait(record)
+
+        def prepare(self, record):
+            return record
+
+        def emit(self, record):
+            try:
+                self.enqueue(self.prepare(record))
+            except Exception:
+                self.handleError(record)
+
+    class QueueListener(object):
+        """
+        Backport of the Python 3.2 listener handing the
+        records of a queue to handlers from a background thread.
+        """
+        _sentinel = None
+
+        def __init__(self, queue, *handlers, **kwargs):
+            self.queue = queue
+            self.handlers = handlers
+            self.respect_handler_level = kwargs.get('respect_handler_level', False)
+            self._thread = None
+
+        def start(self):
+            self._thread = t = threading.Thread(target=self._monitor)
+            t.setDaemon(True)
+            t.start()
+
+        def handle(self, record):
+            for handler in self.handlers:
+                if not self.respect_handler_level or record.levelno >= handler.level:
+                    handler.handle(record)
+
+        def _monitor(self):
+            while True:
+                record = self.queue.get()
+                if record is self._sentinel:
+                    break
+                self.handle(record)
+
+        def stop(self):
+            self.queue.put(self._sentinel)
+            self._thread.join()
+            self._thread = None
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Handler putting records into a bounded queue without ever
+    blocking. Records that don't fit are dropped and counted
+    in the ``dropped`` attribute.
+
+    Stanzas held by :class:`bridge.Element` instances are serialized
+    before being queued since the client may forget them right after
+    dispatching. Everything else, including stanzas already serialized,
+    is formatted by the listener's thread.
+    """
+    def __init__(self, queue):
+        QueueHandler.__init__(self, queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        msg = record.msg
+        if isinstance(msg, StanzaRecord) and not isinstance(msg.stanza, basestring):
+            record.msg = str(msg)
+        return record
 
 class Logger(object):
     """
@@ -19,35 +139,163 @@ class Logger(object):
     should be enabled.
 
     ``name`` internal name for the logger
+
+    ``threaded`` False - flag indicating if the file and console
+    handlers should be fed from a background thread through a
+    queue so that logging never blocks the caller on I/O.
+
+    ``queue_size`` 10000 - maximum number of records waiting in the
+    queue when ``threaded`` is set. Records are dropped, and counted
+    by :attr:`dropped`, when the queue is full.
+
+    Stanzas are logged at the ``DEBUG`` level by default. Use
+    :meth:`trace` to log some of them at a different level, by direction,
+    element name and type attribute, and :meth:`set_level` to filter
+    what is emitted. For instance, to only trace IQ errors::
+
+        logger.set_level(logging.INFO)
+        logger.trace(logging.INFO, name='iq', type='error')
+
+    Stanzas that won't be emitted are never serialized.
     """
-    def __init__(self, path=None, stdout=False, name=None):
+    def __init__(self, path=None, stdout=False, name=None,
+                 threaded=False, queue_size=10000):
         self.path = path
         self.with_stdout = stdout
         self.name = name
+        self.rules = {}
+        self._levels = {}
+        self._known = [set(), set(), set()]
+        self._sniff = False
+        self.queue_handler = None
+        self.listener = None
 
         logger = logging.getLogger("headstock.logger.%s" % self.name or '')
         logger.setLevel(logging.DEBUG)
         
         logfmt = logging.Formatter("[%(asctime)s] %(message)s")
 
-        file_handler = None
-        stdout_handler = None
+        targets = []
 
         if self.path:
             h = handlers.RotatingFileHandler(self.path, maxBytes=10485760, backupCount=3)
             h.setLevel(logging.DEBUG)
             h.setFormatter(logfmt)
-            logger.addHandler(h)
+            targets.append(h)
 
         if self.with_stdout:
             import sys
             h = logging.StreamHandler(sys.stdout)
             h.setLevel(logging.DEBUG)
             h.setFormatter(logfmt)
-            logger.addHandler(h)
+            targets.append(h)
+
+        if threaded and targets:
+            self.queue_handler = BoundedQueueHandler(Queue(queue_size))
+            self.listener = QueueListener(self.queue_handler.queue, *targets,
+                                          respect_handler_level=True)
+            self.listener.start()
+            logger.addHandler(self.queue_handler)
+        else:
+            for h in targets:
+                logger.addHandler(h)
 
+        self.handlers = targets
         self.logger = logger
 
+    @property
+    def dropped(self):
+        """
+        Number of records dropped because the queue
+        was full. Always 0 when not threaded.
+        """
+        if self.queue_handler:
+            return self.queue_handler.dropped
+        return 0
+
+    def set_level(self, level):
+        """
+        Sets the level below which records are dropped.
+        """
+        self.logger.setLevel(level)
+
+    def trace(self, level, direction=None, name=None, type=None):
+        """
+        Logs the stanzas matching the given criteria at ``level``.
+        A criterion set to `None` matches anything and the most
+        specific rule wins, the element name being the most
+        significant criterion, then its type and finally the
+        direction.
+
+        ``level`` logging level of the matching stanzas
+
+        ``direction`` None - `'INCOMING'` or `'OUTGOING'`
+
+        ``name`` None - stanza element name (e.g. `'iq'`)
+
+        ``type`` None - value of the stanza `type` attribute
+        """
+        self.rules[(direction, name, type)] = level
+        self._levels = {}
+        self._sniff = any([key[1] or key[2] for key in self.rules])
+        self._known = [set([key[i] for key in self.rules]) for i in range(3)]
+
+    def level_for(self, direction=None, name=None, type=None):
+        """
+        Returns the level at which a stanza should be logged.
+        """
+        # values no rule mentions, coming from the peer, are
+        # replaced so that the memo stays bounded by the rules
+        directions, names, types = self._known
+        if direction not in directions:
+            direction = None
+        if name not in names:
+            name = None
+        if type not in types:
+            type = None
+
+        key = (direction, name, type)
+        level = self._levels.get(key)
+        if level is None:
+            level = logging.DEBUG
+            rules = self.rules
+            for candidate in ((direction, name, type), (None, name, type),
+                              (direction, name, None), (None, name, None),
+                              (direction, None, type), (None, None, type),
+                              (direction, None, None), (None, None, None)):
+                if candidate in rules:
+                    level = rules[candidate]
+                    break
+            self._levels[key] = level
+        return level
+
+    def log_stanza(self, stanza, prefix=''):
+        """
+        Logs ``stanza``, a :class:`bridge.Element` instance or a XML string,
+        prefixed by ``prefix`` whose first word is taken as the
+        direction of the stanza. The stanza is serialized only if the
+        record is emitted.
+        """
+        direction = prefix.split(' ', 1)[0] or None
+        name = type = None
+        if self._sniff:
+            if hasattr(stanza, 'xml_name'):
+                name = stanza.xml_name
+                type = stanza.get_attribute_value('type')
+            else:
+                m = _r_tag.match(stanza)
+                if m:
+                    name, attributes = m.groups()
+                    if ':' in name:
+                        name = name.split(':', 1)[1]
+                    m = _r_type.search(attributes)
+                    if m:
+                        type = m.group(1)
+
+        level = self.level_for(direction, name, type)
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, StanzaRecord(prefix, stanza))
+
     def log(self, m):
         """
         Logs a string ``m``
@@ -63,11 +311,17 @@ class Logger(object):
 
     def close(self):
         """
-        Closes the logger and its handlers.
+        Closes the logger and its handlers. When threaded,
+        the records still queued are written first.
         """
-        for handler in self.logger.handlers:
+        if self.listener:
+            self.listener.stop()
+            self.listener = None
+
+        for handler in list(self.logger.handlers) + self.handlers:
             try:
                 handler.close()
             except KeyError:
                 pass
             self.logger.removeHandler(handler)
+        self.handlers = []
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+Lightweight metrics kept by the clients so that one can
+see where time goes without attaching a profiler.
+
+Metrics are plain Python objects updated in place: incrementing a
+counter is a dictionary update and observing a value in a histogram
+a bisection over its buckets. Reading them is only done on demand,
+through :meth:`MetricsRegistry.as_dict` or
+:meth:`MetricsRegistry.prometheus` which formats them according to the
+Prometheus text exposition format.
+
+Labelled metrics are updated with the tuple of their label values
+in the order the label names were declared::
+
+    >>> registry = MetricsRegistry()
+    >>> received = registry.counter('stanzas_received_total',
+    ...                             'Stanzas received', ('name', 'type'))
+    >>> received.inc((u'message', u'chat'))
+    >>> print registry.prometheus()
+    # HELP stanzas_received_total Stanzas received
+    # TYPE stanzas_received_total counter
+    stanzas_received_total{name="message",type="chat"} 1
+"""
+from bisect import bisect_left
+
+__all__ = ['Counter', 'Gauge', 'Histogram', 'MetricsRegistry']
+
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value):
+    if value is None:
+        return u''
+    if not isinstance(value, unicode):
+        value = unicode(value)
+    return value.replace(u'\\', u'\\\\').replace(u'"', u'\\"').replace(u'\n', u'\\n')
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float):
+        if value.is_integer():
+            return str(int(value))
+        return repr(value)
+    return str(value)
+
+class Metric(object):
+    """
+    Base class of the metrics.
+
+    ``name`` name of the metric
+
+    ``help`` short description of the metric
+
+    ``labels`` () - names of the labels of the metric
+    """
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+    def label_string(self, values, extra=None):
+        pairs = zip(self.labels, values)
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return u''
+        return u'{%s}' % u','.join([u'%s="%s"' % (name, _escape(value)) \
+                                        for name, value in pairs])
+
+    def samples(self):
+        """
+        Yields ``(suffix, labels, value)`` tuples, as exported
+        by :meth:`MetricsRegistry.prometheus`.
+        """
+        raise NotImplemented()
+
+    def value(self):
+        """
+        Returns the value of the metric as exported by
+        :meth:`MetricsRegistry.as_dict`.
+        """
+        raise NotImplemented()
+
+class Counter(Metric):
+    """
+    Monotonically increasing value.
+    """
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        Metric.__init__(self, name, help, labels)
+        self.values = {}
+
+    def inc(self, labels=(), amount=1):
+        """
+        Increments the counter of the ``labels``
+        values by ``amount``.
+        """
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, labels=()):
+        """
+        Returns the counter of the ``labels`` values.
+        """
+        return self.values.get(labels, 0)
+
+    def samples(self):
+        for labels, value in sorted(self.values.iteritems()):
+            yield '', self.label_string(labels), value
+
+    def value(self):
+        if not self.labels:
+            return self.values.get((), 0)
+        return dict(self.values)
+
+class Gauge(Metric):
+    """
+    Value that may go up and down. When ``func`` is
+    provided, it is called to read the value so that it is
+    only computed when the metrics are collected.
+    """
+    type = 'gauge'
+
+    def __init__(self, name, help, func=None):
+        Metric.__init__(self, name, help)
+        self.func = func
+        self.current = 0
+
+    def set(self, value):
+        self.current = value
+
+    def get(self):
+        if self.func is not None:
+            return self.func()
+        return self.current
+
+    def samples(self):
+        yield '', u'', self.get()
+
+    def value(self):
+        return self.get()
+
+class Histogram(Metric):
+    """
+    Distribution of observed values, typically durations
+    in seconds, counted in buckets.
+
+    ``buckets`` None - sorted upper bounds of the buckets.
+    A last `+Inf` bucket is always added.
+    """
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=None):
+        Metric.__init__(self, name, help, labels)
+        self.buckets = tuple(buckets or DEFAULT_BUCKETS) + (float('inf'),)
+        self.values = {}
+
+    def observe(self, value, labels=()):
+        """
+        Records ``value`` for the ``labels`` values.
+        """
+        data = self.values.get(labels)
+        if data is None:
+            data = self.values[labels] = [[0] * len(self.buckets), 0, 0.0]
+        data[0][bisect_left(self.buckets, value)] += 1
+        data[1] += 1
+        data[2] += value
+
+    def get(self, labels=()):
+        """
+        Returns a dictionary with the ``count`` and ``sum`` of
+        the values observed for the ``labels`` values along with
+        the cumulative ``buckets`` as a list of ``(bound, count)`` pairs.
+        """
+        counts, total, observed = self.values.get(labels, ([0] * len(self.buckets), 0, 0.0))
+        cumulative = []
+        running = 0
+        for bound, count in zip(self.buckets, counts):
+            running += count
+            cumulative.append((bound, running))
+        return {'count': total, 'sum': observed, 'buckets': cumulative}
+
+    def samples(self):
+        for labels in sorted(self.values):
+            data = self.get(labels)
+            for bound, count in data['buckets']:
+                yield '_bucket', self.label_string(labels, ('le', _number(bound))), count
+            yield '_sum', self.label_string(labels), data['sum']
+            yield '_count', self.label_string(labels), data['count']
+
+    def value(self):
+        if not self.labels:
+            return self.get()
+        return dict([(labels, self.get(labels)) for labels in self.values])
+
+class MetricsRegistry(object):
+    """
+    Set of named metrics.
+
+    Metrics are created through :meth:`counter`, :meth:`gauge`
+    and :meth:`histogram` which return the existing metric when
+    one of the same name was already created.
+    """
+    def __init__(self):
+        self.metrics = {}
+
+    def __contains__(self, name):
+        return name in self.metrics
+
+    def __getitem__(self, name):
+        return self.metrics[name]
+
+    def _create(self, cls, name, *args, **kwargs):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = cls(name, *args, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError("Metric %s already registered as a %s" % (name, metric.type))
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._create(Counter, name, help, labels)
+
+    def gauge(self, name, help, func=None):
+        return self._create(Gauge, name, help, func)
+
+    def histogram(self, name, help, labels=(), buckets=None):
+        return self._create(Histogram, name, help, labels, buckets)
+
+    def as_dict(self):
+        """
+        Returns a dictionary of the current values keyed by
+        metric name. Labelled metrics are dictionaries keyed by
+        the tuple of their label values.
+        """
+        return dict([(name, metric.value()) for name, metric in self.metrics.iteritems()])
+
+    def prometheus(self):
+        """
+        Returns the metrics formatted according to the
+        Prometheus text exposition format.
+        """
+        lines = []
+        for name in sorted(self.metrics):
+            metric = self.metrics[name]
+            lines.append(u'# HELP %s %s' % (name, metric.help))
+            lines.append(u'# TYPE %s %s' % (name, metric.type))
+            for suffix, labels, value in metric.samples():
+                lines.append(u'%s%s%s %s' % (name, suffix, labels, _number(value)))
+        return u'\n'.join(lines) + u'\n'
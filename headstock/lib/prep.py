@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Preparation of the parts of a JID as described by RFC 6122:
+
+* :func:`nodeprep` for the localpart (Nodeprep profile of stringprep)
+* :func:`nameprep` for the domainpart (Nameprep, applied to each label)
+* :func:`resourceprep` for the resourcepart (Resourceprep profile)
+
+:func:`saslprep` (RFC 4013) prepares the user names and passwords
+given to the SASL mechanisms.
+
+Preparing a string maps it to its canonical form so that, for
+instance, `Alice@Example.COM` and `alice@example.com` are the same JID.
+Strings that can't be prepared raise a `ValueError`.
+
+The stringprep tables are provided by the standard :mod:`stringprep`
+module and Nameprep by :mod:`encodings.idna`. Since the same handful of
+JIDs come back over and over, results are memoized and pure ASCII
+strings, by far the most common, skip the Unicode tables altogether.
+"""
+import re
+import stringprep
+import unicodedata
+from encodings import idna
+
+from headstock.lib.cache import LRUCache
+
+__all__ = ['nodeprep', 'nameprep', 'resourceprep', 'saslprep']
+
+MAX_LENGTH = 1023
+
+# characters Nodeprep prohibits on top of the stringprep tables
+NODE_PROHIBITED = u'"&\'/:<>@'
+
+_r_ascii = re.compile(u'^[\x00-\x7f]*$')
+_r_node_ascii_prohibited = re.compile(u'[\x00-\x20\x7f"&\'/:<>@]')
+_r_ascii_controls = re.compile(u'[\x00-\x1f\x7f]')
+_r_domain_ascii_prohibited = re.compile(u'[\x00-\x20\x7f]')
+_r_dots = re.compile(u'[.\u3002\uff0e\uff61]')
+
+_node_tables = (stringprep.in_table_c11, stringprep.in_table_c12,
+                stringprep.in_table_c21, stringprep.in_table_c22,
+                stringprep.in_table_c3, stringprep.in_table_c4,
+                stringprep.in_table_c5, stringprep.in_table_c6,
+                stringprep.in_table_c7, stringprep.in_table_c8,
+                stringprep.in_table_c9)
+_resource_tables = _node_tables[1:]
+
+_node_cache = LRUCache(10000)
+_domain_cache = LRUCache(1000)
+_resource_cache = LRUCache(10000)
+
+def _text(value):
+    if isinstance(value, str):
+        try:
+            return value.decode('utf-8')
+        except UnicodeDecodeError:
+            raise ValueError("Invalid UTF-8 string: %r" % value)
+    return value
+
+def _check_length(value, part):
+    if not value:
+        raise ValueError("Empty %s" % part)
+    if len(value.encode('utf-8')) > MAX_LENGTH:
+        raise ValueError("The %s is longer than %d bytes" % (part, MAX_LENGTH))
+    return value
+
+def _check_bidi(value):
+    """
+    Section 6 of RFC 3454.
+    """
+    randal = [stringprep.in_table_d1(c) for c in value]
+    if True in randal:
+        for c in value:
+            if stringprep.in_table_d2(c):
+                raise ValueError("Mixed directions in %r" % value)
+        if not (randal[0] and randal[-1]):
+            raise ValueError("Right to left string must start and end "
+                             "with a right to left character: %r" % value)
+
+def _prep(value, casefold, tables, extra=u''):
+    chars = []
+    for c in value:
+        if stringprep.in_table_b1(c):
+            continue
+        if casefold:
+            c = stringprep.map_table_b2(c)
+        chars.append(c)
+    value = unicodedata.normalize('NFKC', u''.join(chars))
+
+    for c in value:
+        if c in extra:
+            raise ValueError("Prohibited character %r" % c)
+        for table in tables:
+            if table(c):
+                raise ValueError("Prohibited character %r" % c)
+        if stringprep.in_table_a1(c):
+            raise ValueError("Unassigned code point %r" % c)
+
+    _check_bidi(value)
+    return value
+
+def nodeprep(value):
+    """
+    Returns the prepared form of the localpart ``value``.
+    """
+    prepared = _node_cache.get(value)
+    if prepared is None:
+        text = _text(value)
+        if _r_ascii.match(text):
+            if _r_node_ascii_prohibited.search(text):
+                raise ValueError("Prohibited character in %r" % text)
+            prepared = text.lower()
+        else:
+            prepared = _prep(text, True, _node_tables, NODE_PROHIBITED)
+        prepared = _check_length(prepared, 'localpart')
+        _node_cache.set(value, prepared)
+    return prepared
+
+def resourceprep(value):
+    """
+    Returns the prepared form of the resourcepart ``value``.
+    """
+    prepared = _resource_cache.get(value)
+    if prepared is None:
+        text = _text(value)
+        if _r_ascii.match(text):
+            if _r_ascii_controls.search(text):
+                raise ValueError("Prohibited character in %r" % text)
+            prepared = text
+        else:
+            prepared = _prep(text, False, _resource_tables)
+        prepared = _check_length(prepared, 'resourcepart')
+        _resource_cache.set(value, prepared)
+    return prepared
+
+def saslprep(value):
+    """
+    Returns the prepared form of the user name or
+    password ``value``. Unlike the other profiles,
+    results aren't memoized.
+    """
+    text = _text(value)
+    if _r_ascii.match(text):
+        if _r_ascii_controls.search(text):
+            raise ValueError("Prohibited character in string")
+        return text
+
+    # non-ASCII spaces are mapped to a space
+    text = u''.join([stringprep.in_table_c12(c) and u' ' or c for c in text])
+    # Saslprep prohibits the same characters as Resourceprep,
+    # errors don't carry the string as it may be a password
+    try:
+        return _prep(text, False, _resource_tables)
+    except ValueError:
+        raise ValueError("String rejected by Saslprep")
+
+def nameprep(value):
+    """
+    Returns the prepared form of the domainpart ``value``. Each
+    label is prepared with Nameprep and a trailing dot is removed.
+    """
+    prepared = _domain_cache.get(value)
+    if prepared is None:
+        text = _text(value)
+        if _r_ascii.match(text):
+            if _r_domain_ascii_prohibited.search(text):
+                raise ValueError("Prohibited character in %r" % text)
+            labels = text.lower().split(u'.')
+        else:
+            labels = _r_dots.split(text)
+            try:
+                labels = [idna.nameprep(label) for label in labels]
+            except UnicodeError, exc:
+                raise ValueError(str(exc))
+
+        if len(labels) > 1 and not labels[-1]:
+            labels.pop()
+        for label in labels:
+            if not label:
+                raise ValueError("Empty label in %r" % text)
+        prepared = _check_length(u'.'.join(labels), 'domainpart')
+        _domain_cache.set(value, prepared)
+    return prepared
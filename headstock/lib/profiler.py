@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Sampling profiler catching the handlers which block the loop.
+
+Running cProfile over a production process is too costly and
+drowns the culprit among everything else. Instead, once set on a
+client with :meth:`headstock.client.BaseClient.set_profiler`, the
+:class:`HandlerProfiler` is told when each handler starts and ends.
+A background thread samples the stack of the thread running the
+handler every ``interval`` seconds and the handlers that ran for
+longer than ``threshold`` seconds are kept, along with the sampled
+stacks, in a ring buffer of the ``size`` most recent ones.
+
+>>> from headstock.lib.profiler import HandlerProfiler
+>>> profiler = HandlerProfiler(threshold=0.05)
+>>> client.set_profiler(profiler)
+>>> ...
+>>> for call in profiler.slow_calls():
+...     print call.label, call.elapsed
+>>> print profiler.summary()
+"""
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+try:
+    from thread import get_ident
+except ImportError:
+    from threading import get_ident
+
+__all__ = ['HandlerProfiler', 'SlowCall']
+
+class SlowCall(object):
+    """
+    A handler call that took longer than the threshold.
+
+    ``label`` name of the handler, see :func:`headstock.client.handler_label`
+
+    ``started`` timestamp of the call
+
+    ``elapsed`` duration of the call in seconds
+
+    ``stacks`` list of the stacks sampled while the handler
+    was running, each one as returned by :func:`traceback.extract_stack`
+    """
+    def __init__(self, label, started, elapsed, stacks):
+        self.label = label
+        self.started = started
+        self.elapsed = elapsed
+        self.stacks = stacks
+
+    def __repr__(self):
+        return '<SlowCall %s %.3fs (%d samples)>' % (self.label, self.elapsed,
+                                                    len(self.stacks))
+
+class Call(object):
+    def __init__(self, label, thread):
+        self.label = label
+        self.thread = thread
+        self.started = time.time()
+        self.stacks = []
+
+class HandlerProfiler(object):
+    """
+    Keeps the handler calls slower than ``threshold``.
+
+    ``threshold`` 0.05 - duration in seconds above which
+    a handler call is kept
+
+    ``size`` 100 - number of slow calls kept, the oldest
+    ones are dropped first
+
+    ``interval`` 0.005 - sampling period in seconds
+
+    ``sample`` True - flag indicating if stacks should be
+    sampled. When `False`, only the label and duration of the
+    slow calls are kept and no thread is started.
+
+    ``max_samples`` 200 - maximum number of stacks kept per call
+    """
+    def __init__(self, threshold=0.05, size=100, interval=0.005, sample=True,
+                 max_samples=200):
+        self.threshold = threshold
+        self.interval = interval
+        self.sample = sample
+        self.max_samples = max_samples
+        self.records = deque(maxlen=size)
+        self.current = None
+        self.running = False
+        self._thread = None
+
+    def start(self):
+        """
+        Starts the sampling thread, if sampling is enabled.
+        """
+        if not self.sample or self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name='headstock-profiler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the sampling thread.
+        """
+        self.running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def enter(self, label):
+        """
+        Called by the client before the handler named ``label`` runs.
+        """
+        self.current = Call(label, get_ident())
+
+    def leave(self, elapsed):
+        """
+        Called by the client once the current handler returned
+        after ``elapsed`` seconds.
+        """
+        call, self.current = self.current, None
+        if call is not None and elapsed >= self.threshold:
+            self.records.append(SlowCall(call.label, call.started,
+                                         elapsed, call.stacks))
+
+    def _run(self):
+        while self.running:
+            time.sleep(self.interval)
+            call = self.current
+            if call is None or len(call.stacks) >= self.max_samples:
+                continue
+            frame = sys._current_frames().get(call.thread)
+            if frame is not None and self.current is call:
+                call.stacks.append(traceback.extract_stack(frame))
+            frame = None
+
+    def slow_calls(self):
+        """
+        Returns the list of the :class:`SlowCall` instances
+        kept, the oldest first.
+        """
+        return list(self.records)
+
+    def clear(self):
+        self.records.clear()
+
+    def summary(self, limit=10):
+        """
+        Returns a text report of the handlers which were slow
+        the most often, with the source lines most frequently found
+        at the top of their sampled stacks.
+        """
+        handlers = {}
+        for call in list(self.records):
+            entry = handlers.setdefault(call.label, [0, 0.0, {}])
+            entry[0] += 1
+            entry[1] += call.elapsed
+            for stack in call.stacks:
+                if stack:
+                    filename, lineno, name, line = stack[-1]
+                    location = '%s:%d in %s' % (filename, lineno, name)
+                    entry[2][location] = entry[2].get(location, 0) + 1
+
+        ordered = sorted(handlers.iteritems(), key=lambda item: item[1][1], reverse=True)
+        lines = []
+        for label, (count, total, locations) in ordered[:limit]:
+            lines.append('%s: %d slow calls, %.3fs total' % (label, count, total))
+            top = sorted(locations.iteritems(), key=lambda item: item[1], reverse=True)
+            for location, samples in top[:5]:
+                lines.append('    %5d samples  %s' % (samples, location))
+        return '\n'.join(lines)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from time import time
+
+__all__ = ['TokenBucket']
+
+class TokenBucket(object):
+    """
+    Token bucket rate limiter.
+
+    ``rate`` number of tokens added per second
+
+    ``capacity`` None - maximum number of tokens the bucket
+    can hold, that is the largest allowed burst. Defaults to ``rate``.
+
+    ``clock`` callable returning the current time in seconds
+    """
+    def __init__(self, rate, capacity=None, clock=time):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.clock = clock
+        self.tokens = self.capacity
+        self._last = clock()
+
+    def _refill(self):
+        now = self.clock()
+        elapsed = now - self._last
+        self._last = now
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+
+    def consume(self, tokens=1):
+        """
+        Takes ``tokens`` from the bucket and returns `True`
+        if enough were available, `False` otherwise.
+        """
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def delay(self, tokens=1):
+        """
+        Returns the number of seconds to wait until
+        ``tokens`` are available.
+        """
+        self._refill()
+        if self.tokens >= tokens:
+            return 0.0
+        return (tokens - self.tokens) / self.rate
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Reconnect policies used by the client backends to decide
+when to connect again after the connection was lost.
+"""
+import random
+
+__all__ = ['ReconnectPolicy', 'ExponentialBackoff']
+
+class ReconnectPolicy(object):
+    """
+    Base class of the reconnect policies.
+    """
+    def delay(self, attempt):
+        """
+        Returns the number of seconds to wait before the
+        reconnect attempt number ``attempt``, starting at 0, or
+        `None` to give up.
+        """
+        raise NotImplemented()
+
+class ExponentialBackoff(ReconnectPolicy):
+    """
+    Exponential backoff with jitter so that many clients
+    losing their connection at once don't come back all at
+    the same time.
+
+    The upper bound of the delay before attempt ``n`` is
+    ``min(cap, base * factor ** n)``. With the `full` jitter, the
+    delay is picked uniformly between 0 and that bound. With the `equal`
+    jitter, it is picked between half the bound and the bound.
+
+    ``base`` 1.0 - delay in seconds of the first attempt
+
+    ``factor`` 2.0 - multiplier applied at each attempt
+
+    ``cap`` 300.0 - maximum delay in seconds
+
+    ``max_attempts`` None - number of attempts after which the
+    policy gives up. `None` means it never does.
+
+    ``jitter`` 'full' - either `'full'`, `'equal'` or `None` for no jitter
+    """
+    def __init__(self, base=1.0, factor=2.0, cap=300.0, max_attempts=None, jitter='full'):
+        self.base = base
+        self.factor = factor
+        self.cap = cap
+        self.max_attempts = max_attempts
+        self.jitter = jitter
+        self.random = random.Random()
+
+    def delay(self, attempt):
+        if self.max_attempts is not None and attempt >= self.max_attempts:
+            return None
+
+        bound = min(self.cap, self.base * (self.factor ** min(attempt, 64)))
+        if self.jitter == 'full':
+            return self.random.uniform(0, bound)
+        elif self.jitter == 'equal':
+            return bound / 2.0 + self.random.uniform(0, bound / 2.0)
+        return bound
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Routing table used by :class:`headstock.client.BaseComponent` to
+hand stanzas addressed to its virtual JIDs to the right handler.
+
+Routes are keyed by their ``(to, type)`` pair where `to` is either
+a full or a bare JID and either member may be `None` to act as a
+wildcard. A stanza is routed to the most specific route available,
+looking up in turn::
+
+    (full to, type), (full to, None), (bare to, type),
+    (bare to, None), (None, type), (None, None)
+
+so routing a stanza costs a handful of dictionary lookups at most
+whatever the number of routes. Stanzas that match no route are handed
+to the ``fallback`` handler, if any.
+
+The `to` of the routes and the `to` attribute of the stanzas are
+compared once parsed and prepared, see :class:`headstock.lib.jid.JID`,
+so that `Bob@Example.com` is routed as `bob@example.com`. Routes are
+kept, and counted, under the prepared form of their JID. A stanza
+whose `to` attribute isn't a valid JID only matches the routes whose
+`to` is `None`. A stanza without a `type` attribute only matches routes
+whose `type` is `None`.
+"""
+from headstock.lib.jid import JID
+
+__all__ = ['ComponentRouter']
+
+def _prepare(to):
+    """
+    Returns the prepared form of the JID ``to`` of a route.
+    """
+    if to is None:
+        return None
+    jid = to if isinstance(to, JID) else JID.parse(to)
+    if jid is None:
+        raise ValueError("Invalid JID: %r" % (to,))
+    return unicode(jid)
+
+class ComponentRouter(object):
+    """
+    Routing table of component handlers.
+
+    ``fallback`` None - callable applied with the stanzas
+    no route matches
+
+    ``stanzas`` `(u'message', u'presence')` - names of the elements
+    routed. IQs are not routed by default so that responses reach the
+    handlers registered with ``register_on_iq``.
+
+    Each route counts the stanzas it was given in the ``counters``
+    dictionary, keyed by route. Stanzas handed to the fallback are
+    counted by ``fallback_count`` and those dropped by ``unrouted``.
+    """
+    def __init__(self, fallback=None, stanzas=(u'message', u'presence')):
+        self.fallback = fallback
+        self.stanzas = tuple(stanzas)
+        self.routes = {}
+        self.counters = {}
+        self.fallback_count = 0
+        self.unrouted = 0
+
+    def __len__(self):
+        return len(self.routes)
+
+    def __contains__(self, route):
+        return route in self.routes
+
+    def add(self, handler, to=None, type=None):
+        """
+        Routes the stanzas sent to ``to`` and of type ``type``
+        to ``handler``.
+
+        Raises a `ValueError` if the route already exists or
+        ``to`` isn't a valid JID.
+        """
+        route = (_prepare(to), type)
+        if route in self.routes:
+            raise ValueError("Route already defined: %s" % repr(route))
+        self.routes[route] = handler
+        self.counters[route] = 0
+
+    def remove(self, to=None, type=None):
+        """
+        Removes the route of ``to`` and ``type``.
+
+        Raises a `ValueError` if it doesn't exist.
+        """
+        route = (_prepare(to), type)
+        if route not in self.routes:
+            raise ValueError("Unknown route: %s" % repr(route))
+        del self.routes[route]
+        del self.counters[route]
+
+    def clear(self):
+        """
+        Removes all the routes and resets the counters.
+        """
+        self.routes.clear()
+        self.counters.clear()
+        self.fallback_count = 0
+        self.unrouted = 0
+
+    def match(self, to, type):
+        """
+        Returns the ``(route, handler)`` pair stanzas sent
+        to ``to`` and of type ``type`` are routed to, or
+        `(None, None)` if there is none.
+        """
+        routes = self.routes
+        jid = JID.parse(to) if to is not None else None
+        if jid is not None:
+            to = unicode(jid)
+            handler = routes.get((to, type))
+            if handler is not None:
+                return (to, type), handler
+            if type is not None:
+                handler = routes.get((to, None))
+                if handler is not None:
+                    return (to, None), handler
+
+            bare = unicode(jid.bare)
+            if bare != to:
+                handler = routes.get((bare, type))
+                if handler is not None:
+                    return (bare, type), handler
+                if type is not None:
+                    handler = routes.get((bare, None))
+                    if handler is not None:
+                        return (bare, None), handler
+
+        handler = routes.get((None, type))
+        if handler is not None:
+            return (None, type), handler
+        if type is not None:
+            handler = routes.get((None, None))
+            if handler is not None:
+                return (None, None), handler
+        return None, None
+
+    def route(self, e):
+        """
+        Applies the handler of the route matching the
+        stanza ``e``, or the fallback handler, and returns
+        what it returned.
+        """
+        route, handler = self.match(e.get_attribute_value('to'),
+                                    e.get_attribute_value('type'))
+        if handler is not None:
+            self.counters[route] += 1
+        elif self.fallback is not None:
+            self.fallback_count += 1
+            handler = self.fallback
+        else:
+            self.unrouted += 1
+            return
+
+        return handler(e)
+
+    def stats(self):
+        """
+        Returns a dictionary with the number of stanzas
+        given to each route under ``routes`` along with the
+        ``fallback`` and ``unrouted`` counts.
+        """
+        return {'routes': dict(self.counters),
+                'fallback': self.fallback_count,
+                'unrouted': self.unrouted}
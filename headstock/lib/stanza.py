@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import re
 
 from bridge import Element as E
 from bridge import Attribute as A
@@ -6,7 +7,7 @@ from bridge.common import XMPP_CLIENT_NS, XML_PREFIX
 
 from headstock.lib.utils import generate_unique
 
-__all__ = ['Stanza']
+__all__ = ['Stanza', 'FrozenStanza', 'StanzaTemplate']
 
 class Stanza(object):
     """
@@ -104,3 +105,153 @@ class Stanza(object):
         """
         return Stanza.to_element(Stanza(u'iq', from_jid=from_jid, to_jid=to_jid,
                                         type=u'error', stanza_id=stanza_id))
+
+class FrozenStanza(object):
+    """
+    Stanza which never changes once created and whose
+    serialized form is therefore computed only once, the first
+    time it is sent, and reused afterwards.
+
+    :meth:`headstock.client.BaseClient.send_stanza` hands the cached
+    UTF-8 bytes straight to the backend.
+
+    ``stanza`` :class:`bridge.Element` instance or XML string. The
+    element must not be modified after it was frozen.
+    """
+    def __init__(self, stanza):
+        self.element = None
+        self._data = None
+        if isinstance(stanza, unicode):
+            self._data = stanza.encode('utf-8')
+        elif isinstance(stanza, str):
+            self._data = stanza
+        else:
+            self.element = stanza
+
+    @property
+    def data(self):
+        """
+        Serialized stanza encoded to UTF-8.
+        """
+        if self._data is None:
+            self._data = self.element.xml(omit_declaration=True,
+                                          indent=False).encode('utf-8')
+        return self._data
+
+    def __str__(self):
+        return self.data
+
+_slot = re.compile(r'\{\{|\}\}|\{([A-Za-z_][A-Za-z0-9_]*)\}')
+
+def escape_text(value):
+    """
+    Escapes ``value`` to be used as character data and
+    returns it encoded to UTF-8.
+    """
+    if not isinstance(value, basestring):
+        value = unicode(value)
+    value = value.replace(u'&', u'&amp;').replace(u'<', u'&lt;').replace(u'>', u'&gt;')
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return value
+
+def escape_attribute(value):
+    """
+    Escapes ``value`` to be used as an attribute value and
+    returns it encoded to UTF-8.
+    """
+    if not isinstance(value, basestring):
+        value = unicode(value)
+    value = value.replace(u'&', u'&amp;').replace(u'<', u'&lt;').replace(u'>', u'&gt;')\
+                 .replace(u'"', u'&quot;').replace(u"'", u'&apos;')
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return value
+
+class StanzaTemplate(object):
+    """
+    Stanza compiled once into static UTF-8 fragments and
+    slots so that rendering it, say for each recipient of a
+    notification, only escapes the values and joins the fragments
+    rather than building and serializing an element tree.
+
+    >>> template = StanzaTemplate(u'<message xmlns="jabber:client" to="{to}" '
+    ...                           u'id="{id}" type="headline"><body>{body}</body></message>')
+    >>> for jid in subscribers:
+    ...     client.send_stanza(template.render(to=jid, body=text))
+
+    Slots are written ``{name}`` and may only appear within attribute
+    values or as character data. Use ``{{`` and ``}}`` for literal
+    braces. Values are escaped according to where their slot stands.
+
+    ``template`` XML string, or :class:`bridge.Element` instance which
+    is serialized first, holding the slots
+    """
+    def __init__(self, template):
+        if not isinstance(template, basestring):
+            template = template.xml(omit_declaration=True, indent=False)
+        if isinstance(template, str):
+            template = template.decode('utf-8')
+        self.template = template
+        self.parts, self.slots = self.compile(template)
+        self.names = frozenset([name for index, name, escape in self.slots])
+
+    def compile(self, template):
+        """
+        Splits ``template`` into the list of its static fragments
+        with a `None` placeholder for each slot, and the list of
+        ``(index, name, escape)`` tuples describing the slots.
+        """
+        parts = []
+        slots = []
+        buf = []
+        pos = 0
+        for m in _slot.finditer(template):
+            buf.append(template[pos:m.start()])
+            pos = m.end()
+            token = m.group(0)
+            if token == u'{{':
+                buf.append(u'{')
+                continue
+            if token == u'}}':
+                buf.append(u'}')
+                continue
+
+            prefix = template[:m.start()]
+            start = prefix.rfind(u'<')
+            if start > prefix.rfind(u'>'):
+                tag = prefix[start:]
+                if not (tag.count(u'"') % 2 or tag.count(u"'") % 2):
+                    raise ValueError("Slot %s must be within an attribute value" % token)
+                escape = escape_attribute
+            else:
+                escape = escape_text
+
+            parts.append(u''.join(buf).encode('utf-8'))
+            buf = []
+            slots.append((len(parts), m.group(1), escape))
+            parts.append(None)
+
+        buf.append(template[pos:])
+        parts.append(u''.join(buf).encode('utf-8'))
+        return parts, slots
+
+    def render(self, **values):
+        """
+        Returns the stanza as an UTF-8 encoded string with each slot
+        replaced by the escaped value of the same name. When no value
+        is provided for an `id` slot, a unique one is generated.
+
+        Raises a `KeyError` if the value of another slot is missing.
+        """
+        parts = self.parts[:]
+        for index, name, escape in self.slots:
+            value = values.get(name)
+            if value is None:
+                if name != 'id':
+                    raise KeyError(name)
+                value = values['id'] = generate_unique()
+            parts[index] = escape(value)
+        return ''.join(parts)
+
+    __call__ = render
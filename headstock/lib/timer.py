@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Hashed timer wheel used to track deadlines such as the
+timeout of pending IQ requests.
+
+Scheduling and cancelling a timer are constant time operations
+so that tens of thousands of pending deadlines cost almost nothing
+to keep around. The wheel doesn't run on its own, the client
+backends advance it from their event loop by calling
+:meth:`TimerWheel.advance`.
+"""
+from math import ceil
+from time import time
+
+__all__ = ['TimerWheel', 'Timer']
+
+class Timer(object):
+    """
+    Handle returned by :meth:`TimerWheel.schedule`.
+
+    ``callback`` callable applied with ``args`` when the timer expires
+    """
+    def __init__(self, wheel, callback, args, deadline):
+        self.wheel = wheel
+        self.callback = callback
+        self.args = args
+        self.deadline = deadline
+        self.rounds = 0
+        self.slot = None
+
+    def cancel(self):
+        """
+        Cancels the timer. Does nothing if it has
+        already expired or been cancelled.
+        """
+        if self.slot is not None:
+            self.slot.discard(self)
+            self.slot = None
+            self.wheel._count -= 1
+
+    @property
+    def active(self):
+        """
+        `True` until the timer expires or is cancelled.
+        """
+        return self.slot is not None
+
+class TimerWheel(object):
+    """
+    Timer wheel made of ``slots`` buckets, each covering
+    ``resolution`` seconds.
+
+    A timer expires, at the earliest, on the first call to
+    :meth:`advance` made after its deadline and, at the latest,
+    ``resolution`` seconds after it.
+
+    ``resolution`` 0.1 - duration in seconds of a tick
+
+    ``slots`` 512 - number of buckets in the wheel
+
+    ``clock`` callable returning the current time in seconds
+    """
+    def __init__(self, resolution=0.1, slots=512, clock=time):
+        self.resolution = resolution
+        self.clock = clock
+        self._slots = [set() for i in xrange(slots)]
+        self._current = 0
+        self._last = clock()
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def schedule(self, delay, callback, *args):
+        """
+        Schedules ``callback`` to be applied with ``args``
+        in ``delay`` seconds and returns a :class:`Timer`
+        instance that can be used to cancel it.
+        """
+        ticks = max(1, int(ceil((self.clock() + delay - self._last) / self.resolution)))
+        size = len(self._slots)
+
+        timer = Timer(self, callback, args, self.clock() + delay)
+        timer.rounds = (ticks - 1) // size
+        timer.slot = self._slots[(self._current + ticks) % size]
+        timer.slot.add(timer)
+        self._count += 1
+
+        return timer
+
+    def advance(self, now=None):
+        """
+        Moves the wheel forward up to ``now`` (by default
+        the current time) and fires the timers that expired
+        meanwhile.
+
+        Returns the number of timers that fired.
+        """
+        if now is None:
+            now = self.clock()
+
+        fired = 0
+        size = len(self._slots)
+        resolution = self.resolution
+        while self._last + resolution <= now:
+            self._last += resolution
+            self._current = (self._current + 1) % size
+
+            slot = self._slots[self._current]
+            if not slot:
+                continue
+
+            expired = []
+            for timer in slot:
+                if timer.rounds > 0:
+                    timer.rounds -= 1
+                else:
+                    expired.append(timer)
+
+            for timer in expired:
+                timer.cancel()
+                timer.callback(*timer.args)
+                fired += 1
+
+        return fired
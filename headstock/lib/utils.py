@@ -1,24 +1,75 @@
 # -*- coding: utf-8 -*-
+import base64
 import codecs
+import itertools
+import os
 try:
     from hashlib import sha1 as sha
 except ImportError:
     from sha import new as sha
-from time import time
-from random import random
 
-__all__ = ['generate_unique', 'remove_BOM',
-           'compute_handshake', 'parse_commandline']
+__all__ = ['generate_unique', 'remove_BOM', 'IDGenerator',
+           'set_id_generator', 'compute_handshake', 'parse_commandline']
+
+class IDGenerator(object):
+    """
+    Allocates stanza identifiers made of a random prefix,
+    drawn from :func:`os.urandom` and encoded in base32, followed
+    by a counter.
+
+    Identifiers never repeat within a process and the prefix
+    makes a collision with another process, or a previous run,
+    unlikely. A new prefix is drawn when the process was forked
+    so that children don't allocate the same identifiers as
+    their parent.
+
+    ``size`` 10 - number of random bytes of the prefix
+    """
+    def __init__(self, size=10):
+        self.size = size
+        self.reseed()
+
+    def reseed(self):
+        """
+        Draws a new prefix and restarts the counter.
+        """
+        self.pid = os.getpid()
+        prefix = base64.b32encode(os.urandom(self.size)).rstrip('=').lower()
+        self.prefix = unicode(prefix) + u'-'
+        self._next = itertools.count().next
+
+    def __call__(self, getpid=os.getpid):
+        if getpid() != self.pid:
+            self.reseed()
+        # concatenating the decimal counter is the cheapest
+        # formatting available
+        return self.prefix + unicode(self._next())
+
+_generator = IDGenerator()
+
+def set_id_generator(generator):
+    """
+    Sets the callable, taking no argument and returning a
+    unicode string, :func:`generate_unique` delegates to. This is
+    how identifiers are allocated for :class:`headstock.lib.stanza.Stanza`,
+    :class:`headstock.stream.Stream`, :class:`headstock.register.Register`
+    and the requests of the clients. Returns the previous generator.
+    """
+    global _generator
+    previous, _generator = _generator, generator
+    return previous
 
 def generate_unique(seed=None):
     """
-    Generates a random and pseudo-unique string.
+    Generates a unique string through the generator set with
+    :func:`set_id_generator`, an :class:`IDGenerator` instance by
+    default.
 
-    ``seed`` None - if `None` the seed is generated
-    from the current time and a random value.
+    ``seed`` None - when provided, the string is instead derived
+    from the seed, the same seed always giving the same string.
     """
     if not seed:
-        seed = str(time() * random())
+        return _generator()
     return unicode(abs(hash(sha(seed).hexdigest())))
 
 def compute_handshake(stanza_id, secret):
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+"""
+============
+Session pool
+============
+Runs many client sessions on a single :mod:`asyncore` loop.
+
+Basic usage
+-----------
+
+>>> from headstock.pool import SessionPool
+>>> pool = SessionPool(rate=20, max_pending=100)
+>>> for jid, password in accounts:
+...     pool.add(jid, password, handlers=[Basic()], hostname='localhost')
+>>> pool.run()
+
+Sessions are not connected as soon as they are added. They wait
+in a queue and are admitted at most ``rate`` per second, with no
+more than ``max_pending`` of them connecting or authenticating at any
+given time, so that bringing up hundreds of sessions, or bringing them
+back after a server restart, doesn't hit the server all at once.
+
+Sessions whose connection drops are queued again and go through
+the same admission control. Sessions which failed to authenticate
+are not, as their credentials would fail again, they are kept
+with their ``failed`` attribute set until removed or added back
+with :meth:`SessionPool.retry`.
+
+The SASL exchanges of the admitted sessions are interleaved on the
+loop, yet deriving the keys of SCRAM takes a while and would stall it.
+:meth:`SessionPool.precompute` derives the authentication material of
+the waiting sessions beforehand, in a process pool for SCRAM. The salt
+and iteration count SCRAM needs are only known once a session has
+logged in, they are kept as the ``scram`` attribute of the session and
+may be saved and given back to :meth:`SessionPool.add` after a restart,
+:meth:`SessionPool.precompute` being called once they are all added
+and before the pool runs:
+
+>>> for jid, password, scram in accounts:
+...     pool.add(jid, password, scram=scram, hostname='localhost')
+"""
+import asyncore
+import time
+from collections import deque
+
+from headstock.client import AsyncClient
+from headstock.lib.auth.digest import credentials_hash
+from headstock.lib.auth.scram import key_cache
+from headstock.lib.jid import JID
+from headstock.lib.ratelimit import TokenBucket
+
+__all__ = ['SessionPool']
+
+class Session(object):
+    """
+    Description of a session managed by the pool.
+
+    ``client`` is the client instance of the current
+    connection or `None` when the session is waiting
+    to be admitted.
+
+    ``scram`` is the ``(mechanism, salt, iterations)`` tuple
+    of the last SCRAM authentication or `None`.
+
+    ``failed`` is `True` when the session was not queued
+    again because it failed to authenticate.
+    """
+    def __init__(self, jid, password, handlers, kwargs, scram=None):
+        self.jid = jid
+        self.password = password
+        self.handlers = handlers
+        self.kwargs = kwargs
+        self.scram = scram
+        self.client = None
+        self.connections = 0
+        self.failed = False
+
+class SessionPool(object):
+    """
+    Manages a set of client sessions sharing one event loop.
+
+    ``clientclass`` :class:`headstock.client.AsyncClient` - class
+    of the clients to create. It must accept a `map` keyword argument.
+
+    ``rate`` 10 - number of sessions admitted per second
+
+    ``burst`` None - number of sessions that can be admitted at once
+    before the rate applies. Defaults to ``rate``.
+
+    ``max_pending`` 50 - maximum number of sessions connecting or
+    authenticating at the same time
+
+    ``tick`` 0.1 - maximum duration in seconds of a loop iteration
+
+    ``reconnect`` True - flag indicating if sessions whose connection
+    was lost should be queued again
+    """
+    def __init__(self, clientclass=AsyncClient, rate=10, burst=None,
+                 max_pending=50, tick=0.1, reconnect=True):
+        self.clientclass = clientclass
+        self.bucket = TokenBucket(rate, burst)
+        self.max_pending = max_pending
+        self.tick = tick
+        self.reconnect = reconnect
+
+        self.map = {}
+        self.sessions = {}
+        self.waiting = deque()
+        self.running = False
+
+        self._last_stats = (time.time(), 0, 0, 0)
+
+    def add(self, jid, password, handlers=None, scram=None, **kwargs):
+        """
+        Adds a session to the pool. It will be connected
+        once admitted.
+
+        ``jid`` Jabber identifier of the account
+
+        ``password`` account's password
+
+        ``handlers`` None - list of handler instances registered
+        with the client of the session
+
+        ``scram`` None - ``(mechanism, salt, iterations)`` tuple of
+        a previous SCRAM authentication of the account, as kept in
+        the ``scram`` attribute of the session
+
+        Extra keyword arguments are passed to the client class.
+        """
+        if jid in self.sessions:
+            raise ValueError("Session already managed: %s" % jid)
+        session = Session(jid, password, handlers or [], kwargs, scram)
+        self.sessions[jid] = session
+        self.waiting.append(session)
+
+    def remove(self, jid):
+        """
+        Stops the session of ``jid`` and removes it from the pool.
+        """
+        session = self.sessions.pop(jid)
+        if session in self.waiting:
+            self.waiting.remove(session)
+        if session.client:
+            client, session.client = session.client, None
+            client.stop()
+
+    def retry(self, jid, password=None):
+        """
+        Queues again the session of ``jid`` which failed
+        to authenticate, with its new ``password`` if given.
+        """
+        session = self.sessions[jid]
+        if not session.failed:
+            raise ValueError("Session didn't fail: %s" % jid)
+        if password is not None:
+            session.password = password
+        session.failed = False
+        self.waiting.append(session)
+
+    def get(self, jid):
+        """
+        Returns the client of the session of ``jid``
+        or `None` if it isn't connected.
+        """
+        session = self.sessions.get(jid)
+        if session:
+            return session.client
+
+    @property
+    def clients(self):
+        """
+        List of the clients currently connected.
+        """
+        return [session.client for session in self.sessions.itervalues() \
+                    if session.client is not None]
+
+    @property
+    def pending(self):
+        """
+        Number of clients connecting or authenticating.
+        """
+        return len([client for client in self.clients if not client.available])
+
+    def admit(self):
+        """
+        Connects as many waiting sessions as the rate and
+        pending limits allow. Returns the number of admitted sessions.
+        """
+        admitted = 0
+        pending = self.pending
+        while self.waiting and pending < self.max_pending and self.bucket.consume():
+            session = self.waiting.popleft()
+            client = self.clientclass(session.jid, session.password,
+                                      map=self.map, **session.kwargs)
+            for handler in session.handlers:
+                client.register(handler)
+            session.client = client
+            session.connections += 1
+            client.start()
+
+            pending += 1
+            admitted += 1
+        return admitted
+
+    def reap(self):
+        """
+        Detaches the clients whose connection was closed and,
+        when ``reconnect`` is set, queues their session again
+        unless they failed to authenticate. Clients waiting to reconnect on their own, as per their
+        reconnect policy, are left alone.
+        """
+        live = set(self.map.itervalues())
+        for session in self.sessions.itervalues():
+            client = session.client
+            if client is None:
+                continue
+            if client.stream.scram:
+                session.scram = client.stream.scram
+            if client not in live and not client.reconnecting:
+                session.client = None
+                if client.auth_failed:
+                    session.failed = True
+                elif self.reconnect and self.running:
+                    self.waiting.append(session)
+
+    def precompute(self, processes=None):
+        """
+        Derives the authentication material of the waiting
+        sessions so that their SASL exchanges don't compute it
+        on the loop:
+
+        * the DIGEST-MD5 credentials hash, encoded as UTF-8 and as
+          ISO 8859-1, used when the challenge has no charset. The realm
+          is assumed to be the domain of the JID, as servers usually
+          announce. When the challenge announces another realm, or none,
+          the precomputed hash isn't used and the hash is computed at
+          login time instead.
+        * the SCRAM keys of the sessions whose ``scram`` attribute
+          is set, in a pool of ``processes`` processes
+
+        Returns the number of SCRAM keys derived.
+        """
+        credentials = []
+        for session in self.waiting:
+            jid = JID.parse(session.jid)
+            if jid is None or not jid.node:
+                continue
+            for charset in ('utf-8', 'ISO 8859-1'):
+                try:
+                    password = session.password
+                    if isinstance(password, unicode):
+                        password = password.encode(charset)
+                    credentials_hash(jid.node.encode(charset),
+                                     jid.domain.encode('utf-8'), password)
+                except UnicodeError:
+                    # can't be sent without a charset
+                    pass
+            if session.scram:
+                mechanism, salt, iterations = session.scram
+                credentials.append((mechanism, jid.node, session.password,
+                                    salt, iterations))
+
+        return key_cache.precompute(credentials, processes)
+
+    def run_once(self):
+        """
+        Runs a single iteration of the loop.
+        """
+        if self.map:
+            asyncore.loop(timeout=self.tick, use_poll=True,
+                          map=self.map, count=1)
+        else:
+            time.sleep(self.tick)
+
+        now = time.time()
+        for client in self.clients:
+            client.process_timers(now)
+
+        self.reap()
+        self.admit()
+
+    def run(self):
+        """
+        Runs the loop until :meth:`stop` is called.
+        """
+        self.running = True
+        while self.running:
+            self.run_once()
+
+    def stop(self):
+        """
+        Stops every session and the loop.
+        """
+        self.running = False
+        self.waiting.clear()
+        for session in self.sessions.itervalues():
+            if session.client:
+                client, session.client = session.client, None
+                client.stop()
+
+    def health(self):
+        """
+        Returns a dictionary describing the state of the pool:
+
+        * ``sessions``: number of managed sessions
+        * ``waiting``: sessions waiting to be admitted
+        * ``pending``: sessions connecting or authenticating
+        * ``available``: sessions ready
+        * ``failed``: sessions which failed to authenticate
+        * ``connections``: total number of connections made
+        """
+        clients = self.clients
+        available = len([client for client in clients if client.available])
+        return {'sessions': len(self.sessions),
+                'waiting': len(self.waiting),
+                'pending': len(clients) - available,
+                'available': available,
+                'failed': len([s for s in self.sessions.itervalues() if s.failed]),
+                'connections': sum([s.connections for s in self.sessions.itervalues()])}
+
+    def throughput(self):
+        """
+        Returns a dictionary with the aggregated traffic of
+        the connected clients: ``sent_bytes``, ``sent_stanzas``,
+        ``received_bytes`` and ``queued_bytes`` along with the rates
+        per second since the previous call as ``sent_bytes_rate``,
+        ``sent_stanzas_rate`` and ``received_bytes_rate``.
+
+        Only clients exposing the buffers of
+        :class:`headstock.client.AsyncClient` are accounted for.
+        """
+        sent_bytes = sent_stanzas = received_bytes = queued_bytes = 0
+        for client in self.clients:
+            buffer = getattr(client, 'buffer', None)
+            if buffer is not None:
+                sent_bytes += buffer.sent_bytes
+                sent_stanzas += buffer.sent_stanzas
+                queued_bytes += buffer.queued_bytes
+            inbuffer = getattr(client, 'inbuffer', None)
+            if inbuffer is not None:
+                received_bytes += inbuffer.received_bytes
+
+        now = time.time()
+        last, last_sent_bytes, last_sent_stanzas, last_received_bytes = self._last_stats
+        elapsed = max(now - last, 1e-6)
+        self._last_stats = (now, sent_bytes, sent_stanzas, received_bytes)
+
+        return {'sent_bytes': sent_bytes,
+                'sent_stanzas': sent_stanzas,
+                'received_bytes': received_bytes,
+                'queued_bytes': queued_bytes,
+                'sent_bytes_rate': max(sent_bytes - last_sent_bytes, 0) / elapsed,
+                'sent_stanzas_rate': max(sent_stanzas - last_sent_stanzas, 0) / elapsed,
+                'received_bytes_rate': max(received_bytes - last_received_bytes, 0) / elapsed}
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+=======================
+Multi-process sharding
+=======================
+Spreads client sessions over several worker processes so that
+XML parsing and dispatching use every core of the host.
+
+Each worker runs a :class:`headstock.pool.SessionPool` and sessions
+are assigned to a worker by hashing their bare JID, so a given account
+always lives in the same process. Sessions are then addressed by
+their bare JID, whatever the resource they were added with.
+
+Basic usage
+-----------
+
+>>> from headstock.shard import ShardSupervisor
+>>> def make_handlers(jid):
+...     return [Basic()]
+>>> supervisor = ShardSupervisor(processes=4, handlers=make_handlers,
+...                              pool_options={'rate': 20})
+>>> supervisor.start()
+>>> for jid, password in accounts:
+...     supervisor.add(jid, password, hostname='localhost')
+>>> supervisor.send(u'bot@domain', u'<presence />')
+>>> supervisor.stats()
+
+``handlers`` must be a module level callable so that it can be handed
+to the worker processes. It is called with the JID of each session
+added to a worker and returns the list of handler instances to register.
+"""
+import multiprocessing
+try:
+    from Queue import Empty
+except ImportError:
+    from queue import Empty
+
+from headstock.lib.jid import JID
+
+__all__ = ['ShardSupervisor']
+
+def _bare(jid):
+    """
+    Returns the bare JID of ``jid``, a string or a
+    :class:`headstock.lib.jid.JID` instance.
+    """
+    if not isinstance(jid, JID):
+        token, jid = jid, JID.parse(jid)
+        if jid is None:
+            raise ValueError("Invalid JID: %r" % token)
+    return jid.bare
+
+def shard_for(jid, shards):
+    """
+    Returns the index of the shard, between 0 and ``shards`` - 1,
+    that ``jid`` belongs to. Only the bare JID is taken into account.
+    """
+    return int(_bare(jid).hashed, 16) % shards
+
+def _worker(index, commands, results, handlers, pool_options, pool=None):
+    """
+    Entry point of a worker process.
+
+    Sessions are looked up by their bare JID, as they are
+    sharded, so that ``jid`` in the commands may differ from the
+    JID the session was added with by its resource or its case.
+    """
+    if pool is None:
+        from headstock.pool import SessionPool
+        pool = SessionPool(**pool_options)
+    pool.running = True
+    owners = {}
+    undelivered = 0
+
+    while pool.running:
+        pool.run_once()
+
+        while True:
+            try:
+                command = commands.get_nowait()
+            except Empty:
+                break
+
+            action = command[0]
+            if action == 'add':
+                jid, password, kwargs = command[1:]
+                bare = _bare(jid)
+                if bare not in owners:
+                    pool.add(jid, password, handlers(jid) if handlers else None, **kwargs)
+                    owners[bare] = jid
+            elif action == 'remove':
+                jid = owners.pop(_bare(command[1]), None)
+                if jid is not None:
+                    pool.remove(jid)
+            elif action == 'send':
+                jid, stanza = command[1:]
+                client = pool.get(owners.get(_bare(jid)))
+                if client is not None and client.available:
+                    client.send_stanza(stanza)
+                else:
+                    undelivered += 1
+            elif action == 'stats':
+                stats = pool.health()
+                stats.update(pool.throughput())
+                stats['undelivered'] = undelivered
+                results.put((command[1], index, stats))
+            elif action == 'stop':
+                pool.stop()
+
+class ShardSupervisor(object):
+    """
+    Starts and drives a set of worker processes each
+    running a pool of sessions.
+
+    ``processes`` None - number of worker processes, defaults to
+    the number of CPUs.
+
+    ``handlers`` None - module level callable returning the handlers
+    to register for a given JID.
+
+    ``pool_options`` None - dictionary of keyword arguments passed to
+    :class:`headstock.pool.SessionPool` in every worker.
+    """
+    def __init__(self, processes=None, handlers=None, pool_options=None):
+        self.processes = processes or multiprocessing.cpu_count()
+        self.handlers = handlers
+        self.pool_options = pool_options or {}
+
+        self.workers = []
+        self.commands = []
+        self.results = None
+        self._stats_id = 0
+
+    def start(self):
+        """
+        Starts the worker processes.
+        """
+        self.results = multiprocessing.Queue()
+        for index in range(self.processes):
+            commands = multiprocessing.Queue()
+            worker = multiprocessing.Process(target=_worker,
+                                             args=(index, commands, self.results,
+                                                   self.handlers, self.pool_options))
+            worker.daemon = True
+            worker.start()
+            self.commands.append(commands)
+            self.workers.append(worker)
+
+    def stop(self, timeout=5.0):
+        """
+        Asks every worker to stop its sessions and waits
+        ``timeout`` seconds for each to terminate.
+        """
+        for commands in self.commands:
+            commands.put(('stop',))
+        for worker in self.workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+        self.workers = []
+        self.commands = []
+
+    def shard(self, jid):
+        """
+        Returns the index of the worker owning ``jid``.
+        """
+        return shard_for(jid, self.processes)
+
+    def add(self, jid, password, **kwargs):
+        """
+        Adds a session to the worker owning ``jid``. Extra
+        keyword arguments are passed to the client class.
+
+        A worker runs a single session per bare JID, adding
+        another one for the same account is ignored.
+        """
+        self.commands[self.shard(jid)].put(('add', jid, password, kwargs))
+
+    def remove(self, jid):
+        """
+        Stops and removes the session of ``jid``.
+        """
+        self.commands[self.shard(jid)].put(('remove', jid))
+
+    def send(self, jid, stanza):
+        """
+        Sends ``stanza``, a :class:`bridge.Element` instance
+        or a XML string, through the session of ``jid``.
+
+        Stanzas targeting a session which isn't available
+        are dropped and counted as `undelivered` in the stats.
+        """
+        if hasattr(stanza, 'xml'):
+            stanza = stanza.xml(omit_declaration=True, indent=False)
+        self.commands[self.shard(jid)].put(('send', jid, stanza))
+
+    def stats(self, timeout=1.0):
+        """
+        Collects the health and throughput of every worker
+        and returns them as a list indexed by worker. Workers
+        that didn't answer within ``timeout`` seconds are
+        reported as `None`.
+        """
+        self._stats_id += 1
+        stats_id = self._stats_id
+        for commands in self.commands:
+            commands.put(('stats', stats_id))
+
+        collected = [None] * len(self.commands)
+        remaining = len(self.commands)
+        while remaining:
+            try:
+                answer_id, index, stats = self.results.get(timeout=timeout)
+            except Empty:
+                break
+            if answer_id == stats_id:
+                collected[index] = stats
+                remaining -= 1
+        return collected
@@ -8,6 +8,8 @@ The XMPP stream handling in headstock is performed by the
 instanciated by the main client class.
 """
 
+from collections import deque
+
 from bridge import Element as E
 from bridge import Attribute as A
 from bridge.common import XML_NS, XML_PREFIX, XMPP_CLIENT_NS, XMPP_STREAM_NS, XMPP_STREAM_PREFIX,\
@@ -17,15 +19,25 @@ from bridge.common import XML_NS, XML_PREFIX, XMPP_CLIENT_NS, XMPP_STREAM_NS, XM
 
 from headstock import xmpphandler
 from headstock.error import HeadstockStartTLS, HeadstockAuthenticationSuccess, \
-     HeadstockSessionBound, HeadstockAvailable, HeadstockStreamError
+     HeadstockSessionBound, HeadstockAvailable, HeadstockStreamError, \
+     HeadstockSessionResumed, HeadstockAuthenticationFailure
 from headstock.lib.stanza import Stanza
 from headstock.lib.utils import generate_unique, compute_handshake
 from headstock.lib.jid import JID
 from headstock.lib.auth.plain import generate_credential, validate_credentials
 from headstock.lib.auth.gaa import perform_authentication
 from headstock.lib.auth.digest import challenge_to_dict, compute_digest_response
+from headstock.lib.auth.scram import SCRAM_MECHANISMS, ScramClient
+
+__all__ = ['Stream', 'ComponentStream', 'StreamManagement']
+
+XMPP_SM_NS = u'urn:xmpp:sm:3'
+SM_ACK_REQUEST = (u"<r xmlns='%s'/>" % XMPP_SM_NS).encode('utf-8')
 
-__all__ = ['Stream', 'ComponentStream']
+STANZA_NAMES = (u'message', u'presence', u'iq')
+
+# SASL mechanisms supported by the client stream, in order of preference
+MECHANISMS = SCRAM_MECHANISMS + (u'DIGEST-MD5', u'PLAIN', u'X-GOOGLE-TOKEN', u'ANONYMOUS')
 
 class Stream(object):
     """
@@ -40,13 +52,42 @@ class Stream(object):
 
     ``register`` False - flag indicating if the registration was
     requested.
+
+    ``sm`` False - flag indicating if Stream Management (XEP-0198)
+    should be enabled when the server supports it. The
+    :class:`StreamManagement` instance is then available as the
+    ``sm`` attribute.
+
+    ``max_unacked`` 1000 - maximum number of sent stanzas kept
+    until the server acknowledges them when ``sm`` is set.
+
+    ``mechanisms`` None - SASL mechanisms the stream may use, in order
+    of preference. Defaults to :data:`MECHANISMS`, which favours SCRAM.
+
+    ``scram_cache`` None - :class:`headstock.lib.auth.scram.ScramKeyCache`
+    instance keeping the SCRAM keys, defaults to the cache shared by
+    the process.
+
+    Once authenticated with SCRAM, the ``scram`` attribute holds the
+    ``(mechanism, salt, iterations)`` the server used so that the keys
+    can be derived beforehand the next time, see
+    :meth:`headstock.lib.auth.scram.ScramKeyCache.precompute`.
     """
-    def __init__(self, jid, password, tls=False, register=False):
+    def __init__(self, jid, password, tls=False, register=False, sm=False, max_unacked=1000,
+                 mechanisms=None, scram_cache=None):
         self.jid = jid
         self.password = password
+        self.mechanisms = mechanisms or MECHANISMS
+        self.scram_cache = scram_cache
+        self.sasl = None
+        self.scram = None
+        self.session_deferred = False
 
         self.register = register
         self.use_tls = tls
+        self.sm = None
+        if sm:
+            self.sm = StreamManagement(self, max_unacked)
 
     def stream_header(self):
         """
@@ -83,11 +124,21 @@ class Stream(object):
         * initiates the TLS negociation (from the stream point
         of view) if `self.tls` is `True` and the feature has a
         `<starttls /> child.
-        * initiates the authentication based on the supported
-        mechanisms or abort if none is found.        
+        * initiates the authentication with the first mechanism of
+        ``self.mechanisms`` the server supports or abort if none is found.
+        Raises :class:`headstock.error.HeadstockAuthenticationFailure` when
+        SCRAM is chosen and SASLprep rejects the user name or password.
         """
         if not e.xml_children:
             return
+
+        if self.sm and e.has_child('sm', XMPP_SM_NS):
+            self.sm.supported = True
+
+        # Features advertised once authenticated are
+        # handled by their own handlers
+        if e.has_child('bind', XMPP_BIND_NS):
+            return
         
         if self.use_tls and e.has_child('starttls', XMPP_TLS_NS):
             return "<starttls xmlns='%s' />" % XMPP_TLS_NS
@@ -109,22 +160,31 @@ class Stream(object):
                     mechanisms.append(m.xml_text)
         
         mechanism = None
-
-        # Always favour DIGEST-MD5 if supported by receiving entity
-        if u'DIGEST-MD5' in mechanisms:
-            mechanism = u'DIGEST-MD5'
+        for preferred in self.mechanisms:
+            if preferred in mechanisms:
+                mechanism = preferred
+                break
+
+        self.sasl = None
+        if mechanism in SCRAM_MECHANISMS:
+            try:
+                self.sasl = ScramClient(mechanism, self.jid.node, self.password,
+                                        cache=self.scram_cache)
+            except ValueError, exc:
+                # the user name or password has characters SASLprep
+                # prohibits, they can't be sent to the server
+                raise HeadstockAuthenticationFailure(str(exc))
+            token = self.sasl.first_message()
+        elif mechanism == u'DIGEST-MD5':
             token = None
-        elif u'PLAIN' in mechanisms:
-            mechanism = u'PLAIN'
+        elif mechanism == u'PLAIN':
             email = '%s@%s' % (self.jid.node, self.jid.domain)
             password = self.password
             token = generate_credential(email, self.jid.node, password)
-        elif u'X-GOOGLE-TOKEN' in mechanisms:
-            mechanism = u'X-GOOGLE-TOKEN'
+        elif mechanism == u'X-GOOGLE-TOKEN':
             password = self.password
             token = perform_authentication(self.jid.node, password)
-        elif u'ANONYMOUS' in mechanisms:            
-            mechanism = u'ANONYMOUS'
+        elif mechanism == u'ANONYMOUS':
             token = None
         else:
             # We don't support any of the proposed mechanism
@@ -157,6 +217,10 @@ class Stream(object):
         Handles the authentication by computing the
         challenge for the provided credentials.
         """
+        if self.sasl:
+            return E(u'response', content=self.sasl.respond(e.xml_text),
+                     namespace=XMPP_SASL_NS)
+
         response_token = None
         params = challenge_to_dict(e.xml_text)
         # Handling 'rspauth' token in DIGEST-MD5
@@ -175,15 +239,49 @@ class Stream(object):
         Authentication successful
 
         Raises a :class:`headstock.error.HeadstockAuthenticationSuccess` instance
-        handled by the client.
+        handled by the client. With SCRAM, the server signature is
+        checked first and :class:`headstock.error.HeadstockAuthenticationFailure`
+        is raised instead when it's invalid.
         """
+        sasl, self.sasl = self.sasl, None
+        if sasl:
+            if not sasl.verified:
+                sasl.verify(e.xml_text)
+            self.scram = (sasl.mechanism, sasl.salt, sasl.iterations)
         raise HeadstockAuthenticationSuccess()
 
+    @xmpphandler('failure', XMPP_SASL_NS, once=True)
+    def handle_failure(self, e):
+        """
+        Authentication failed
+
+        Raises a :class:`headstock.error.HeadstockAuthenticationFailure` instance,
+        carrying the condition given by the server, handled by the client.
+        """
+        self.sasl = None
+        condition = None
+        if e.xml_children:
+            condition = e.xml_children[0].xml_name
+        raise HeadstockAuthenticationFailure(condition)
+
     @xmpphandler('bind', XMPP_BIND_NS, once=True)
     def handle_binding(self, e):
         """
         Handle the JID binding request by returning
         the full JID.
+
+        When a previous session can be resumed through
+        Stream Management, the resumption is requested instead.
+        """
+        if self.sm and self.sm.resumable:
+            return self.sm.resume_request()
+
+        return self.bind_request()
+
+    def bind_request(self):
+        """
+        Creates and returns the IQ stanza binding
+        the resource of the stream.
         """
         iq = Stanza.set_iq(stanza_id=generate_unique())
         bind = E(u'bind', namespace=XMPP_BIND_NS, parent=iq)
@@ -203,11 +301,24 @@ class Stream(object):
         handled by the client indicating the session is ready.
 
         Otherwise returns the session stanza indicating the
-        client wishes to start a session.
+        client wishes to start a session, unless a previous session
+        is being resumed through Stream Management. The request is then
+        deferred until the resumption failed and a new resource is bound.
         """
         if e.xml_parent and e.xml_parent.get_attribute_value('type') == 'result':
             raise HeadstockSessionBound()
-        
+
+        if self.sm and (self.sm.resumable or self.sm.resuming):
+            self.session_deferred = True
+            return
+
+        return self.session_request()
+
+    def session_request(self):
+        """
+        Creates and returns the IQ stanza starting the session.
+        """
+        self.session_deferred = False
         iq = Stanza.set_iq(stanza_id=generate_unique())
         E(u'session', namespace=XMPP_SESSION_NS, parent=iq)
         
@@ -241,6 +352,193 @@ class Stream(object):
         return iq
 
 
+class StreamManagement(object):
+    """
+    Stream Management (XEP-0198) handler attached to a
+    :class:`Stream` instance.
+
+    It keeps track of the stanzas handled and sent, answers the
+    acknowledgement requests of the server and keeps a bounded
+    buffer of the stanzas the server hasn't acknowledged yet. When
+    the connection is lost and the server allowed it, the next
+    connection resumes the session in a single round trip rather than
+    binding a new one and the unacknowledged stanzas are sent again.
+
+    The client registers this handler alongside the stream and keeps
+    it registered once the session is available. It reports stanzas
+    through :meth:`received` and :meth:`sent`.
+
+    ``stream`` :class:`Stream` instance
+
+    ``max_unacked`` 1000 - maximum number of unacknowledged stanzas
+    kept. When exceeded, the oldest ones are dropped and counted in the
+    ``dropped`` attribute.
+
+    ``ack_every`` 10 - number of unacknowledged stanzas after which
+    an acknowledgement is requested from the server
+    """
+    def __init__(self, stream, max_unacked=1000, ack_every=10):
+        self.stream = stream
+        self.max_unacked = max_unacked
+        self.ack_every = ack_every
+
+        self.supported = False
+        self.unacked = deque()
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets the current session. Unacknowledged
+        stanzas are kept so that they can be sent again.
+        """
+        self.enabled = False
+        self.resuming = False
+        self.id = None
+        self.resume = False
+        self.location = None
+        self.inbound = 0
+        self.outbound = 0
+        self.acked = 0
+        self.dropped = 0
+
+    @property
+    def resumable(self):
+        """
+        `True` if the server allowed the current
+        session to be resumed.
+        """
+        return self.enabled and self.resume and self.id is not None
+
+    def enable_request(self):
+        """
+        Starts counting stanzas and returns the element
+        enabling Stream Management.
+        """
+        self.enabled = True
+        self.outbound = self.acked = self.inbound = 0
+        return E(u'enable', attributes={u'resume': u'true'}, namespace=XMPP_SM_NS)
+
+    def resume_request(self):
+        """
+        Returns the element requesting the resumption
+        of the previous session.
+        """
+        self.resuming = True
+        return E(u'resume', attributes={u'previd': self.id,
+                                        u'h': unicode(self.inbound % 2**32)},
+                 namespace=XMPP_SM_NS)
+
+    def received(self):
+        """
+        Counts a stanza handled by the client.
+        """
+        if self.enabled:
+            self.inbound += 1
+
+    def sent(self, stanza):
+        """
+        Keeps ``stanza``, serialized as a XML string, until the server
+        acknowledges it. Returns `True` when an acknowledgement
+        should be requested.
+        """
+        if not self.enabled:
+            return False
+
+        self.outbound += 1
+        self.unacked.append((self.outbound, stanza))
+        if len(self.unacked) > self.max_unacked:
+            self.unacked.popleft()
+            self.dropped += 1
+
+        return self.outbound % self.ack_every == 0
+
+    def acknowledge(self, h):
+        """
+        Drops the stanzas acknowledged by the server's
+        ``h`` counter.
+        """
+        # h wraps around at 2^32
+        h = self.acked + ((int(h) - self.acked) % 2**32)
+        self.acked = h
+        unacked = self.unacked
+        while unacked and unacked[0][0] <= h:
+            unacked.popleft()
+
+    def pending(self):
+        """
+        Returns and forgets the XML strings of the stanzas
+        that haven't been acknowledged.
+
+        The outbound counter is rewound to the last acknowledged
+        stanza since the server counts them again once they are sent
+        again, through :meth:`sent`.
+        """
+        stanzas = [stanza for seq, stanza in self.unacked]
+        self.unacked.clear()
+        self.outbound = self.acked
+        return stanzas
+
+    def ack_request(self):
+        """
+        Returns the element requesting an acknowledgement.
+        """
+        return SM_ACK_REQUEST
+
+    @xmpphandler('enabled', XMPP_SM_NS)
+    def handle_enabled(self, e):
+        """
+        Stream Management was enabled by the server.
+        """
+        self.id = e.get_attribute_value('id')
+        self.resume = e.get_attribute_value('resume') in ('true', '1')
+        self.location = e.get_attribute_value('location')
+
+    @xmpphandler('r', XMPP_SM_NS)
+    def handle_ack_request(self, e):
+        """
+        Answers the server's acknowledgement request
+        with the number of stanzas handled so far.
+        """
+        return E(u'a', attributes={u'h': unicode(self.inbound % 2**32)},
+                 namespace=XMPP_SM_NS)
+
+    @xmpphandler('a', XMPP_SM_NS)
+    def handle_ack(self, e):
+        """
+        Acknowledgement sent by the server.
+        """
+        self.acknowledge(e.get_attribute_value('h'))
+
+    @xmpphandler('resumed', XMPP_SM_NS)
+    def handle_resumed(self, e):
+        """
+        The previous session was resumed.
+
+        Raises a :class:`headstock.error.HeadstockSessionResumed` instance
+        handled by the client which sends the unacknowledged stanzas again.
+        """
+        self.resuming = False
+        self.stream.session_deferred = False
+        self.acknowledge(e.get_attribute_value('h'))
+        raise HeadstockSessionResumed()
+
+    @xmpphandler('failed', XMPP_SM_NS)
+    def handle_failed(self, e):
+        """
+        Enabling or resuming the session failed.
+
+        When resuming, a new resource is bound instead, the session
+        is requested if the server asked for it, and the unacknowledged
+        stanzas are sent once the new session is ready.
+        """
+        resuming = self.resuming
+        self.reset()
+        if resuming:
+            stanzas = [self.stream.bind_request()]
+            if self.stream.session_deferred:
+                stanzas.append(self.stream.session_request())
+            return stanzas
+
 class ComponentStream(object):
     def __init__(self, jid):
         self.jid = jid
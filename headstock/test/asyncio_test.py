@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+import os
+import socket
+import ssl
+import threading
+import unittest
+from headstock.client import HAS_ASYNCIO
+
+if HAS_ASYNCIO:
+    from headstock.client import AsyncioClient, asyncio
+
+# self-signed certificate for localhost, along with its key
+CERTIFICATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'localhost.pem')
+
+SERVER_HEADER = '<stream:stream xmlns:stream="http://etherx.jabber.org/streams" ' \
+                'xmlns="jabber:client" from="localhost" id="s1" version="1.0">'
+
+def read_until(conn, marker):
+    data = ''
+    while marker not in data:
+        chunk = conn.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+def serve(listener, events):
+    """
+    Plays the server side of a STARTTLS negotiation
+    and records what it received.
+    """
+    conn, address = listener.accept()
+    conn.settimeout(5)
+    try:
+        events.append(read_until(conn, '<stream:stream'))
+        conn.sendall(SERVER_HEADER + "<stream:features><starttls "
+                     "xmlns='urn:ietf:params:xml:ns:xmpp-tls'/></stream:features>")
+        events.append(read_until(conn, 'starttls'))
+        conn.sendall("<proceed xmlns='urn:ietf:params:xml:ns:xmpp-tls'/>")
+
+        conn = ssl.wrap_socket(conn, server_side=True, certfile=CERTIFICATE)
+        events.append(read_until(conn, '<stream:stream'))
+    finally:
+        conn.close()
+
+@unittest.skipUnless(HAS_ASYNCIO, "trollius isn't installed")
+class TestAsyncioClient(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(1)
+        self.events = []
+        self.server = threading.Thread(target=serve, args=(self.listener, self.events))
+        self.server.daemon = True
+        self.server.start()
+
+    def tearDown(self):
+        self.listener.close()
+        self.loop.close()
+
+    def run_loop(self, timeout=5):
+        deadline = self.loop.time() + timeout
+        def check():
+            if not self.server.is_alive() or self.loop.time() > deadline:
+                self.loop.stop()
+            else:
+                self.loop.call_later(0.01, check)
+        self.loop.call_soon(check)
+        self.loop.run_forever()
+
+    def test_starttls(self):
+        context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+        context.verify_mode = ssl.CERT_NONE
+        client = AsyncioClient(u'alice@localhost', u'secret', hostname='127.0.0.1',
+                               port=self.listener.getsockname()[1], tls=True,
+                               loop=self.loop, ssl_context=context)
+        client.start()
+        self.run_loop()
+        client.stop()
+
+        self.assertEqual(len(self.events), 3)
+        self.assertTrue('<stream:stream' in self.events[0])
+        self.assertTrue('starttls' in self.events[1])
+        # the stream is opened again over TLS
+        self.assertTrue('<stream:stream' in self.events[2])
+
+if __name__ == '__main__':
+    unittest.main()
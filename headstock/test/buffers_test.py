@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+import unittest
+from headstock.lib.buffers import WriteQueue, ReadBuffer
+
+class Socket(object):
+    def __init__(self, accept):
+        self.accept = accept
+        self.data = []
+
+    def send(self, data):
+        data = data[:self.accept]
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        self.data.append(data)
+        return len(data)
+
+class ScatterSocket(Socket):
+    def sendmsg(self, buffers):
+        data = ''.join([b.tobytes() for b in buffers])[:self.accept]
+        self.data.append(data)
+        return len(data)
+
+class TestWriteQueue(unittest.TestCase):
+
+    def test_counters(self):
+        q = WriteQueue(high_water=8)
+        q.append("<a/>")
+        q.append(u"<b/>")
+        self.assertEqual(len(q), 8)
+        self.assertEqual(q.queued_stanzas, 2)
+        self.assertFalse(q.full)
+        q.append("<c/>")
+        self.assertTrue(q.full)
+
+    def test_partial_send(self):
+        q = WriteQueue()
+        q.append("<message/>")
+        sock = Socket(3)
+        self.assertEqual(q.send(sock), 3)
+        self.assertEqual(q.queued_stanzas, 1)
+        q.send(Socket(100))
+        self.assertEqual(len(q), 0)
+        self.assertEqual(q.sent_bytes, 10)
+        self.assertEqual(q.sent_stanzas, 1)
+
+    def test_scatter_send(self):
+        q = WriteQueue()
+        q.append("<a/>")
+        q.append("<b/>")
+        q.append("<c/>")
+        sock = ScatterSocket(6)
+        self.assertEqual(q.send(sock), 6)
+        self.assertEqual(sock.data, ["<a/><b"])
+        self.assertEqual(q.queued_stanzas, 2)
+        self.assertEqual(q.sent_stanzas, 1)
+        q.send(sock)
+        self.assertEqual(sock.data[-1], "/><c/>")
+        self.assertEqual(len(q), 0)
+
+    def test_joined_send(self):
+        q = WriteQueue(max_send=10)
+        q.append("<a/>")
+        q.append("<b/>")
+        q.append("<c/>")
+        sock = Socket(100)
+        self.assertEqual(q.send(sock), 8)
+        self.assertEqual(sock.data, ["<a/><b/>"])
+        self.assertEqual(q.sent_stanzas, 2)
+        q.send(sock)
+        self.assertEqual(sock.data[-1], "<c/>")
+        self.assertEqual(len(q), 0)
+
+    def test_joined_partial_send(self):
+        q = WriteQueue()
+        q.append("<a/>")
+        q.append("<b/>")
+        sock = Socket(6)
+        self.assertEqual(q.send(sock), 6)
+        self.assertEqual(q.queued_stanzas, 1)
+        q.send(sock)
+        self.assertEqual(sock.data, ["<a/><b", "/>"])
+
+    def test_large_chunk_not_joined(self):
+        q = WriteQueue(max_send=4)
+        q.append("<message/>")
+        q.append("<a/>")
+        sock = Socket(100)
+        q.send(sock)
+        self.assertEqual(sock.data, ["<message/>"])
+
+    def test_drained(self):
+        q = WriteQueue(high_water=8, low_water=4)
+        q.append("<abcdefgh/>")
+        self.assertTrue(q.full)
+        q.send(Socket(9))
+        self.assertTrue(q.drained)
+
+class ReadSocket(object):
+    def __init__(self, payload):
+        self.payload = payload
+
+    def recv_into(self, buf, nbytes):
+        data = self.payload[:nbytes]
+        self.payload = self.payload[nbytes:]
+        buf[:len(data)] = data
+        return len(data)
+
+class TestReadBuffer(unittest.TestCase):
+
+    def test_grow(self):
+        b = ReadBuffer(min_size=4, max_size=16)
+        sock = ReadSocket("<a/><b/><c/><d/><e/><f/>")
+        self.assertEqual(b.read(sock).tobytes(), "<a/>")
+        self.assertEqual(b.size, 8)
+        self.assertEqual(b.read(sock).tobytes(), "<b/><c/>")
+        self.assertEqual(b.size, 16)
+        self.assertEqual(b.read(sock).tobytes(), "<d/><e/><f/>")
+        self.assertEqual(b.size, 16)
+
+    def test_shrink(self):
+        b = ReadBuffer(min_size=4, max_size=16, shrink_after=2)
+        b.size = 16
+        b.adapt(1)
+        self.assertEqual(b.size, 16)
+        b.adapt(1)
+        self.assertEqual(b.size, 8)
+
+if __name__ == '__main__':
+    unittest.main()
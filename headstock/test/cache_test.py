@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+
+import unittest
+from headstock.lib.cache import LRUCache
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_get_set(self):
+        cache = LRUCache(10)
+        self.assertEqual(cache.get('a'), None)
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertTrue('a' in cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_cached_none(self):
+        cache = LRUCache(10)
+        cache.set('a', None)
+        self.assertEqual(cache.get('a', 'default'), None)
+
+    def test_bounded(self):
+        cache = LRUCache(10)
+        for i in range(100):
+            cache.set(i, i)
+        self.assertTrue(len(cache) <= 10)
+        self.assertFalse(0 in cache)
+        self.assertEqual(cache.get(99), 99)
+
+    def test_recently_used_kept(self):
+        cache = LRUCache(4)
+        cache.set('hot', 1)
+        for i in range(20):
+            cache.set(i, i)
+            self.assertEqual(cache.get('hot'), 1)
+        self.assertTrue('hot' in cache)
+
+    def test_clear(self):
+        cache = LRUCache(4)
+        cache.set('a', 1)
+        cache.clear()
+        self.assertFalse('a' in cache)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+
+import errno
+import socket
+import threading
+import time
+import unittest
+from bridge.common import XMPP_CLIENT_NS
+from headstock import xmpphandler
+from headstock.client import BaseClient, AsyncClient
+from headstock.error import HeadstockIQError, HeadstockTimeout
+from headstock.lib.executor import HandlerExecutor
+from headstock.lib.reconnect import ExponentialBackoff
+from headstock.lib.stanza import Stanza
+
+SERVER_HEADER = '<stream:stream xmlns:stream="http://etherx.jabber.org/streams" ' \
+                'xmlns="jabber:client" from="localhost" id="s1" version="1.0">'
+
+BOUND_FEATURES = "<stream:features><bind xmlns='urn:ietf:params:xml:ns:xmpp-bind'/>" \
+                 "<session xmlns='urn:ietf:params:xml:ns:xmpp-session'/>" \
+                 "<sm xmlns='urn:xmpp:sm:3'/></stream:features>"
+
+class FakeClient(BaseClient):
+    """
+    Client keeping what it sends rather than
+    writing it onto a socket.
+    """
+    def __init__(self, *args, **kwargs):
+        self.sent = []
+        BaseClient.__init__(self, *args, **kwargs)
+
+    def send_raw_stanza(self, stanza):
+        self.sent.append(stanza)
+
+class GetHandler(object):
+    def __init__(self):
+        self.received = []
+
+    @xmpphandler('iq', XMPP_CLIENT_NS, type='get')
+    def handle_get(self, e):
+        self.received.append(e.get_attribute_value('id'))
+
+class ThreadHandler(object):
+    def __init__(self):
+        self.received = []
+
+    @xmpphandler('message', XMPP_CLIENT_NS, executor='thread')
+    def handle_message(self, e):
+        self.received.append(e)
+        return '<message id="reply"/>'
+
+def connect(**kwargs):
+    client = FakeClient(u'alice@localhost/test', u'secret', **kwargs)
+    client.feed(SERVER_HEADER)
+    return client
+
+class TestRequest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = connect()
+        self.outcome = []
+
+    def request(self, timeout=5):
+        future = self.client.request(Stanza.get_iq(stanza_id=u'r1'), timeout=timeout)
+        def done(future):
+            if future.exception() is not None:
+                self.outcome.append(future.exception())
+            else:
+                self.outcome.append(future.result().get_attribute_value('type'))
+        future.add_done_callback(done)
+        self.assertTrue(self.client.sent[-1].startswith('<iq'))
+        self.assertEqual(len(self.client.pending_requests), 1)
+        return future
+
+    def assertCleanedUp(self):
+        self.assertEqual(self.client.pending_requests, {})
+        self.assertEqual(len(self.client.iq_handlers), 0)
+        self.assertEqual(len(self.client.timers), 0)
+
+    def test_result(self):
+        future = self.request()
+        self.client.feed("<iq type='result' id='r1' from='localhost'/>")
+        self.assertTrue(future.done())
+        self.assertEqual(self.outcome, [u'result'])
+        self.assertCleanedUp()
+
+    def test_error(self):
+        future = self.request()
+        self.client.feed("<iq type='error' id='r1' from='localhost'/>")
+        self.assertTrue(isinstance(self.outcome[0], HeadstockIQError))
+        self.assertCleanedUp()
+
+    def test_timeout(self):
+        future = self.request(timeout=1)
+        self.client.process_timers(time.time() + 0.5)
+        self.assertFalse(future.done())
+        self.client.process_timers(time.time() + 2)
+        self.assertTrue(isinstance(self.outcome[0], HeadstockTimeout))
+        self.assertCleanedUp()
+
+        # a late response is ignored
+        self.client.feed("<iq type='result' id='r1' from='localhost'/>")
+        self.assertEqual(len(self.outcome), 1)
+
+    def test_unmatched_chain(self):
+        handler = GetHandler()
+        self.client.register(handler)
+        future = self.request()
+        self.client.feed("<iq type='result' id='r1' from='localhost'/>")
+        self.assertEqual(self.outcome, [u'result'])
+        self.assertCleanedUp()
+
+        self.client.feed("<iq type='get' id='g1' from='localhost'/>")
+        self.assertEqual(handler.received, [u'g1'])
+
+    def test_send_failure(self):
+        def fail(stanza):
+            raise IOError("connection lost")
+        self.client.send_raw_stanza = fail
+        self.assertRaises(IOError, self.client.request,
+                          Stanza.get_iq(stanza_id=u'r1'), 5)
+        self.assertCleanedUp()
+
+class TestAuthentication(unittest.TestCase):
+
+    def test_prohibited_password(self):
+        client = FakeClient(u'alice@localhost/test', u'sec\u0007ret')
+        client.feed(SERVER_HEADER)
+        client.feed("<stream:features><mechanisms xmlns='urn:ietf:params:xml:ns:xmpp-sasl'>"
+                    "<mechanism>SCRAM-SHA-1</mechanism></mechanisms></stream:features>")
+        self.assertTrue(client.auth_failed)
+        self.assertEqual([data for data in client.sent if '<auth' in data], [])
+
+class TestStreamManagement(unittest.TestCase):
+
+    def setUp(self):
+        self.client = connect(sm=True)
+        self.sm = self.client.sm
+        self.sm.supported = True
+        self.client.send_stanza(self.sm.enable_request())
+        self.client.feed("<enabled xmlns='urn:xmpp:sm:3' id='sm1' resume='true'/>")
+        for i in range(5):
+            self.client.send_stanza('<message id="m%d"/>' % i)
+        self.client.feed("<a xmlns='urn:xmpp:sm:3' h='2'/>")
+        self.assertEqual(self.sm.outbound, 5)
+        self.assertEqual(len(self.sm.unacked), 3)
+
+        # the connection is lost
+        self.client.reset_session()
+        self.client.sent = []
+        self.client.feed(SERVER_HEADER)
+
+    def count(self, text):
+        return len([data for data in self.client.sent if text in data])
+
+    def test_resumed_features(self):
+        self.client.feed(BOUND_FEATURES)
+        # the session isn't requested on the resumed stream
+        self.assertEqual(len(self.client.sent), 1)
+        self.assertEqual(self.count('<resume'), 1)
+
+        self.client.feed("<resumed xmlns='urn:xmpp:sm:3' previd='sm1' h='3'/>")
+        self.assertEqual(self.client.sent[1:], ['<message id="m3"/>', '<message id="m4"/>'])
+        self.assertEqual(self.sm.outbound, 5)
+        self.assertFalse(self.client.stream.session_deferred)
+
+        self.client.feed("<a xmlns='urn:xmpp:sm:3' h='5'/>")
+        self.assertEqual(len(self.sm.unacked), 0)
+        self.assertEqual(self.count('xmpp-session'), 0)
+        self.assertEqual(self.count('<enable'), 0)
+        self.assertEqual(self.count('<presence'), 0)
+
+    def test_failed_resumption_features(self):
+        self.client.feed(BOUND_FEATURES)
+        self.assertEqual(self.count('xmpp-session'), 0)
+
+        # a new resource is bound and the session requested
+        self.client.feed("<failed xmlns='urn:xmpp:sm:3'/>")
+        self.assertEqual(self.count('xmpp-bind'), 1)
+        self.assertEqual(self.count('xmpp-session'), 1)
+        self.client.feed("<iq type='result' id='s2'>"
+                         "<session xmlns='urn:ietf:params:xml:ns:xmpp-session'/></iq>")
+        self.assertEqual(self.count('<enable'), 1)
+        self.assertEqual(self.count('<presence'), 1)
+        self.assertEqual(self.client.sent[-3:], ['<message id="m2"/>', '<message id="m3"/>',
+                                                 '<message id="m4"/>'])
+        self.assertEqual(self.sm.outbound, 4)
+
+    def test_resumed(self):
+        self.client.feed("<resumed xmlns='urn:xmpp:sm:3' previd='sm1' h='3'/>")
+        self.assertEqual(self.client.sent, ['<message id="m3"/>', '<message id="m4"/>'])
+        self.assertEqual(self.sm.outbound, 5)
+
+        self.client.feed("<a xmlns='urn:xmpp:sm:3' h='5'/>")
+        self.assertEqual(len(self.sm.unacked), 0)
+        self.assertEqual(self.sm.acked, 5)
+
+        self.client.send_stanza('<message id="m5"/>')
+        self.assertEqual(list(self.sm.unacked), [(6, '<message id="m5"/>')])
+
+    def test_bound(self):
+        # resuming failed, a new session is bound
+        self.client.feed("<failed xmlns='urn:xmpp:sm:3'/>")
+        self.client.feed("<iq type='result' id='s2'>"
+                         "<session xmlns='urn:ietf:params:xml:ns:xmpp-session'/></iq>")
+        self.assertEqual(self.client.sent[-3:], ['<message id="m2"/>', '<message id="m3"/>',
+                                                 '<message id="m4"/>'])
+        # the initial presence and the stanzas sent again
+        self.assertEqual(self.sm.outbound, 4)
+
+        self.client.feed("<a xmlns='urn:xmpp:sm:3' h='4'/>")
+        self.assertEqual(len(self.sm.unacked), 0)
+
+class TestMetrics(unittest.TestCase):
+
+    def test_received_types(self):
+        client = connect()
+        client.feed("<message type='chat' id='m1'/>")
+        client.feed("<message type='m%s' id='m2'/>" % ('x' * 32))
+        client.feed("<presence id='p1'/>")
+        client.feed("<presence type='chat' id='p2'/>")
+        client.feed("<made-up%d xmlns='urn:made:up:%d' type='x'/>" % (1, 1))
+        client.feed("<made-up%d xmlns='urn:made:up:%d'/>" % (2, 2))
+        client.feed("<message xmlns='urn:made:up' type='chat'/>")
+        counts = client.metrics.as_dict()['headstock_stanzas_received_total']
+        ns = XMPP_CLIENT_NS
+        self.assertEqual(counts, {(u'message', ns, u'chat'): 1, (u'message', ns, u'other'): 1,
+                                  (u'presence', ns, None): 1, (u'presence', ns, u'other'): 1,
+                                  (u'other', u'other', u'other'): 2,
+                                  (u'other', u'other', None): 1})
+
+    def test_sent_bytes(self):
+        client = FakeClient(u'alice@localhost/test', u'secret')
+        client.send_stream_header()
+        client.send_stanza('<message/>')
+        client.stop()
+        metrics = client.metrics.as_dict()
+        self.assertEqual(metrics['headstock_sent_bytes_total'],
+                         sum([len(data) for data in client.sent]))
+        self.assertEqual(metrics['headstock_stanzas_sent_total'], 1)
+
+class TestOffload(unittest.TestCase):
+
+    def test_copy_and_wake_up(self):
+        client = connect()
+        woken = threading.Event()
+        client.wake_up = woken.set
+        offloaded = []
+        def offload(e, entry):
+            offloaded.append(e)
+            BaseClient.offload(client, e, entry)
+        client.offload = offload
+        handler = ThreadHandler()
+        client.register(handler)
+
+        client.feed("<message id='m1'/>")
+        self.assertTrue(woken.wait(5))
+        e = handler.received[0]
+        self.assertTrue(e is not offloaded[0])
+        self.assertEqual(e.get_attribute_value('id'), u'm1')
+
+        client.process_timers()
+        self.assertEqual(client.sent[-1], '<message id="reply"/>')
+        self.assertEqual(client.offloaded, {})
+        client.cleanup()
+
+    def test_ordering_key(self):
+        executor = HandlerExecutor(threads=2)
+        client = connect()
+        client.set_executor(executor)
+        client.register(ThreadHandler())
+
+        client.feed("<message id='m1' from='Bob@Localhost/phone'/>")
+        client.feed("<message id='m2' from='bob@localhost/desk'/>")
+        client.feed("<message id='m3' from='alice@localhost'/>")
+        # the stanzas of bob are queued one after the other
+        self.assertEqual(sorted([(unicode(key), len(queue)) for key, queue
+                                 in executor.queues.items()]),
+                         [(u'alice@localhost', 1), (u'bob@localhost', 2)])
+        executor.close()
+        client.cleanup()
+
+    def test_stale_result(self):
+        executor = HandlerExecutor(threads=1)
+        client = connect()
+        client.set_executor(executor)
+        woken = threading.Event()
+        client.wake_up = woken.set
+        client.register(ThreadHandler())
+
+        client.feed("<message id='m1'/>")
+        self.assertTrue(woken.wait(5))
+        sent = len(client.sent)
+        client.cleanup()
+        # the shared executor hands the result back afterwards
+        self.assertEqual(executor.process(), 1)
+        self.assertEqual(len(client.sent), sent)
+        executor.close()
+
+class UnreachableClient(AsyncClient):
+    refused = False
+
+    def connect(self, address):
+        if self.refused:
+            raise socket.error(errno.ECONNREFUSED, 'Connection refused')
+        AsyncClient.connect(self, address)
+
+class TestAsyncReconnect(unittest.TestCase):
+
+    def test_unreachable(self):
+        client = UnreachableClient(u'alice@localhost/test', u'secret', map={},
+                                   reconnect=ExponentialBackoff(jitter=None))
+        client.running = True
+        client.refused = True
+        client.reconnect()
+        self.assertTrue(client.reconnecting)
+        self.assertEqual(client.reconnect_attempts, 1)
+        self.assertEqual(client._map, {})
+
+        client.stop()
+        self.assertFalse(client.reconnecting)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import base64
+import unittest
+from headstock.lib.auth import digest
+from headstock.lib.auth.digest import challenge_to_dict, compute_digest_response, \
+     credentials_hash, generate_cnonce
+
+# RFC 2831, section 4
+CHALLENGE = base64.b64encode('realm="elwood.innosoft.com",nonce="OA6MG9tEQGm2hh",'
+                             'qop="auth",algorithm=md5-sess,charset=utf-8')
+
+class TestDigest(unittest.TestCase):
+
+    def test_response(self):
+        params = challenge_to_dict(CHALLENGE)
+        response = compute_digest_response(params, u'chris', u'secret',
+                                           digest_uri='imap/elwood.innosoft.com',
+                                           cnonce='OA6MHXh6VqTrRk')
+        params = challenge_to_dict(response)
+        self.assertEqual(params['response'], 'd388dad90d4bbd760a152321f2143af7')
+        self.assertEqual(params['cnonce'], 'OA6MHXh6VqTrRk')
+
+    def test_credentials_cached(self):
+        digest._credentials_cache.clear()
+        first = credentials_hash('chris', 'elwood.innosoft.com', 'secret')
+        self.assertEqual(first, digest.H('chris:elwood.innosoft.com:secret'))
+        self.assertTrue(credentials_hash('chris', 'elwood.innosoft.com', 'secret') is first)
+        self.assertNotEqual(credentials_hash('chris', 'elwood.innosoft.com', 'other'), first)
+        self.assertEqual(digest._credentials_cache.hits, 1)
+        # the cache doesn't hold the passwords
+        self.assertTrue('chris' in [key[0] for key in digest._credentials_cache.young])
+        for key in digest._credentials_cache.young:
+            self.assertFalse('secret' in key or 'other' in key)
+
+    def test_cnonce(self):
+        cnonces = set([generate_cnonce() for i in range(100)])
+        self.assertEqual(len(cnonces), 100)
+
+        params = challenge_to_dict(CHALLENGE)
+        first = challenge_to_dict(compute_digest_response(params, u'chris', u'secret',
+                                                          digest_uri='imap/elwood.innosoft.com'))
+        second = challenge_to_dict(compute_digest_response(params, u'chris', u'secret',
+                                                           digest_uri='imap/elwood.innosoft.com'))
+        self.assertNotEqual(first['cnonce'], second['cnonce'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+import unittest
+from headstock.lib.dispatch import HandlerChain, HandlerEntry
+
+class Child(object):
+    def __init__(self, ns):
+        self.xml_ns = ns
+
+class Element(object):
+    def __init__(self, attributes=None, children=None):
+        self.attributes = attributes or {}
+        self.xml_children = children or []
+
+    def get_attribute_value(self, name, default=None):
+        return self.attributes.get(name, default)
+
+def handler(e):
+    pass
+
+class TestHandlerEntry(unittest.TestCase):
+
+    def test_no_predicates(self):
+        self.assertTrue(HandlerEntry(handler).matches(Element()))
+
+    def test_type(self):
+        entry = HandlerEntry(handler, predicates={'type': ['chat', 'normal']})
+        self.assertTrue(entry.matches(Element({'type': 'chat'})))
+        self.assertTrue(entry.matches(Element({'type': 'normal'})))
+        self.assertFalse(entry.matches(Element({'type': 'groupchat'})))
+        self.assertFalse(entry.matches(Element()))
+
+    def test_from(self):
+        entry = HandlerEntry(handler, predicates={'from': u'bob@domain'})
+        self.assertTrue(entry.matches(Element({'from': u'bob@domain'})))
+        self.assertTrue(entry.matches(Element({'from': u'bob@domain/home'})))
+        self.assertFalse(entry.matches(Element({'from': u'alice@domain'})))
+        # compared once prepared
+        self.assertTrue(entry.matches(Element({'from': u'Bob@DOMAIN/home'})))
+        self.assertFalse(entry.matches(Element({'from': u'bob@domain.org'})))
+        self.assertFalse(entry.matches(Element({'from': u'@domain'})))
+        self.assertFalse(entry.matches(Element()))
+
+        entry = HandlerEntry(handler, predicates={'from': u'bob@domain/home'})
+        self.assertTrue(entry.matches(Element({'from': u'bob@domain/home'})))
+        self.assertFalse(entry.matches(Element({'from': u'bob@domain/work'})))
+        self.assertFalse(entry.matches(Element({'from': u'bob@domain'})))
+
+        self.assertRaises(ValueError, HandlerEntry, handler, predicates={'from': u'@domain'})
+
+    def test_child(self):
+        entry = HandlerEntry(handler, predicates={'child': 'jabber:x:data'})
+        self.assertTrue(entry.matches(Element(children=[u'text', Child('jabber:x:data')])))
+        self.assertFalse(entry.matches(Element(children=[Child('jabber:client')])))
+        self.assertFalse(entry.matches(Element()))
+
+    def test_unknown_predicate(self):
+        self.assertRaises(ValueError, HandlerEntry, handler, predicates={'to': u'a@b'})
+
+class TestHandlerChain(unittest.TestCase):
+
+    def test_priority_order(self):
+        chain = HandlerChain()
+        low = chain.add(HandlerEntry(handler))
+        high = chain.add(HandlerEntry(handler, priority=10))
+        other = chain.add(HandlerEntry(handler))
+        self.assertEqual(list(chain), [high, low, other])
+
+    def test_match(self):
+        chain = HandlerChain()
+        chat = chain.add(HandlerEntry(handler, predicates={'type': 'chat'}))
+        every = chain.add(HandlerEntry(handler))
+        self.assertEqual(chain.match(Element({'type': 'chat'})), [chat, every])
+        self.assertEqual(chain.match(Element({'type': 'headline'})), [every])
+
+    def test_remove_owner(self):
+        chain = HandlerChain()
+        first, second = object(), object()
+        a = chain.add(HandlerEntry(handler, owner=first))
+        b = chain.add(HandlerEntry(handler, owner=second))
+        c = chain.add(HandlerEntry(handler, owner=first))
+        chain.remove_owner(first)
+        self.assertEqual(list(chain), [b])
+        self.assertFalse(a.active)
+        self.assertFalse(c.active)
+        self.assertTrue(b.active)
+
+    def test_remove_unknown(self):
+        chain = HandlerChain()
+        chain.remove(HandlerEntry(handler))
+        self.assertEqual(len(chain), 0)
+
+    def test_clear(self):
+        chain = HandlerChain()
+        entry = chain.add(HandlerEntry(handler))
+        chain.clear()
+        self.assertEqual(len(chain), 0)
+        self.assertFalse(entry.active)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+import time
+import threading
+import unittest
+from headstock.lib.executor import HandlerExecutor
+from headstock.error import HeadstockAvailable
+
+def square(x):
+    return x * x
+
+def lock():
+    return threading.Lock()
+
+def wait(executor, count, timeout=5.0):
+    processed = 0
+    deadline = time.time() + timeout
+    while processed < count and time.time() < deadline:
+        processed += executor.process()
+        time.sleep(0.001)
+    return processed
+
+class TestHandlerExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = HandlerExecutor(threads=4)
+        self.done = []
+
+    def tearDown(self):
+        self.executor.close()
+
+    def record(self, name):
+        def done(result, error, elapsed):
+            self.done.append((name, result, error, threading.current_thread().name))
+        return done
+
+    def test_result_on_loop(self):
+        self.executor.submit('thread', u'a@b', lambda x: x * 2, (21,), self.record('job'))
+        self.assertEqual(self.executor.process(), 0)
+        self.assertEqual(wait(self.executor, 1), 1)
+        name, result, error, thread = self.done[0]
+        self.assertEqual((name, result, error), ('job', 42, None))
+        self.assertEqual(thread, threading.current_thread().name)
+        self.assertEqual(len(self.executor), 0)
+
+    def test_ordering_per_key(self):
+        def job(delay, value):
+            time.sleep(delay)
+            return value
+        self.executor.submit('thread', u'a@b', job, (0.05, 1), self.record('a'))
+        self.executor.submit('thread', u'a@b', job, (0.0, 2), self.record('a'))
+        self.executor.submit('thread', u'c@d', job, (0.0, 3), self.record('c'))
+        self.assertEqual(len(self.executor), 3)
+        wait(self.executor, 3)
+        self.assertEqual([result for name, result, error, thread in self.done
+                          if name == 'a'], [1, 2])
+        # the other key didn't wait for the slow job
+        self.assertEqual(self.done[0][1], 3)
+
+    def test_wakeup(self):
+        woken = threading.Event()
+        threads = []
+        def wakeup():
+            threads.append(threading.current_thread().name)
+            woken.set()
+        self.executor.submit('thread', u'a@b', square, (3,), self.record('square'), wakeup)
+        self.assertTrue(woken.wait(5))
+        self.assertNotEqual(threads, [threading.current_thread().name])
+        # the result is there as soon as the loop is woken up
+        self.assertEqual(self.executor.process(), 1)
+        self.assertEqual(self.done[0][1], 9)
+
+    def test_errors(self):
+        def fail():
+            raise KeyError('missing')
+        def available():
+            raise HeadstockAvailable()
+        self.executor.submit('thread', None, fail, (), self.record('fail'))
+        self.executor.submit('thread', None, available, (), self.record('available'))
+        wait(self.executor, 2)
+        name, result, error, thread = self.done[0]
+        self.assertEqual(error[0], None)
+        self.assertTrue('KeyError' in error[1])
+        name, result, error, thread = self.done[1]
+        self.assertTrue(isinstance(error[0], HeadstockAvailable))
+
+    def test_process(self):
+        self.executor.processes = 1
+        self.executor.submit('process', u'a@b', square, (7,), self.record('square'))
+        wait(self.executor, 1)
+        self.assertEqual(self.done[0][1:3], (49, None))
+
+    def test_unpicklable(self):
+        self.executor.processes = 1
+        self.executor.submit('process', u'a@b', lock, (), self.record('result'))
+        self.executor.submit('process', u'a@b', square, (threading.Lock(),),
+                             self.record('args'))
+        self.executor.submit('process', u'a@b', square, (5,), self.record('square'))
+        self.assertEqual(wait(self.executor, 3), 3)
+        self.assertEqual([name for name, result, error, thread in self.done],
+                         ['result', 'args', 'square'])
+        for name, result, error, thread in self.done[:2]:
+            self.assertEqual(result, None)
+            self.assertTrue('pickle' in error[1])
+        self.assertEqual(self.done[2][1:3], (25, None))
+        self.assertEqual(len(self.executor), 0)
+
+    def test_unknown_pool(self):
+        self.assertRaises(ValueError, self.executor.pool, 'fiber')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+import unittest
+from headstock import xmpphandler, handler_specs
+
+class Handler(object):
+    @xmpphandler('message', 'jabber:client')
+    def message(self, e):
+        pass
+
+    @xmpphandler(['presence', 'iq'], 'jabber:client', once=True, forget=False)
+    def other(self, e):
+        pass
+
+    def helper(self):
+        pass
+
+class SubHandler(Handler):
+    @xmpphandler('item', 'jabber:iq:roster')
+    def roster(self, e):
+        pass
+
+class Filtered(object):
+    @xmpphandler('message', 'jabber:client', priority=10,
+                 type=['chat', 'normal'], from_jid='admin@domain')
+    def chat(self, e):
+        pass
+
+    @xmpphandler('message', 'jabber:client', executor='thread')
+    def lookup(self, e):
+        pass
+
+class TestHandlerSpecs(unittest.TestCase):
+
+    def test_specs(self):
+        specs = sorted(handler_specs(Handler))
+        self.assertEqual(specs, [('message', ['message'], 'jabber:client', False, True, 0, {}, None),
+                                 ('other', ['presence', 'iq'], 'jabber:client', True, False, 0, {}, None)])
+
+    def test_predicates(self):
+        specs = dict([(spec[0], spec) for spec in handler_specs(Filtered)])
+        self.assertEqual(specs['chat'][5:], (10, {'type': ['chat', 'normal'],
+                                                  'from': 'admin@domain'}, None))
+
+    def test_executor(self):
+        specs = dict([(spec[0], spec) for spec in handler_specs(Filtered)])
+        self.assertEqual(specs['lookup'][7], 'thread')
+        self.assertRaises(ValueError, xmpphandler, 'message', 'jabber:client', executor='fiber')
+
+    def test_inherited(self):
+        names = sorted([spec[0] for spec in handler_specs(SubHandler)])
+        self.assertEqual(names, ['message', 'other', 'roster'])
+
+    def test_cached(self):
+        self.assertTrue(handler_specs(Handler) is handler_specs(Handler))
+
+if __name__ == '__main__':
+    unittest.main()
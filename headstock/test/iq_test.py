@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+import unittest
+from headstock.lib.iq import IQRouter
+
+def handler(e):
+    pass
+
+def other(e):
+    pass
+
+class TestIQRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.router = IQRouter()
+
+    def test_match_exact(self):
+        self.router.add(handler, type="result", id="1")
+        self.assertEqual(self.router.match("1", "result"),
+                         [("1", "result", handler, False)])
+        self.assertEqual(self.router.match("1", "error"), [])
+        self.assertEqual(self.router.match("2", "result"), [])
+
+    def test_match_wildcards(self):
+        self.router.add(handler, type="result")
+        self.router.add(other, id="1")
+        self.assertEqual(self.router.match("1", "result"),
+                         [(None, "result", handler, False),
+                          ("1", None, other, False)])
+        self.assertEqual(self.router.match("2", "result"),
+                         [(None, "result", handler, False)])
+        self.assertEqual(self.router.match("1", "error"),
+                         [("1", None, other, False)])
+
+    def test_catch_all(self):
+        self.router.add(handler)
+        self.assertEqual(self.router.match("1", "get"),
+                         [(None, None, handler, False)])
+        self.assertEqual(self.router.match(None, None),
+                         [(None, None, handler, False)])
+
+    def test_remove(self):
+        self.router.add(handler, type="result", id="1", once=True)
+        self.assertRaises(ValueError, self.router.remove, handler,
+                          type="result", id="1")
+        self.router.remove(handler, type="result", id="1", once=True)
+        self.assertEqual(self.router.match("1", "result"), [])
+        self.assertEqual(len(self.router), 0)
+        self.assertRaises(ValueError, self.router.remove, handler,
+                          type="result", id="1", once=True)
+
+    def test_iter(self):
+        self.router.add(handler, id="1")
+        self.router.add(other, type="set")
+        self.assertEqual(list(self.router), [("1", None, handler, False),
+                                             (None, "set", other, False)])
+
+if __name__ == '__main__':
+    unittest.main()
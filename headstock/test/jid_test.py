@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
+import pickle
 import unittest
 from headstock.lib.jid import JID
 
@@ -27,5 +28,55 @@ class TestJID(unittest.TestCase):
     def test_hashed(self):
         self.assertEqual(self.jid.hashed, "4b8b6b2035fefaeae824f59bd54ebaf763cd61ce")
 
+    def test_unicode(self):
+        jid = JID(u'caf\xe9', u'domain')
+        self.assertEqual(str(jid), 'caf\xc3\xa9@domain')
+        self.assertEqual(unicode(jid), u'caf\xe9@domain')
+
+    def test_immutable(self):
+        self.assertRaises(AttributeError, setattr, self.jid, 'node', 'other')
+        self.assertRaises(AttributeError, setattr, self.jid, 'extra', 'value')
+
+    def test_equality(self):
+        self.assertEqual(JID("user", "domain", "resource"), self.jid)
+        self.assertNotEqual(JID("user", "domain"), self.jid)
+        self.assertNotEqual(self.jid, "user@domain/resource")
+        self.assertEqual(len(set([self.jid, JID("user", "domain", "resource")])), 1)
+
+    def test_bare(self):
+        bare = self.jid.bare
+        self.assertEqual(str(bare), "user@domain")
+        self.assertTrue(self.jid.bare is bare)
+        self.assertTrue(bare.bare is bare)
+
+    def test_parse_interned(self):
+        jid = JID.parse("bob@work/mobile")
+        self.assertTrue(JID.parse(u"bob@work/mobile") is jid)
+        self.assertEqual(JID.parse(""), None)
+
+    def test_pickle(self):
+        self.assertEqual(pickle.loads(pickle.dumps(self.jid)), self.jid)
+        self.assertEqual(pickle.loads(pickle.dumps(self.jid, 2)), self.jid)
+
+    def test_prepared(self):
+        self.assertEqual(JID.parse("Alice@Example.COM/Home"),
+                         JID.parse("alice@example.com/Home"))
+        self.assertEqual(str(JID.parse("Alice@Example.COM/Home")), "alice@example.com/Home")
+
+    def test_parse_parts(self):
+        jid = JID.parse("node@domain/res@ource/x")
+        self.assertEqual((jid.node, jid.domain, jid.resource),
+                         (u"node", u"domain", u"res@ource/x"))
+        jid = JID.parse("domain/resource")
+        self.assertEqual((jid.node, jid.domain, jid.resource),
+                         (None, u"domain", u"resource"))
+
+    def test_parse_invalid(self):
+        self.assertEqual(JID.parse("@domain"), None)
+        self.assertEqual(JID.parse("node@domain/"), None)
+        self.assertEqual(JID.parse("no de@domain"), None)
+        self.assertEqual(JID.parse("node@"), None)
+        self.assertRaises(ValueError, JID, "a<b", "domain")
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+import logging
+import os
+import tempfile
+import unittest
+from Queue import Queue
+from headstock.lib.logger import Logger, BoundedQueueHandler
+
+class Stanza(object):
+    serialized = 0
+
+    def xml(self, **kwargs):
+        Stanza.serialized += 1
+        return '<iq type="get" />'
+
+class Collector(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+class TestLogger(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = Logger(name="test")
+        self.handler = Collector()
+        self.logger.logger.addHandler(self.handler)
+        Stanza.serialized = 0
+
+    def tearDown(self):
+        self.logger.close()
+        self.logger.set_level(logging.DEBUG)
+
+    def test_level_for(self):
+        self.logger.trace(logging.INFO, name='iq', type='error')
+        self.logger.trace(logging.WARNING, direction='OUTGOING', name='iq')
+        self.assertEqual(self.logger.level_for('INCOMING', 'iq', 'error'), logging.INFO)
+        self.assertEqual(self.logger.level_for('OUTGOING', 'iq', 'error'), logging.INFO)
+        self.assertEqual(self.logger.level_for('OUTGOING', 'iq', 'get'), logging.WARNING)
+        self.assertEqual(self.logger.level_for('INCOMING', 'message'), logging.DEBUG)
+
+    def test_level_memo_bounded(self):
+        self.logger.trace(logging.INFO, name='iq', type='error')
+        for i in range(100):
+            self.assertEqual(self.logger.level_for('INCOMING', 'iq', 'x%d' % i),
+                             logging.DEBUG)
+            self.assertEqual(self.logger.level_for('INCOMING', 'x%d' % i, 'error'),
+                             logging.DEBUG)
+        self.assertEqual(self.logger.level_for('INCOMING', 'iq', 'error'), logging.INFO)
+        self.assertEqual(len(self.logger._levels), 3)
+
+    def test_lazy_serialization(self):
+        self.logger.set_level(logging.INFO)
+        self.logger.log_stanza(Stanza(), 'INCOMING')
+        self.assertEqual(Stanza.serialized, 0)
+        self.logger.set_level(logging.DEBUG)
+        self.logger.log_stanza(Stanza(), 'INCOMING')
+        self.assertEqual(Stanza.serialized, 1)
+        self.assertEqual(self.handler.messages, ['INCOMING <iq type="get" />'])
+
+    def test_filter_strings(self):
+        self.logger.set_level(logging.INFO)
+        self.logger.trace(logging.INFO, name='iq', type='error')
+        self.logger.log_stanza('<iq id="1" type="result" />', 'OUTGOING')
+        self.logger.log_stanza('<iq id="2" type="error"><error/></iq>', 'OUTGOING')
+        self.assertEqual(self.handler.messages,
+                         ['OUTGOING <iq id="2" type="error"><error/></iq>'])
+
+class TestThreadedLogger(unittest.TestCase):
+
+    def test_drop(self):
+        h = BoundedQueueHandler(Queue(1))
+        record = logging.LogRecord("test", logging.DEBUG, __file__, 1, "m", None, None)
+        h.handle(record)
+        h.handle(record)
+        self.assertEqual(h.dropped, 1)
+
+    def test_write(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            logger = Logger(path=path, name="threaded", threaded=True)
+            logger.log_stanza(Stanza(), 'INCOMING')
+            logger.log_stanza('<message />', 'OUTGOING')
+            logger.close()
+            content = open(path).read()
+            self.assertTrue('INCOMING <iq type="get" />' in content)
+            self.assertTrue('OUTGOING <message />' in content)
+            self.assertEqual(logger.dropped, 0)
+        finally:
+            os.remove(path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+import unittest
+from headstock.lib.metrics import MetricsRegistry
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter(self):
+        counter = self.registry.counter('stanzas_total', 'Stanzas', ('name', 'type'))
+        counter.inc((u'message', u'chat'))
+        counter.inc((u'message', u'chat'), 2)
+        counter.inc((u'presence', None))
+        self.assertEqual(counter.get((u'message', u'chat')), 3)
+        self.assertEqual(counter.get((u'iq', u'get')), 0)
+        self.assertEqual(self.registry.as_dict()['stanzas_total'],
+                         {(u'message', u'chat'): 3, (u'presence', None): 1})
+
+    def test_unlabelled_counter(self):
+        counter = self.registry.counter('bytes_total', 'Bytes')
+        counter.inc((), 512)
+        self.assertEqual(self.registry.as_dict(), {'bytes_total': 512})
+
+    def test_same_metric(self):
+        counter = self.registry.counter('bytes_total', 'Bytes')
+        self.assertTrue(self.registry.counter('bytes_total', 'Bytes') is counter)
+        self.assertRaises(ValueError, self.registry.histogram, 'bytes_total', 'Bytes')
+
+    def test_gauge(self):
+        pending = []
+        self.registry.gauge('pending', 'Pending', lambda: len(pending))
+        pending.append(1)
+        self.assertEqual(self.registry.as_dict(), {'pending': 1})
+
+        gauge = self.registry.gauge('depth', 'Depth')
+        gauge.set(7)
+        self.assertEqual(self.registry.as_dict()['depth'], 7)
+
+    def test_histogram(self):
+        histogram = self.registry.histogram('latency', 'Latency', buckets=(0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.1)
+        histogram.observe(0.5)
+        histogram.observe(3.0)
+        data = histogram.get()
+        self.assertEqual(data['count'], 4)
+        self.assertAlmostEqual(data['sum'], 3.65)
+        self.assertEqual(data['buckets'], [(0.1, 2), (1.0, 3), (float('inf'), 4)])
+
+    def test_prometheus(self):
+        counter = self.registry.counter('stanzas_total', 'Stanzas', ('name', 'type'))
+        counter.inc((u'message', u'a"b'))
+        histogram = self.registry.histogram('latency', 'Latency', buckets=(0.5,))
+        histogram.observe(0.25)
+        self.assertEqual(self.registry.prometheus(),
+                         u'# HELP latency Latency\n'
+                         u'# TYPE latency histogram\n'
+                         u'latency_bucket{le="0.5"} 1\n'
+                         u'latency_bucket{le="+Inf"} 1\n'
+                         u'latency_sum 0.25\n'
+                         u'latency_count 1\n'
+                         u'# HELP stanzas_total Stanzas\n'
+                         u'# TYPE stanzas_total counter\n'
+                         u'stanzas_total{name="message",type="a\\"b"} 1\n')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+import unittest
+from headstock.pool import SessionPool
+from headstock.lib.auth import digest
+from headstock.lib.ratelimit import TokenBucket
+
+class Stream(object):
+    scram = None
+
+class Client(object):
+    def __init__(self, jid, password, map=None, **kwargs):
+        self.jid = jid
+        self.password = password
+        self.map = map
+        self.kwargs = kwargs
+        self.handlers = []
+        self.stream = Stream()
+        self.available = False
+        self.auth_failed = False
+        self.reconnecting = False
+
+    def register(self, handler):
+        self.handlers.append(handler)
+
+    def start(self):
+        self.map[id(self)] = self
+
+    def stop(self):
+        self.map.pop(id(self), None)
+
+    def lost(self):
+        self.map.pop(id(self), None)
+
+class TestSessionPool(unittest.TestCase):
+    def setUp(self):
+        self.now = [0.0]
+        self.pool = SessionPool(clientclass=Client, max_pending=3)
+        self.pool.bucket = TokenBucket(2, clock=lambda: self.now[0])
+        self.pool.running = True
+        for i in range(5):
+            self.pool.add(u'user%d@localhost' % i, u'secret', hostname='localhost')
+
+    def test_add(self):
+        self.assertRaises(ValueError, self.pool.add, u'user0@localhost', u'secret')
+        self.assertEqual(self.pool.get(u'user0@localhost'), None)
+
+    def test_rate(self):
+        self.assertEqual(self.pool.admit(), 2)
+        self.assertEqual(self.pool.admit(), 0)
+        self.now[0] += 0.5
+        self.assertEqual(self.pool.admit(), 1)
+        client = self.pool.get(u'user0@localhost')
+        self.assertEqual(client.kwargs, {'hostname': 'localhost'})
+        self.assertTrue(client.map is self.pool.map)
+
+    def test_max_pending(self):
+        self.pool.bucket = TokenBucket(2, 10, clock=lambda: self.now[0])
+        self.assertEqual(self.pool.admit(), 3)
+        self.assertEqual(self.pool.pending, 3)
+        self.assertEqual(self.pool.admit(), 0)
+        self.pool.get(u'user0@localhost').available = True
+        self.assertEqual(self.pool.admit(), 1)
+        self.assertEqual(self.pool.health()['waiting'], 1)
+
+    def test_reap_requeues(self):
+        self.pool.admit()
+        client = self.pool.get(u'user0@localhost')
+        client.stream.scram = (u'SCRAM-SHA-1', 'salt', 4096)
+        client.lost()
+        self.pool.reap()
+        session = self.pool.sessions[u'user0@localhost']
+        self.assertEqual(session.client, None)
+        self.assertEqual(session.scram, (u'SCRAM-SHA-1', 'salt', 4096))
+        self.assertEqual(self.pool.waiting[-1], session)
+        self.assertEqual(len(self.pool.waiting), 4)
+
+    def test_reap_leaves_reconnecting(self):
+        self.pool.admit()
+        client = self.pool.get(u'user0@localhost')
+        client.reconnecting = True
+        client.lost()
+        self.pool.reap()
+        self.assertTrue(self.pool.get(u'user0@localhost') is client)
+        self.assertEqual(len(self.pool.waiting), 3)
+
+    def test_reap_not_running(self):
+        self.pool.admit()
+        self.pool.running = False
+        self.pool.get(u'user0@localhost').lost()
+        self.pool.reap()
+        self.assertEqual(self.pool.get(u'user0@localhost'), None)
+        self.assertEqual(len(self.pool.waiting), 3)
+
+    def test_auth_failure_not_requeued(self):
+        self.pool.admit()
+        client = self.pool.get(u'user0@localhost')
+        client.auth_failed = True
+        client.lost()
+        self.pool.reap()
+        session = self.pool.sessions[u'user0@localhost']
+        self.assertTrue(session.failed)
+        self.assertTrue(session not in self.pool.waiting)
+        self.assertEqual(self.pool.health()['failed'], 1)
+
+        self.assertRaises(ValueError, self.pool.retry, u'user1@localhost')
+        self.pool.retry(u'user0@localhost', u'other')
+        self.assertFalse(session.failed)
+        self.assertEqual(session.password, u'other')
+        self.assertEqual(self.pool.waiting[-1], session)
+
+    def test_precompute_digest(self):
+        digest._credentials_cache.clear()
+        pool = SessionPool(clientclass=Client)
+        pool.add(u'j\xf6e@localhost', u'p\xe4ss')
+        self.assertEqual(pool.precompute(), 0)
+        for charset in ('utf-8', 'ISO 8859-1'):
+            digest.credentials_hash(u'j\xf6e'.encode(charset), 'localhost',
+                                    u'p\xe4ss'.encode(charset))
+        self.assertEqual(digest._credentials_cache.hits, 2)
+
+    def test_remove(self):
+        self.pool.admit()
+        self.pool.remove(u'user0@localhost')
+        self.pool.remove(u'user4@localhost')
+        self.assertEqual(len(self.pool.map), 1)
+        self.assertEqual(len(self.pool.waiting), 2)
+        self.assertEqual(len(self.pool.sessions), 3)
+
+if __name__ == '__main__':
+    unittest.main()
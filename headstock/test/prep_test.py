@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+from headstock.lib.prep import nodeprep, nameprep, resourceprep, saslprep
+
+class TestNodeprep(unittest.TestCase):
+
+    def test_ascii(self):
+        self.assertEqual(nodeprep('Alice'), u'alice')
+        self.assertEqual(nodeprep(u'alice'), u'alice')
+
+    def test_casefold(self):
+        self.assertEqual(nodeprep(u'Élodie'), u'élodie')
+        self.assertEqual(nodeprep(u'Straße'), u'strasse')
+        self.assertEqual(nodeprep('\xc3\x89lodie'), u'élodie')
+
+    def test_normalization(self):
+        # the fullwidth letters are normalized by NFKC
+        self.assertEqual(nodeprep(u'ＡＢ'), u'ab')
+        # e followed by a combining acute accent
+        self.assertEqual(nodeprep(u'é'), u'é')
+
+    def test_mapped_to_nothing(self):
+        self.assertEqual(nodeprep(u'al­ice'), u'alice')
+
+    def test_prohibited(self):
+        for value in (u'a b', u'a"b', u'a&b', u"a'b", u'a/b', u'a:b',
+                      u'a<b', u'a>b', u'a@b', u'a\x00b', u'a b', u'a�b'):
+            self.assertRaises(ValueError, nodeprep, value)
+
+    def test_bidi(self):
+        self.assertEqual(nodeprep(u'אב'), u'אב')
+        self.assertRaises(ValueError, nodeprep, u'אa')
+        self.assertRaises(ValueError, nodeprep, u'א1')
+
+    def test_length(self):
+        self.assertRaises(ValueError, nodeprep, u'')
+        self.assertRaises(ValueError, nodeprep, u'a' * 1024)
+        self.assertEqual(len(nodeprep(u'a' * 1023)), 1023)
+
+class TestNameprep(unittest.TestCase):
+
+    def test_ascii(self):
+        self.assertEqual(nameprep('Example.COM'), u'example.com')
+        self.assertEqual(nameprep('example.com.'), u'example.com')
+
+    def test_unicode(self):
+        self.assertEqual(nameprep(u'BÜCHER.example'), u'bücher.example')
+        self.assertEqual(nameprep(u'bücher。example'), u'bücher.example')
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, nameprep, u'exa mple.com')
+        self.assertRaises(ValueError, nameprep, u'example..com')
+        self.assertRaises(ValueError, nameprep, u'')
+
+class TestResourceprep(unittest.TestCase):
+
+    def test_ascii(self):
+        self.assertEqual(resourceprep('Home Office'), u'Home Office')
+
+    def test_no_casefold(self):
+        self.assertEqual(resourceprep(u'Élodie'), u'Élodie')
+        self.assertEqual(resourceprep(u'Ａ'), u'A')
+
+    def test_prohibited(self):
+        self.assertRaises(ValueError, resourceprep, u'a\x07b')
+        self.assertRaises(ValueError, resourceprep, u'a‎b')
+
+class TestSaslprep(unittest.TestCase):
+
+    def test_examples(self):
+        # RFC 4013, section 3
+        self.assertEqual(saslprep(u'I\xadX'), u'IX')
+        self.assertEqual(saslprep(u'user'), u'user')
+        self.assertEqual(saslprep(u'USER'), u'USER')
+        self.assertEqual(saslprep(u'\xaa'), u'a')
+        self.assertEqual(saslprep(u'\u2168'), u'IX')
+        self.assertRaises(ValueError, saslprep, u'\x07')
+        self.assertRaises(ValueError, saslprep, u'\u0627\x31')
+
+    def test_spaces(self):
+        self.assertEqual(saslprep(u'a\u00a0b'), u'a b')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+import time
+import unittest
+from headstock.lib.profiler import HandlerProfiler
+
+def slow_handler():
+    time.sleep(0.06)
+
+class TestHandlerProfiler(unittest.TestCase):
+
+    def test_threshold(self):
+        profiler = HandlerProfiler(threshold=0.05, sample=False)
+        profiler.enter('Fast.handler')
+        profiler.leave(0.01)
+        profiler.enter('Slow.handler')
+        profiler.leave(0.2)
+        calls = profiler.slow_calls()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0].label, 'Slow.handler')
+        self.assertEqual(calls[0].elapsed, 0.2)
+        self.assertEqual(profiler.current, None)
+
+    def test_ring_buffer(self):
+        profiler = HandlerProfiler(threshold=0.0, size=3, sample=False)
+        for i in range(5):
+            profiler.enter('handler%d' % i)
+            profiler.leave(0.1)
+        self.assertEqual([call.label for call in profiler.slow_calls()],
+                         ['handler2', 'handler3', 'handler4'])
+        profiler.clear()
+        self.assertEqual(profiler.slow_calls(), [])
+
+    def test_sampling(self):
+        profiler = HandlerProfiler(threshold=0.05, interval=0.002)
+        profiler.start()
+        try:
+            profiler.enter('Slow.handler')
+            start = time.time()
+            slow_handler()
+            profiler.leave(time.time() - start)
+        finally:
+            profiler.stop()
+
+        call = profiler.slow_calls()[0]
+        self.assertTrue(call.stacks)
+        names = [frame[2] for frame in call.stacks[0]]
+        self.assertTrue('slow_handler' in names)
+        self.assertTrue('Slow.handler' in profiler.summary())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+
+import unittest
+from headstock.lib.ratelimit import TokenBucket
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.bucket = TokenBucket(2, 4, clock=self.clock)
+
+    def test_burst(self):
+        for i in range(4):
+            self.assertTrue(self.bucket.consume())
+        self.assertFalse(self.bucket.consume())
+        self.assertEqual(self.bucket.delay(), 0.5)
+
+    def test_refill(self):
+        for i in range(4):
+            self.bucket.consume()
+        self.clock.now += 1
+        self.assertTrue(self.bucket.consume())
+        self.assertTrue(self.bucket.consume())
+        self.assertFalse(self.bucket.consume())
+        self.clock.now += 100
+        self.assertEqual(self.bucket.delay(), 0.0)
+        self.assertEqual(self.bucket.tokens, 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+
+import unittest
+from headstock.lib.reconnect import ExponentialBackoff
+
+class TestExponentialBackoff(unittest.TestCase):
+
+    def test_no_jitter(self):
+        policy = ExponentialBackoff(base=1, factor=2, cap=10, jitter=None)
+        self.assertEqual([policy.delay(n) for n in range(6)], [1, 2, 4, 8, 10, 10])
+
+    def test_full_jitter(self):
+        policy = ExponentialBackoff(base=1, factor=2, cap=10)
+        for n in range(10):
+            delay = policy.delay(n)
+            self.assertTrue(0 <= delay <= min(10, 2 ** n))
+
+    def test_equal_jitter(self):
+        policy = ExponentialBackoff(base=4, factor=1, jitter='equal')
+        for n in range(10):
+            self.assertTrue(2 <= policy.delay(n) <= 4)
+
+    def test_give_up(self):
+        policy = ExponentialBackoff(max_attempts=2)
+        self.assertNotEqual(policy.delay(1), None)
+        self.assertEqual(policy.delay(2), None)
+
+if __name__ == '__main__':
+    unittest.main()
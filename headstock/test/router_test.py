@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+import unittest
+from headstock.lib.router import ComponentRouter
+
+class Element(object):
+    def __init__(self, to=None, type=None):
+        self.attributes = {'to': to, 'type': type}
+
+    def get_attribute_value(self, name, default=None):
+        return self.attributes.get(name, default)
+
+def handler(name):
+    def h(e):
+        return name
+    return h
+
+class TestComponentRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.router = ComponentRouter()
+        self.router.add(handler('full'), to=u'bot@service/desk')
+        self.router.add(handler('bare'), to=u'bot@service')
+        self.router.add(handler('bare-chat'), to=u'bot@service', type=u'chat')
+        self.router.add(handler('groupchat'), type=u'groupchat')
+
+    def test_most_specific(self):
+        route = self.router.route
+        self.assertEqual(route(Element(u'bot@service/desk', u'chat')), 'full')
+        self.assertEqual(route(Element(u'bot@service/phone', u'chat')), 'bare-chat')
+        self.assertEqual(route(Element(u'bot@service', u'chat')), 'bare-chat')
+        self.assertEqual(route(Element(u'bot@service/phone')), 'bare')
+        self.assertEqual(route(Element(u'other@service', u'groupchat')), 'groupchat')
+
+    def test_prepared(self):
+        route = self.router.route
+        self.assertEqual(route(Element(u'Bot@SERVICE/desk', u'chat')), 'full')
+        self.assertEqual(route(Element(u'BOT@service/phone', u'chat')), 'bare-chat')
+        self.assertEqual(route(Element(u'bot@Service')), 'bare')
+        # the resource is case sensitive
+        self.assertEqual(route(Element(u'bot@service/Desk')), 'bare')
+        self.assertEqual(self.router.stats()['routes'][(u'bot@service', u'chat')], 1)
+
+        self.router.add(handler('upper'), to=u'Other@Service')
+        self.assertTrue((u'other@service', None) in self.router)
+        self.assertEqual(route(Element(u'other@service')), 'upper')
+        self.router.remove(to=u'OTHER@service')
+        self.assertFalse((u'other@service', None) in self.router)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, self.router.add, handler('invalid'), to=u'@service')
+        self.assertEqual(self.router.route(Element(u'@service', u'groupchat')), 'groupchat')
+        self.assertEqual(self.router.route(Element(u'@service')), None)
+
+    def test_unrouted(self):
+        self.assertEqual(self.router.route(Element(u'other@service', u'chat')), None)
+        self.assertEqual(self.router.unrouted, 1)
+
+    def test_fallback(self):
+        self.router.fallback = handler('fallback')
+        self.assertEqual(self.router.route(Element(u'other@service')), 'fallback')
+        self.assertEqual(self.router.fallback_count, 1)
+        self.assertEqual(self.router.unrouted, 0)
+
+    def test_wildcard(self):
+        self.router.add(handler('any'))
+        self.assertEqual(self.router.route(Element(u'other@service', u'chat')), 'any')
+        self.assertEqual(self.router.route(Element()), 'any')
+
+    def test_counters(self):
+        route = self.router.route
+        route(Element(u'bot@service/phone', u'chat'))
+        route(Element(u'bot@service', u'chat'))
+        route(Element(u'bot@service/desk'))
+        stats = self.router.stats()
+        self.assertEqual(stats['routes'][(u'bot@service', u'chat')], 2)
+        self.assertEqual(stats['routes'][(u'bot@service/desk', None)], 1)
+        self.assertEqual(stats['routes'][(u'bot@service', None)], 0)
+
+    def test_add_remove(self):
+        self.assertRaises(ValueError, self.router.add, handler('dup'), to=u'bot@service')
+        self.router.remove(to=u'bot@service/desk')
+        self.assertFalse((u'bot@service/desk', None) in self.router)
+        self.assertRaises(ValueError, self.router.remove, to=u'bot@service/desk')
+        self.assertEqual(len(self.router), 3)
+        self.router.clear()
+        self.assertEqual(len(self.router), 0)
+
+if __name__ == '__main__':
+    unittest.main()
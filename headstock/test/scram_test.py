@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import base64
+import unittest
+from headstock.error import HeadstockAuthenticationFailure
+from headstock.lib.auth.scram import ScramClient, ScramKeyCache, derive_keys
+
+def b64(data):
+    return base64.b64encode(data).decode('utf-8')
+
+# RFC 5802, section 5
+SHA1 = dict(nonce='fyko+d2lbbFgONRv9qkxdawL',
+            first='n,,n=user,r=fyko+d2lbbFgONRv9qkxdawL',
+            server_first='r=fyko+d2lbbFgONRv9qkxdawL3rfcNHYJY1ZVvWVs7j,s=QSXCR+Q6sek8bf92,i=4096',
+            final='c=biws,r=fyko+d2lbbFgONRv9qkxdawL3rfcNHYJY1ZVvWVs7j,p=v0X8v3Bz2T0CJGbJQyF0X+HI4Ts=',
+            server_final='v=rmF9pqV8S7suAoZWja4dJRkFsKQ=')
+
+# RFC 7677, section 3
+SHA256 = dict(nonce='rOprNGfwEbeRWgbNEkqO',
+              first='n,,n=user,r=rOprNGfwEbeRWgbNEkqO',
+              server_first='r=rOprNGfwEbeRWgbNEkqO%hvYDpWUa2RaTCAfuxFIlj)hNlF$k0,s=W22ZaJ0SNY7soEsUEjb6gQ==,i=4096',
+              final='c=biws,r=rOprNGfwEbeRWgbNEkqO%hvYDpWUa2RaTCAfuxFIlj)hNlF$k0,p=dHzbZapWIk4jUhN+Ute9ytag9zjfMHgsqmmiz7AndVQ=',
+              server_final='v=6rriTRBi23WpRR/wtup+mMhUZUn/dB5nLTJRsjl95G4=')
+
+class TestScramClient(unittest.TestCase):
+
+    def exchange(self, mechanism, vector, cache=None):
+        client = ScramClient(mechanism, u'user', u'pencil',
+                             cache=cache or ScramKeyCache(), nonce=vector['nonce'])
+        self.assertEqual(base64.b64decode(client.first_message()), vector['first'])
+        response = client.respond(b64(vector['server_first']))
+        self.assertEqual(base64.b64decode(response), vector['final'])
+        client.verify(b64(vector['server_final']))
+        self.assertTrue(client.verified)
+        return client
+
+    def test_sha1(self):
+        client = self.exchange(u'SCRAM-SHA-1', SHA1)
+        self.assertEqual(client.iterations, 4096)
+
+    def test_sha256(self):
+        self.exchange(u'SCRAM-SHA-256', SHA256)
+
+    def test_server_final_as_challenge(self):
+        client = ScramClient(u'SCRAM-SHA-1', u'user', u'pencil',
+                             cache=ScramKeyCache(), nonce=SHA1['nonce'])
+        client.first_message()
+        client.respond(b64(SHA1['server_first']))
+        self.assertEqual(client.respond(b64(SHA1['server_final'])), u'')
+        self.assertTrue(client.verified)
+
+    def test_invalid_server_signature(self):
+        client = ScramClient(u'SCRAM-SHA-1', u'user', u'pencil',
+                             cache=ScramKeyCache(), nonce=SHA1['nonce'])
+        client.first_message()
+        client.respond(b64(SHA1['server_first']))
+        self.assertRaises(HeadstockAuthenticationFailure, client.verify,
+                          b64(SHA256['server_final']))
+        self.assertRaises(HeadstockAuthenticationFailure, client.verify, u'')
+        self.assertRaises(HeadstockAuthenticationFailure, client.verify,
+                          b64('e=invalid-proof'))
+        self.assertFalse(client.verified)
+
+    def test_invalid_nonce(self):
+        client = ScramClient(u'SCRAM-SHA-1', u'user', u'pencil',
+                             cache=ScramKeyCache(), nonce='other')
+        client.first_message()
+        self.assertRaises(HeadstockAuthenticationFailure, client.respond,
+                          b64(SHA1['server_first']))
+
+    def test_username_escaped(self):
+        client = ScramClient(u'SCRAM-SHA-1', u'a=b,c', u'pencil', nonce='abc')
+        self.assertEqual(base64.b64decode(client.first_message()), 'n,,n=a=3Db=2Cc,r=abc')
+
+    def test_unsupported_mechanism(self):
+        self.assertRaises(ValueError, ScramClient, u'SCRAM-MD5', u'user', u'pencil')
+
+class TestScramKeyCache(unittest.TestCase):
+
+    def test_cached(self):
+        cache = ScramKeyCache()
+        first = cache.get(u'SCRAM-SHA-1', u'user', 'pencil', 'salt', 16)
+        self.assertEqual(first, derive_keys('sha1', 'pencil', 'salt', 16))
+        self.assertTrue(cache.get(u'SCRAM-SHA-1', u'user', 'pencil', 'salt', 16) is first)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.cache.hits, 1)
+
+        cache.get(u'SCRAM-SHA-1', u'user', 'pencil', 'salt', 32)
+        cache.get(u'SCRAM-SHA-1', u'user', 'other', 'salt', 16)
+        self.assertEqual(len(cache), 3)
+
+    def test_reused_across_exchanges(self):
+        cache = ScramKeyCache()
+        for i in range(2):
+            client = ScramClient(u'SCRAM-SHA-1', u'user', u'pencil',
+                                 cache=cache, nonce=SHA1['nonce'])
+            client.first_message()
+            client.respond(b64(SHA1['server_first']))
+            client.verify(b64(SHA1['server_final']))
+        self.assertEqual((cache.cache.hits, cache.cache.misses), (1, 1))
+
+    def test_precompute(self):
+        cache = ScramKeyCache()
+        salt = base64.b64decode('QSXCR+Q6sek8bf92')
+        credentials = [(u'SCRAM-SHA-1', u'user', u'pencil', salt, 4096),
+                       (u'SCRAM-SHA-256', u'user', u'pencil', salt, 4096),
+                       (u'SCRAM-SHA-1', u'user', u'pencil', salt, 4096)]
+        self.assertEqual(cache.precompute(credentials, processes=2), 2)
+        self.assertEqual(cache.precompute(credentials, processes=2), 0)
+        self.assertEqual(cache.get(u'SCRAM-SHA-1', u'user', 'pencil', salt, 4096),
+                         derive_keys('sha1', 'pencil', salt, 4096))
+        self.assertEqual(cache.cache.misses, 0)
+
+if __name__ == '__main__':
+    unittest.main()
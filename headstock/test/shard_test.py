@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+import unittest
+from Queue import Queue
+from headstock.shard import shard_for, _worker
+from headstock.lib.jid import JID
+
+class Client(object):
+    def __init__(self):
+        self.available = True
+        self.sent = []
+
+    def send_stanza(self, stanza):
+        self.sent.append(stanza)
+
+class Pool(object):
+    def __init__(self):
+        self.running = False
+        self.sessions = {}
+        self.iterations = 0
+
+    def run_once(self):
+        self.iterations += 1
+
+    def add(self, jid, password, handlers=None, **kwargs):
+        client = Client()
+        client.available = kwargs.get('available', True)
+        self.sessions[jid] = (password, handlers, kwargs, client)
+
+    def remove(self, jid):
+        del self.sessions[jid]
+
+    def get(self, jid):
+        session = self.sessions.get(jid)
+        if session:
+            return session[3]
+
+    def health(self):
+        return {'sessions': len(self.sessions)}
+
+    def throughput(self):
+        return {'sent_stanzas': 0}
+
+    def stop(self):
+        self.running = False
+
+def handlers(jid):
+    return [jid]
+
+class TestShardFor(unittest.TestCase):
+    def test_stable(self):
+        for shards in (1, 3, 8):
+            for i in range(50):
+                jid = u'user%d@localhost' % i
+                index = shard_for(jid, shards)
+                self.assertTrue(0 <= index < shards)
+                self.assertEqual(shard_for(jid, shards), index)
+                self.assertEqual(shard_for(jid + u'/res', shards), index)
+                self.assertEqual(shard_for(jid.upper(), shards), index)
+                self.assertEqual(shard_for(JID.parse(jid), shards), index)
+
+    def test_spread(self):
+        indexes = set([shard_for(u'user%d@localhost' % i, 4) for i in range(100)])
+        self.assertEqual(indexes, set(range(4)))
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, shard_for, u'@localhost', 4)
+
+class TestWorker(unittest.TestCase):
+    def run_worker(self, *commands):
+        pool = Pool()
+        queue, results = Queue(), Queue()
+        for command in commands:
+            queue.put(command)
+        queue.put(('stats', 1))
+        queue.put(('stop',))
+        _worker(2, queue, results, handlers, {}, pool=pool)
+        stats_id, index, stats = results.get_nowait()
+        self.assertEqual((stats_id, index), (1, 2))
+        return pool, stats
+
+    def test_add(self):
+        pool, stats = self.run_worker(('add', u'bot@localhost/res', u'secret',
+                                       {'hostname': 'localhost'}))
+        self.assertEqual(pool.iterations, 1)
+        self.assertEqual(pool.sessions[u'bot@localhost/res'][:3],
+                         (u'secret', [u'bot@localhost/res'], {'hostname': 'localhost'}))
+        self.assertEqual(stats, {'sessions': 1, 'sent_stanzas': 0, 'undelivered': 0})
+
+    def test_add_twice(self):
+        pool, stats = self.run_worker(('add', u'bot@localhost/res', u'secret', {}),
+                                      ('add', u'Bot@localhost/other', u'secret', {}))
+        self.assertEqual(pool.sessions.keys(), [u'bot@localhost/res'])
+
+    def test_send(self):
+        pool, stats = self.run_worker(('add', u'bot@localhost/res', u'secret', {}),
+                                      ('send', u'bot@localhost/res', u'<presence />'),
+                                      ('send', u'Bot@Localhost', u'<message />'),
+                                      ('send', u'other@localhost', u'<message />'))
+        client = pool.get(u'bot@localhost/res')
+        self.assertEqual(client.sent, [u'<presence />', u'<message />'])
+        self.assertEqual(stats['undelivered'], 1)
+
+    def test_send_unavailable(self):
+        pool, stats = self.run_worker(('add', u'bot@localhost', u'secret', {'available': False}),
+                                      ('send', u'bot@localhost', u'<presence />'))
+        self.assertEqual(pool.get(u'bot@localhost').sent, [])
+        self.assertEqual(stats['undelivered'], 1)
+
+    def test_remove(self):
+        pool, stats = self.run_worker(('add', u'bot@localhost/res', u'secret', {}),
+                                      ('remove', u'BOT@localhost'),
+                                      ('remove', u'other@localhost'),
+                                      ('send', u'bot@localhost', u'<presence />'))
+        self.assertEqual(pool.sessions, {})
+        self.assertEqual(stats['undelivered'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,8 @@
 #!/usr/bin/env python
 
 import unittest
-from headstock.lib.stanza import Stanza
+from bridge import Element as E
+from headstock.lib.stanza import Stanza, FrozenStanza, StanzaTemplate
 
 class TestStanza(unittest.TestCase):
     
@@ -44,5 +45,63 @@ class TestStanza(unittest.TestCase):
         xml2 = Stanza.get_iq().xml()
         self.assertNotEqual(xml1, xml2)
 
+class TestFrozenStanza(unittest.TestCase):
+
+    def test_serialized_once(self):
+        e = Stanza.get_iq(from_jid="bob", to_jid="alice", stanza_id="i")
+        frozen = FrozenStanza(e)
+        data = frozen.data
+        self.assertEqual(data, '<iq xmlns="jabber:client" to="alice" type="get" id="i" from="bob" />')
+        self.assertTrue(frozen.data is data)
+        self.assertEqual(str(frozen), data)
+
+    def test_string(self):
+        frozen = FrozenStanza(u"<presence><status>caf\xe9</status></presence>")
+        self.assertEqual(frozen.data, "<presence><status>caf\xc3\xa9</status></presence>")
+        self.assertEqual(frozen.element, None)
+
+class TestStanzaTemplate(unittest.TestCase):
+
+    def setUp(self):
+        self.template = StanzaTemplate(u'<message xmlns="jabber:client" to="{to}" id="{id}" '
+                                       u'type="headline"><body>{body}</body></message>')
+
+    def test_render(self):
+        xml = self.template.render(to=u'alice@domain', id=u'n1', body=u'hello')
+        self.assertEqual(xml, '<message xmlns="jabber:client" to="alice@domain" id="n1" '
+                              'type="headline"><body>hello</body></message>')
+        self.assertEqual(self.template.names, frozenset(['to', 'id', 'body']))
+
+    def test_escaping(self):
+        xml = self.template(to=u"o'neil@domain", id=u'a"b', body=u'caf\xe9 <b> & co')
+        self.assertEqual(xml, '<message xmlns="jabber:client" to="o&apos;neil@domain" '
+                              'id="a&quot;b" type="headline"><body>caf\xc3\xa9 &lt;b&gt; '
+                              '&amp; co</body></message>')
+        element = E.load(xml).xml_root
+        self.assertEqual(element.get_attribute_value('to'), u"o'neil@domain")
+
+    def test_generated_id(self):
+        first = self.template.render(to=u'alice@domain', body=u'hello')
+        second = self.template.render(to=u'alice@domain', body=u'hello')
+        self.assertNotEqual(first, second)
+
+    def test_missing_value(self):
+        self.assertRaises(KeyError, self.template.render, to=u'alice@domain')
+
+    def test_braces(self):
+        template = StanzaTemplate(u'<message to="n-{to}"><body>{{{body}}}</body></message>')
+        self.assertEqual(template.render(to=u'a@b', body=u'x'),
+                         '<message to="n-a@b"><body>{x}</body></message>')
+
+    def test_invalid_slot(self):
+        self.assertRaises(ValueError, StanzaTemplate, u'<message {attr}="1"/>')
+
+    def test_from_element(self):
+        e = Stanza.get_iq(to_jid=u'{to}', stanza_id=u'{id}')
+        template = StanzaTemplate(e)
+        xml = template.render(to=u'alice@domain', id=u'i')
+        self.assertEqual(xml, Stanza.get_iq(to_jid=u'alice@domain', stanza_id=u'i')\
+                             .xml(omit_declaration=True, indent=False))
+
 if __name__ == '__main__':
     unittest.main()
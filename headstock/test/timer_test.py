@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+import unittest
+from headstock.lib.timer import TimerWheel
+from headstock.lib.future import Future
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class TestTimerWheel(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.wheel = TimerWheel(resolution=1.0, slots=8, clock=self.clock)
+        self.fired = []
+
+    def test_fire(self):
+        self.wheel.schedule(2, self.fired.append, "a")
+        self.clock.now += 1
+        self.assertEqual(self.wheel.advance(), 0)
+        self.clock.now += 1
+        self.assertEqual(self.wheel.advance(), 1)
+        self.assertEqual(self.fired, ["a"])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_multiple_rounds(self):
+        self.wheel.schedule(20, self.fired.append, "a")
+        self.clock.now += 19
+        self.wheel.advance()
+        self.assertEqual(self.fired, [])
+        self.clock.now += 1
+        self.wheel.advance()
+        self.assertEqual(self.fired, ["a"])
+
+    def test_cancel(self):
+        timer = self.wheel.schedule(1, self.fired.append, "a")
+        self.assertTrue(timer.active)
+        timer.cancel()
+        self.assertFalse(timer.active)
+        self.assertEqual(len(self.wheel), 0)
+        self.clock.now += 5
+        self.wheel.advance()
+        self.assertEqual(self.fired, [])
+
+class TestFuture(unittest.TestCase):
+
+    def test_result(self):
+        done = []
+        f = Future()
+        f.add_done_callback(done.append)
+        self.assertFalse(f.done())
+        f.set_result(42)
+        self.assertEqual(f.result(), 42)
+        self.assertEqual(done, [f])
+
+    def test_exception(self):
+        f = Future()
+        f.set_exception(ValueError())
+        self.assertRaises(ValueError, f.result)
+        self.assertRaises(RuntimeError, f.set_result, 1)
+
+    def test_cancel(self):
+        f = Future()
+        self.assertTrue(f.cancel())
+        self.assertTrue(f.cancelled())
+        self.assertFalse(f.cancel())
+
+if __name__ == '__main__':
+    unittest.main()
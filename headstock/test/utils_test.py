@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+import os
+import unittest
+from headstock.lib.utils import IDGenerator, generate_unique, set_id_generator
+
+class TestIDGenerator(unittest.TestCase):
+
+    def test_unique(self):
+        generator = IDGenerator()
+        ids = [generator() for i in range(10000)]
+        self.assertEqual(len(set(ids)), 10000)
+        self.assertTrue(isinstance(ids[0], unicode))
+
+    def test_prefix(self):
+        first, second = IDGenerator(), IDGenerator()
+        self.assertNotEqual(first.prefix, second.prefix)
+        self.assertTrue(first().startswith(first.prefix))
+        self.assertNotEqual(first(), second())
+
+    def test_reseed_after_fork(self):
+        generator = IDGenerator()
+        prefix = generator.prefix
+        generator.pid = os.getpid() + 1
+        self.assertFalse(generator().startswith(prefix))
+        self.assertEqual(generator.pid, os.getpid())
+
+class TestGenerateUnique(unittest.TestCase):
+
+    def tearDown(self):
+        set_id_generator(IDGenerator())
+
+    def test_pluggable(self):
+        ids = iter([u'a', u'b'])
+        previous = set_id_generator(lambda: ids.next())
+        self.assertTrue(isinstance(previous, IDGenerator))
+        self.assertEqual(generate_unique(), u'a')
+        self.assertEqual(generate_unique(), u'b')
+
+    def test_seed(self):
+        self.assertEqual(generate_unique('seed'), generate_unique('seed'))
+        self.assertNotEqual(generate_unique('seed'), generate_unique('other'))
+
+if __name__ == '__main__':
+    unittest.main()